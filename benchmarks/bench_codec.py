@@ -0,0 +1,55 @@
+"""Benchmark encode/decode throughput of task data codecs
+
+Usage:
+
+    $ python benchmarks/bench_codec.py [NUM_TASKS] [DEPS_PER_TASK]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from doit.dependency import JSONCodec, MarshalCodec  # noqa: E402
+
+
+def sample_task(num_deps):
+    """data saved for a typical task"""
+    data = {
+        'checker:': 'MD5Checker',
+        'deps:': ['src/file_{}.c'.format(dep) for dep in range(num_deps)],
+        '_values_:': {'version': '1.2.3',
+                      'flags': ['-O2', '-Wall', '-g'],
+                      'env': {'CC': 'gcc', 'PATH': '/usr/bin:/bin'}},
+        'result:': 'd41d8cd98f00b204e9800998ecf8427e',
+    }
+    for dep in range(num_deps):
+        data['src/file_{}.c'.format(dep)] = [
+            1700000000.123456, 1024 * dep, 'd41d8cd98f00b204e9800998ecf8427e']
+    return data
+
+
+def bench(codec, tasks):
+    start = time.perf_counter()
+    encoded = [codec.encode(task) for task in tasks]
+    encode_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for data in encoded:
+        codec.decode(data)
+    decode_time = time.perf_counter() - start
+    size = sum(len(data) for data in encoded)
+    return encode_time, decode_time, size
+
+
+def main(num_tasks=20000, num_deps=10):
+    print('tasks: {}, deps per task: {}'.format(num_tasks, num_deps))
+    tasks = [sample_task(num_deps) for _ in range(num_tasks)]
+    for label, codec in (('json', JSONCodec()), ('marshal', MarshalCodec())):
+        encode, decode, size = bench(codec, tasks)
+        print('{:>8}  encode: {:6.3f}s  decode: {:6.3f}s  size: {:6.1f} MB'
+              .format(label, encode, decode, size / 2 ** 20))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,120 @@
+"""Simulate parallel execution of synthetic task graphs, compare makespan of
+tasks dispatched in selection order against critical-path priority
+
+Durations of previous executions are the "history" used to compute
+priorities: exact, with noise (actual duration differs from history), and
+partial (half of tasks never executed before, estimated with the median).
+
+Usage:
+
+    $ python benchmarks/bench_schedule.py [NUM_TASKS] [NUM_WORKERS] [SEED]
+"""
+
+import os
+import sys
+import heapq
+import random
+import itertools
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from doit.task import Task  # noqa: E402
+from doit.control import TaskControl  # noqa: E402
+
+
+def layered_dag(rnd, num_tasks, num_layers=8):
+    """random DAG, tasks depend on up to 3 tasks of previous layers,
+    defined in random order"""
+    layers = [[] for _ in range(num_layers)]
+    deps = {}
+    for num in range(num_tasks):
+        layer = rnd.randrange(num_layers)
+        name = 'layer{}_{}'.format(layer, num)
+        previous = [task for lower in layers[:layer] for task in lower]
+        deps[name] = rnd.sample(previous, min(len(previous), rnd.randint(0, 3)))
+        layers[layer].append(name)
+    durations = {name: rnd.lognormvariate(0, 1) for name in deps}
+    names = list(deps)
+    rnd.shuffle(names)
+    return {name: deps[name] for name in names}, durations
+
+
+def chain_and_wide(rnd, num_tasks, chain_len=20):
+    """many short independent tasks and a long chain defined last"""
+    deps = {'short_{}'.format(num): [] for num in range(num_tasks - chain_len)}
+    durations = {name: rnd.uniform(0.5, 1.5) for name in deps}
+    previous = []
+    for num in range(chain_len):
+        name = 'chain_{}'.format(num)
+        deps[name] = previous
+        durations[name] = rnd.uniform(4, 6)
+        previous = [name]
+    return deps, durations
+
+
+def simulate(deps, durations, num_workers, priority):
+    """@return time to execute all tasks"""
+    tasks = [Task(name, ['echo'], task_dep=task_dep)
+             for name, task_dep in deps.items()]
+    control = TaskControl(tasks)
+    control.process(None)
+    gen = control.task_dispatcher(priority).generator
+
+    now = 0
+    running = []  # heap of (end time, sequence, ExecNode)
+    sequence = itertools.count()
+    completed = None
+    finished = False
+    while True:
+        # dispatch tasks while there are free workers
+        while len(running) < num_workers and not finished:
+            try:
+                node = gen.send(completed)
+            except StopIteration:
+                finished = True
+                break
+            completed = None
+            if node == "hold on":
+                break
+            node.run_status = 'run'
+            heapq.heappush(running, (now + durations[node.task.name],
+                                     next(sequence), node))
+        if not running:
+            return now
+        now, _, completed = heapq.heappop(running)
+        completed.run_status = 'successful'
+
+
+def priorities(deps, history):
+    tasks = [Task(name, ['echo'], task_dep=task_dep)
+             for name, task_dep in deps.items()]
+    control = TaskControl(tasks)
+    control.process(None)
+    return control.task_priorities(history)
+
+
+def main(num_tasks=500, num_workers=8, seed=42):
+    rnd = random.Random(seed)
+    print('tasks: {}, workers: {}'.format(num_tasks, num_workers))
+    print('{:>16} {:>10} {:>10} {:>10} {:>10} {:>10}'.format(
+        'graph', 'bound', 'selection', 'exact', 'noisy', 'partial'))
+    for label, generate in (('layered', layered_dag),
+                            ('chain+wide', chain_and_wide)):
+        deps, durations = generate(rnd, num_tasks)
+        noisy = {name: duration * rnd.uniform(0.5, 1.5)
+                 for name, duration in durations.items()}
+        partial = {name: duration for name, duration in durations.items()
+                   if rnd.random() < 0.5}
+
+        path = max(priorities(deps, durations).values())
+        bound = max(path, sum(durations.values()) / num_workers)
+        results = [simulate(deps, durations, num_workers, None)]
+        for history in (durations, noisy, partial):
+            results.append(simulate(deps, durations, num_workers,
+                                    priorities(deps, history)))
+        print('{:>16} {:10.1f} {:10.1f} {:10.1f} {:10.1f} {:10.1f}'.format(
+            label, bound, *results))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
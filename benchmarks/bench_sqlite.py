@@ -0,0 +1,84 @@
+"""Benchmark sqlite3 backend: bulk prefetch/executemany vs row by row access
+
+Usage:
+
+    $ python benchmarks/bench_sqlite.py [NUM_TASKS] [DEPS_PER_TASK]
+
+For each implementation it measures:
+
+  - write: set data for all tasks and dump (a clean build)
+  - no-op: open the DB, check all tasks and their deps (an up-to-date build)
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from doit.dependency import SqliteDB, JSONCodec  # noqa: E402
+
+
+class RowByRowSqliteDB(SqliteDB):
+    """SqliteDB as it was before prefetch/executemany/pragmas"""
+
+    def __init__(self, name, codec, *, module_name=None):
+        super().__init__(name, codec, pragmas={})
+
+    def prefetch(self, task_ids):
+        pass
+
+    def dump(self):
+        for task_id in self._dirty:
+            self._conn.execute('insert or replace into doit values (?,?)',
+                               (task_id, self.codec.encode(self._cache[task_id])))
+        self._conn.commit()
+        self._conn.close()
+        self._dirty = set()
+
+
+def task_ids(num_tasks):
+    return ['task_{}'.format(num) for num in range(num_tasks)]
+
+
+def bench_write(db_class, name, num_tasks, num_deps):
+    start = time.perf_counter()
+    db = db_class(name, JSONCodec())
+    for task_id in task_ids(num_tasks):
+        for dep in range(num_deps):
+            db.set(task_id, 'src/file_{}.c'.format(dep),
+                   [1700000000.123, 1024, 'd41d8cd98f00b204e9800998ecf8427e'])
+        db.set(task_id, 'checker:', 'MD5Checker')
+    db.dump()
+    return time.perf_counter() - start
+
+
+def bench_noop(db_class, name, num_tasks, num_deps):
+    start = time.perf_counter()
+    db = db_class(name, JSONCodec())
+    ids = task_ids(num_tasks)
+    db.prefetch(ids)
+    for task_id in ids:
+        assert db.in_(task_id)
+        db.get(task_id, 'checker:')
+        for dep in range(num_deps):
+            db.get(task_id, 'src/file_{}.c'.format(dep))
+    db.dump()
+    return time.perf_counter() - start
+
+
+def main(num_tasks=20000, num_deps=5):
+    print('tasks: {}, deps per task: {}'.format(num_tasks, num_deps))
+    for label, db_class in (('row-by-row', RowByRowSqliteDB),
+                            ('bulk', SqliteDB)):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            name = os.path.join(tmpdir, 'bench.db')
+            write = bench_write(db_class, name, num_tasks, num_deps)
+            noop = bench_noop(db_class, name, num_tasks, num_deps)
+        print('{:>12}  write: {:7.3f}s   no-op: {:7.3f}s'.format(
+            label, write, noop))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -12,6 +12,7 @@ from threading import Thread
 import pdb
 
 from .exceptions import InvalidTask, TaskFailed, TaskError
+from .jobserver import inherited_fds
 
 
 def normalize_callable(ref):
@@ -203,17 +204,7 @@ class CmdAction(BaseAction):
             return TaskError(
                 "CmdAction Error creating command string", exc)
 
-        # set environ to change output buffering
-        subprocess_pkwargs = self.pkwargs.copy()
-        env = None
-        if 'env' in subprocess_pkwargs:
-            env = subprocess_pkwargs['env']
-            del subprocess_pkwargs['env']
-        if self.buffering:
-            if not env:
-                env = os.environ.copy()
-            env['PYTHONUNBUFFERED'] = '1'
-
+        subprocess_pkwargs, env = self._popen_kwargs()
         capture_io = self.task.io.capture if self.task else True
         if capture_io:
             p_out = p_err = subprocess.PIPE
@@ -252,24 +243,150 @@ class CmdAction(BaseAction):
 
         # make sure process really terminated
         process.wait()
+        return self._returncode_failure(action, process.returncode)
 
+
+    def _popen_kwargs(self):
+        """@return (dict, dict): Popen extra arguments, environment"""
+        # set environ to change output buffering
+        subprocess_pkwargs = self.pkwargs.copy()
+        env = None
+        if 'env' in subprocess_pkwargs:
+            env = subprocess_pkwargs['env']
+            del subprocess_pkwargs['env']
+        if self.buffering:
+            if not env:
+                env = os.environ.copy()
+            env['PYTHONUNBUFFERED'] = '1'
+        # keep jobserver pipe open for sub-processes like make
+        jobserver_fds = inherited_fds(env) if os.name == 'posix' else ()
+        if jobserver_fds:
+            pass_fds = subprocess_pkwargs.get('pass_fds', ())
+            subprocess_pkwargs['pass_fds'] = (
+                tuple(pass_fds) + jobserver_fds)
+        return subprocess_pkwargs, env
+
+
+    def _returncode_failure(self, action, returncode):
+        """@return failure (or None) from process returncode"""
         # task error - based on:
         # http://www.gnu.org/software/bash/manual/bashref.html#Exit-Status
         # it doesnt make so much difference to return as Error or Failed anyway
-        if process.returncode > 125:
+        if returncode > 125:
             return TaskError("Command error: '%s' returned %s" %
-                             (action, process.returncode))
+                             (action, returncode))
 
         # task failure
-        if process.returncode != 0:
+        if returncode != 0:
             return TaskFailed("Command failed: '%s' returned %s" %
-                              (action, process.returncode))
+                              (action, returncode))
 
         # save stdout in values
         if self.save_out:
             self.values[self.save_out] = self.out
 
 
+    async def execute_async(self, out=None, err=None):
+        """Execute command action on a running asyncio event loop
+
+        Same as `execute()`, but process output is read by the event loop
+        instead of two threads.
+        Commands that can not be spawned by asyncio (a string without
+        `shell`, or a list with `shell`) are executed by `execute()`
+        on the loop's default executor.
+        """
+        import asyncio  # only used by asynchronous runner
+
+        try:
+            action = self.expand_action()
+        except Exception as exc:
+            return TaskError(
+                "CmdAction Error creating command string", exc)
+
+        if self.shell != isinstance(action, str):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self.execute, out, err)
+
+        subprocess_pkwargs, env = self._popen_kwargs()
+        capture_io = self.task.io.capture if self.task else True
+        if capture_io:
+            p_out = p_err = asyncio.subprocess.PIPE
+        else:
+            if capture_io is False:
+                p_out = out
+                p_err = err
+            else:  # None
+                p_out = p_err = asyncio.subprocess.DEVNULL
+
+        # spawn task process
+        if self.shell:
+            process = await asyncio.create_subprocess_shell(
+                action, stdout=p_out, stderr=p_err, env=env,
+                **subprocess_pkwargs)
+        else:
+            process = await asyncio.create_subprocess_exec(
+                *action, stdout=p_out, stderr=p_err, env=env,
+                **subprocess_pkwargs)
+
+        try:
+            if capture_io:
+                output = StringIO()
+                errput = StringIO()
+                try:
+                    await asyncio.gather(
+                        self._print_output_async(process.stdout, output, out),
+                        self._print_output_async(process.stderr, errput, err))
+                except Exception as exc:
+                    # happens when fails to decoded output
+                    try:
+                        process.terminate()
+                    except ProcessLookupError:
+                        pass  # already terminated
+                    await process.wait()
+                    return TaskError(
+                        "CmdAction Error reading command output", exc)
+                self.out = output.getvalue()
+                self.err = errput.getvalue()
+                self.result = self.out + self.err
+            await process.wait()
+        except BaseException:
+            # execution cancelled, do not leave process running
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass  # already terminated
+            await process.wait()
+            raise
+        return self._returncode_failure(action, process.returncode)
+
+
+    async def _print_output_async(self, input_, capture, realtime):
+        """Reads stream 'input_' until EOF.
+        Writes 'input_' content to 'capture' (string)
+        and 'realtime' stream
+        """
+        import asyncio  # only used by asynchronous runner
+
+        while True:
+            if self.buffering:
+                data = await input_.read(self.buffering)
+            else:
+                # line buffered
+                try:
+                    data = await input_.readuntil(b'\n')
+                except asyncio.IncompleteReadError as exc:  # EOF
+                    data = exc.partial
+                except asyncio.LimitOverrunError as exc:  # very long line
+                    data = await input_.read(exc.consumed)
+            if not data:
+                break
+            line = data.decode(self.encoding, self.decode_error)
+            capture.write(line)
+            if realtime:
+                realtime.write(line)
+                realtime.flush()  # required if on byte buffering mode
+
+
     def expand_action(self):
         """Expand action using task meta informations if action is a string.
         Convert `Path` elements to `str` if action is a list.
@@ -0,0 +1,459 @@
+"""Local content-addressed cache of task targets
+
+A task is identified by a hash of its inputs (actions, `file_dep`
+content, options and `getargs` values...). After a successful
+execution its targets are saved in the cache. When a task with the
+same inputs is executed again (i.e. after switching to another
+branch and back) its targets are restored from the cache instead of
+executing its actions.
+
+Cache directory layout:
+
+ - ``cas/<hh>/<sha256>``: content of files, shared by all tasks
+ - ``ac/<hh>/<key>``: JSON entry for a task key (targets, values, result)
+
+Files in ``cas`` are read-only. The modification time of entries and
+files is updated when they are used, so the least recently used are
+evicted when the cache is larger than its size limit.
+
+A `remote` cache (see `doit.remote_cache`) with the same layout might be
+used to share the cache among machines. Entries not found locally
+are downloaded from the remote, new entries are uploaded on a
+background thread.
+"""
+
+import os
+import re
+import sys
+import json
+import shutil
+import hashlib
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+from .dependency import get_file_hash, get_file_md5
+from .task import result_dep
+
+
+# ioctl to create a copy-on-write clone of a file (linux: btrfs, xfs...)
+FICLONE = 0x40049409
+
+
+def reflink(src, dst):
+    """create `dst` as a copy-on-write clone of `src`
+
+    @return bool: False if not supported by OS/file-system
+    """
+    if fcntl is None or not sys.platform.startswith('linux'):
+        return False
+    with open(src, 'rb') as src_file, open(dst, 'wb') as dst_file:
+        try:
+            fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+        except OSError:
+            return False
+    return True
+
+
+def _code_key(code):
+    """@return hashable description of a code object (nested code included)"""
+    consts = tuple(_code_key(const) if hasattr(const, 'co_code') else const
+                   for const in code.co_consts)
+    return (code.co_code.hex(), repr(consts), code.co_names)
+
+
+def _value_key(value, seen):
+    """@return description of a value used by a callable (default, closure)"""
+    if isinstance(value, functools.partial) or hasattr(value, '__code__'):
+        return callable_key(value, seen)
+    return value
+
+
+def callable_key(func, _seen=None):
+    """@return description of python callable, changes when its code or
+    values it uses (defaults, closure, partial arguments) change
+    """
+    seen = set() if _seen is None else _seen
+    if id(func) in seen:  # already described (i.e. recursive closure)
+        return ['seen']
+    seen.add(id(func))
+    if isinstance(func, functools.partial):
+        return ['partial', callable_key(func.func, seen),
+                [_value_key(arg, seen) for arg in func.args],
+                {name: _value_key(value, seen)
+                 for name, value in func.keywords.items()}]
+    state = None  # attributes of bound object or callable object
+    if hasattr(func, '__func__'):  # bound methods
+        if not isinstance(func.__self__, type):
+            state = getattr(func.__self__, '__dict__', None)
+        func = func.__func__
+    elif (not hasattr(func, '__code__')
+          and hasattr(type(func).__call__, '__code__')):  # callable object
+        state = getattr(func, '__dict__', None)
+        func = type(func).__call__
+    if state is not None:
+        state = {name: _value_key(value, seen)
+                 for name, value in state.items()}
+    name = '{}.{}'.format(getattr(func, '__module__', ''),
+                          getattr(func, '__qualname__', repr(func)))
+    code = getattr(func, '__code__', None)
+    if code is None:  # builtin
+        return [name, None]
+    closure = []
+    for cell in getattr(func, '__closure__', None) or ():
+        try:
+            closure.append(_value_key(cell.cell_contents, seen))
+        except ValueError:  # empty cell
+            closure.append(None)
+    defaults = [_value_key(value, seen)
+                for value in getattr(func, '__defaults__', None) or ()]
+    kwdefaults = {name: _value_key(value, seen) for name, value
+                  in (getattr(func, '__kwdefaults__', None) or {}).items()}
+    return [name, repr(_code_key(code)), defaults, kwdefaults, closure, state]
+
+
+def action_key(action):
+    """@return description of an action used to compute a task key"""
+    if hasattr(action, 'py_callable'):
+        return ['python', callable_key(action.py_callable),
+                action.args, action.kwargs]
+    if hasattr(action, 'pkwargs'):
+        cmd = action._action
+        if callable(cmd) or isinstance(cmd, tuple):
+            # callable that returns the command
+            ref = cmd[0] if isinstance(cmd, tuple) else cmd
+            cmd = [callable_key(ref), list(cmd[1:])
+                   if isinstance(cmd, tuple) else None]
+        return ['cmd', cmd, action.shell, action.save_out, action.pkwargs]
+    return [type(action).__qualname__, repr(action)]
+
+
+class ActionCache:
+    """Cache of task targets indexed by a hash of task inputs
+
+    :ivar str path: cache directory
+    :ivar int max_size: max size in bytes of cached files (0 -> no limit)
+    :ivar bool hardlink: restore targets as hard-links to cached files,
+                         restored targets are read-only
+    :ivar int hits: number of tasks restored from the cache
+    :ivar int misses: number of cacheable tasks not found in the cache
+    :ivar int stored: number of tasks saved in the cache
+    :ivar int evicted: number of entries removed to limit cache size
+    :ivar remote: remote cache (see `doit.remote_cache`), on any error
+                  it is not used anymore during the run
+    :ivar bool upload: upload new entries to remote
+    :ivar int remote_hits: number of hits downloaded from remote
+    :ivar int uploaded: number of entries uploaded to remote
+    :ivar int remote_errors: number of failed requests to remote
+    """
+    VERSION = 1
+    UPLOAD_WORKERS = 4
+    _DIGEST_RE = re.compile('[0-9a-f]{64}')
+
+    def __init__(self, path, max_size=0, hardlink=False, remote=None,
+                 upload=True):
+        self.path = path
+        self.max_size = max_size
+        self.hardlink = hardlink
+        self.remote = remote
+        self.upload = upload
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.evicted = 0
+        self.remote_hits = 0
+        self.uploaded = 0
+        self.remote_errors = 0
+        self._upload_executor = None
+        self._lock = threading.Lock()  # protects remote counters
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, 'ac', key[:2], key)
+
+    def _blob_path(self, digest):
+        return os.path.join(self.path, 'cas', digest[:2], digest)
+
+    @staticmethod
+    def _write(path, content, mode=None):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'wb') as fp:
+            fp.write(content)
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def cacheable(task):
+        """tasks are cached only if all inputs are known
+
+        `uptodate` added by `getargs` is accepted, the values taken from
+        other tasks are included on the key (as task options).
+        """
+        if not (task.targets and task.actions):
+            return False
+        getargs_tasks = {task_id for task_id, _ in task.getargs.values()}
+        return all(isinstance(utd, result_dep) and utd.setup_dep
+                   and utd.dep_name in getargs_tasks
+                   for utd, _, _ in task.uptodate)
+
+    def task_key(self, task, file_hash=get_file_md5):
+        """@return (str) key of task inputs, None if task is not cacheable
+
+        @param file_hash: function that returns signature of file content
+        """
+        if not self.cacheable(task):
+            return None
+        try:
+            deps = {dep: file_hash(dep) for dep in task.file_dep}
+        except OSError:
+            return None
+        data = [self.VERSION, task.name,
+                [action_key(action) for action in task.actions],
+                sorted(deps.items()), sorted(task.targets),
+                task.options, task.pos_arg_val]
+        encoded = json.dumps(data, sort_keys=True, default=repr)
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+    def _load(self, key):
+        """@return (dict) entry saved for key, None if not in cache"""
+        try:
+            with open(self._entry_path(key), 'rb') as fp:
+                entry = json.loads(fp.read().decode('utf-8'))
+        except (OSError, ValueError):
+            return self._fetch(key)
+        blobs = [self._blob_path(digest)
+                 for digest, _ in entry['targets'].values()]
+        if not all(os.path.exists(blob) for blob in blobs):
+            return self._fetch(key)
+        return entry
+
+    def _remote_error(self):
+        """remote is not used anymore after an error (avoid timeouts)"""
+        with self._lock:
+            self.remote_errors += 1
+            self.remote = None
+
+    def _fetch(self, key):
+        """download entry and its files from remote into local cache
+
+        @return (dict) entry, None if not found or on remote errors
+        """
+        remote = self.remote
+        if remote is None:
+            return None
+        try:
+            content = remote.get('ac', key)
+            if content is None:
+                return None
+            entry = json.loads(content.decode('utf-8'))
+            for digest, _ in entry['targets'].values():
+                if not self._DIGEST_RE.fullmatch(digest):
+                    return None
+                blob = self._blob_path(digest)
+                if os.path.exists(blob):
+                    continue
+                data = remote.get('cas', digest)
+                if data is None or hashlib.sha256(data).hexdigest() != digest:
+                    return None
+                self._write(blob, data, 0o444)
+            self._write(self._entry_path(key), content)
+        except OSError:
+            self._remote_error()
+            return None
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return None  # invalid entry
+        self.remote_hits += 1
+        return entry
+
+    def _restore_file(self, blob, target, mode):
+        dirname = os.path.dirname(target)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        if os.path.lexists(target):
+            os.remove(target)
+        if self.hardlink:
+            try:
+                os.link(blob, target)
+            except OSError:
+                pass
+            else:
+                return
+        if not reflink(blob, target):
+            shutil.copyfile(blob, target)
+        os.chmod(target, mode)
+
+    def restore(self, key, targets):
+        """restore targets of task saved with `key`
+
+        @param targets: (list - str) expected targets of task
+        @return (dict) entry with task's `values` and `result`,
+                None if not in cache
+        """
+        entry = self._load(key)
+        if entry is None or set(entry['targets']) != set(targets):
+            self.misses += 1
+            return None
+        for target, (digest, mode) in entry['targets'].items():
+            blob = self._blob_path(digest)
+            self._restore_file(blob, target, mode)
+            os.utime(blob)
+        os.utime(self._entry_path(key))
+        self.hits += 1
+        return entry
+
+    def unlink_hardlinks(self, targets):
+        """remove targets that are hard-links to cached files
+
+        To be called before executing a task that was not restored,
+        so its actions do not modify the cached content.
+        """
+        for target in targets:
+            try:
+                if os.stat(target).st_nlink < 2:
+                    continue
+                blob = self._blob_path(get_file_hash(target, 'sha256'))
+                if os.path.exists(blob) and os.path.samefile(target, blob):
+                    os.remove(target)
+            except OSError:
+                pass
+
+    def _store_file(self, path):
+        """save content of file `path` in the cache
+
+        @return (str) digest of content
+        """
+        digest = get_file_hash(path, 'sha256')
+        blob = self._blob_path(digest)
+        if os.path.exists(blob):
+            os.utime(blob)
+            return digest
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        tmp_path = '{}.{}.tmp'.format(blob, os.getpid())
+        if not reflink(path, tmp_path):
+            shutil.copyfile(path, tmp_path)
+        os.chmod(tmp_path, 0o444)
+        os.replace(tmp_path, blob)
+        return digest
+
+    def put(self, key, task):
+        """save targets, values and result of a successful task
+
+        @return bool: False if task could not be saved
+        """
+        targets = {}
+        try:
+            for target in task.targets:
+                if not os.path.isfile(target):
+                    return False
+                mode = os.stat(target).st_mode & 0o777
+                targets[target] = [self._store_file(target), mode]
+            entry = {'targets': targets, 'values': task.values,
+                     'result': task.result}
+            content = json.dumps(entry).encode('utf-8')
+            self._write(self._entry_path(key), content)
+        except (OSError, TypeError, ValueError):
+            return False
+        self.stored += 1
+        if self.remote is not None and self.upload:
+            if self._upload_executor is None:
+                self._upload_executor = ThreadPoolExecutor(
+                    self.UPLOAD_WORKERS, thread_name_prefix='doit-upload')
+            digests = [digest for digest, _ in targets.values()]
+            self._upload_executor.submit(self._upload, key, content, digests)
+        return True
+
+    def _upload(self, key, content, digests):
+        """upload entry to remote, files are uploaded before the entry"""
+        remote = self.remote
+        if remote is None:
+            return
+        try:
+            for digest in digests:
+                with open(self._blob_path(digest), 'rb') as fp:
+                    remote.put('cas', digest, fp.read())
+            remote.put('ac', key, content)
+        except OSError:
+            self._remote_error()
+        else:
+            with self._lock:
+                self.uploaded += 1
+
+    def _scan(self, kind):
+        """@return list of (path, stat) of all files in ``cas`` or ``ac``"""
+        found = []
+        base = os.path.join(self.path, kind)
+        if not os.path.isdir(base):
+            return found
+        for sub_dir in os.scandir(base):
+            if not sub_dir.is_dir():
+                continue
+            for entry in os.scandir(sub_dir.path):
+                if not entry.name.endswith('.tmp'):
+                    found.append((entry.path, entry.stat()))
+        return found
+
+    def evict(self):
+        """remove least recently used entries until cache fits max_size"""
+        if not self.max_size:
+            return
+        blobs = {os.path.basename(path): (path, stat.st_size)
+                 for path, stat in self._scan('cas')}
+        total = sum(size for _, size in blobs.values())
+        if total <= self.max_size:
+            return
+
+        entries = []
+        refs = {}
+        for path, stat in self._scan('ac'):
+            try:
+                with open(path, 'rb') as fp:
+                    entry = json.loads(fp.read().decode('utf-8'))
+                digests = [digest for digest, _ in entry['targets'].values()]
+            except (OSError, ValueError, KeyError):
+                digests = []
+            entries.append((stat.st_mtime, path, digests))
+            for digest in digests:
+                refs[digest] = refs.get(digest, 0) + 1
+
+        def remove_blob(digest):
+            path, size = blobs.pop(digest)
+            os.remove(path)
+            return size
+
+        # files not used by any entry
+        for digest in [digest for digest in blobs if digest not in refs]:
+            total -= remove_blob(digest)
+        for _, path, digests in sorted(entries):
+            if total <= self.max_size:
+                break
+            os.remove(path)
+            self.evicted += 1
+            for digest in digests:
+                refs[digest] -= 1
+                if refs[digest] == 0 and digest in blobs:
+                    total -= remove_blob(digest)
+
+    def close(self):
+        """wait for uploads, evict entries if anything was added"""
+        if self._upload_executor is not None:
+            self._upload_executor.shutdown()
+            self._upload_executor = None
+        if self.stored:
+            self.evict()
+
+    def stats(self):
+        """@return dict with number of hits, misses, stored and evicted
+
+        remote statistics are included if `remote` was used
+        """
+        stats = {'hits': self.hits, 'misses': self.misses,
+                 'stored': self.stored, 'evicted': self.evicted}
+        if self.remote_hits or self.uploaded or self.remote_errors:
+            stats.update(remote_hits=self.remote_hits, uploaded=self.uploaded,
+                         remote_errors=self.remote_errors)
+        return stats
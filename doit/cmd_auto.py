@@ -0,0 +1,190 @@
+import os
+import subprocess
+
+from .exceptions import InvalidCommand
+from .task import Stream
+from .control import TaskControl, norm_path
+from .filewatch import FileWatcher
+from .cmd_run import Run
+from .cmd_run import opt_verbosity, opt_reporter, opt_continue
+from .cmd_run import opt_num_process, opt_parallel_type, opt_pools
+from .cmd_run import opt_jobserver, parse_pools
+from .cmd_run import opt_auto_delayed_regex, opt_report_failure_verbosity
+from .jobserver import get_jobserver
+
+
+opt_debounce = {
+    'name': 'debounce',
+    'long': 'debounce',
+    'type': float,
+    'default': 0.1,
+    'help': """seconds without new modifications before tasks are executed,
+a burst of modifications triggers a single run [default: %(default)s]"""
+}
+
+opt_success_callback = {
+    'name': 'success_callback',
+    'long': 'success-callback',
+    'type': str,
+    'default': '',
+    'help': "shell command executed after a successful run",
+}
+
+opt_failure_callback = {
+    'name': 'failure_callback',
+    'long': 'failure-callback',
+    'type': str,
+    'default': '',
+    'help': "shell command executed after a failed run",
+}
+
+
+class Auto(Run):
+    doc_purpose = "automatically execute tasks when a dependency changes"
+    doc_usage = "[TASK ...]"
+    doc_description = """
+Execute tasks, then watch the `file_dep` and `watch` paths of the selected
+tasks (Linux only, uses inotify). When a file is modified only tasks
+affected by the modification are checked again.
+Tasks and the dependency DB are kept in memory between runs, so
+modifications of the dodo file itself are not taken into account.
+Runs until interrupted with Ctrl-C."""
+
+    cmd_options = (opt_verbosity, opt_reporter, opt_continue,
+                   opt_num_process, opt_parallel_type, opt_pools,
+                   opt_jobserver,
+                   opt_auto_delayed_regex, opt_report_failure_verbosity,
+                   opt_debounce, opt_success_callback, opt_failure_callback)
+
+    watcher_class = FileWatcher
+
+    # task run_status that do not need to be checked again if its files
+    # are not modified
+    DONE_STATUS = ('up-to-date', 'successful', 'ignore')
+
+
+    def _selected_tasks(self):
+        """iterator of selected tasks and its dependencies"""
+        tasks = self.control.tasks
+        processed = set()
+        to_process = list(self.control.selected_tasks)
+        while to_process:
+            name = to_process.pop()
+            if name in processed:
+                continue
+            processed.add(name)
+            task = tasks[name]
+            yield task
+            to_process.extend(task.task_dep)
+            to_process.extend(task.setup_tasks)
+            to_process.extend(task.calc_dep)
+
+
+    def watched_paths(self):
+        """@return (files, dirs) to be watched, targets are not included"""
+        files = set()
+        dirs = set()
+        for task in self._selected_tasks():
+            files.update(norm_path(path) for path in task.file_dep)
+            for path in task.watch:
+                path = norm_path(path)
+                if os.path.isdir(path):
+                    dirs.add(path)
+                else:
+                    files.add(path)
+        self._targets = {norm_path(target)
+                         for task in self.control.tasks.values()
+                         for target in task.targets}
+        return files - self._targets, dirs
+
+
+    def ignore_path(self, path):
+        """modifications done by doit itself: targets and dependency DB"""
+        return path in self._targets or path.startswith(self._db_prefix)
+
+
+    def affected_by(self, changed):
+        """@return (set - str) name of tasks to be checked after
+        modification of `changed` paths
+        """
+        extra = set(self._pending)
+        for task in self.control.tasks.values():
+            if any(norm_path(path) in changed for path in task.watch):
+                extra.add(task.name)
+        return self.control.affected_tasks(changed, extra)
+
+
+    def run_once(self, reporter, run_args, affected, run_kwargs=None):
+        """execute tasks once, DB is kept open
+
+        @return result code
+        """
+        if isinstance(reporter, str):
+            reporter_obj = self.reporters[reporter](
+                self.outstream, {'failure_verbosity': self._failure_verbosity})
+        else:  # also accepts reporter instances
+            reporter_obj = reporter
+        for task in self.control.tasks.values():
+            task.executed = False
+        runner = self._runner_class(self.dep_manager, reporter_obj,
+                                    *run_args, affected=affected,
+                                    keep_db_open=True, **(run_kwargs or {}))
+        dispatcher = self.task_dispatcher(self._num_process)
+        result = runner.run_all(dispatcher)
+        # tasks not successfully finished are checked again on next run
+        self._pending = set()
+        for name in self.control.tasks:
+            node = dispatcher.nodes.get(name)
+            if node is None or node.run_status not in self.DONE_STATUS:
+                self._pending.add(name)
+        return result
+
+
+    def _execute(self, verbosity=None, reporter='console', continue_=False,
+                 num_process=0, par_type='process', pools=(),
+                 jobserver=False, auto_delayed_regex=False,
+                 force_verbosity=False, failure_verbosity=0, debounce=0.1,
+                 success_callback='', failure_callback=''):
+        if not self.watcher_class.available():
+            raise InvalidCommand('auto command requires Linux inotify.')
+        self.control = TaskControl(self.task_list,
+                                   auto_delayed_regex=auto_delayed_regex)
+        self.control.process(self.sel_tasks)
+
+        self._runner_class = self.get_runner_class(num_process, par_type)
+        self._failure_verbosity = failure_verbosity
+        self._num_process = num_process
+        self._targets = set()
+        self._pending = set()
+        self._db_prefix = norm_path(self.dep_manager.name)
+        stream = Stream(verbosity, force_verbosity)
+        run_args = [continue_, False, stream]
+        run_kwargs = {}
+        job_server = None
+        if num_process:
+            run_args.append(num_process)
+            run_kwargs['pools'] = parse_pools(pools)
+
+        watcher = self.watcher_class(ignore=self.ignore_path)
+        if num_process and jobserver:
+            job_server = get_jobserver(num_process)
+            run_kwargs['jobserver'] = job_server
+        result = 0
+        affected = None  # on first run all tasks are checked
+        try:
+            while True:
+                result = self.run_once(reporter, run_args, affected,
+                                       run_kwargs)
+                callback = success_callback if result == 0 else failure_callback
+                if callback:
+                    subprocess.call(callback, shell=True)
+                watcher.watch(*self.watched_paths())
+                changed = watcher.wait(debounce)
+                affected = None if changed is None else self.affected_by(changed)
+        except KeyboardInterrupt:
+            return result
+        finally:
+            watcher.close()
+            self.dep_manager.close()
+            if job_server is not None:
+                job_server.close()
@@ -1,5 +1,6 @@
 import inspect
 import sys
+import functools
 from collections import deque
 from collections import defaultdict
 import textwrap
@@ -8,7 +9,9 @@ from .globals import Globals
 from . import version
 from .cmdparse import CmdOption, CmdParse
 from .exceptions import InvalidCommand, InvalidDodoFile
-from .dependency import CHECKERS, DbmDB, JsonDB, SqliteDB, Dependency, JSONCodec
+from .dependency import CHECKERS, DbmDB, JsonDB, SqliteDB, JournalDB
+from .dependency import Dependency, JSONCodec, MarshalCodec
+from .dependency import HashChecker, hash_algorithms
 from .action import CmdAction
 from .plugin import PluginDict
 from . import loader
@@ -226,7 +229,8 @@ opt_codec = {
     'long': '',
     'type': str,
     'default': "json",
-    'help': ("Select codec for task's data in database. [default: %(default)s]")
+    'help': ("Select codec for task's data in database, "
+             "'json' or 'marshal'. [default: %(default)s]")
 }
 
 opt_check_file_uptodate = {
@@ -240,10 +244,96 @@ opt_check_file_uptodate = {
 Choose how to check if files have been modified.
 Available options [default: %(default)s]:
   'md5': use the md5sum
+  'md5_stat': use the md5sum, skip it if the full file stat is unchanged
+  'git': use git blob ids, read from the git index for clean files
   'timestamp': use the timestamp
+  or the name of a hashlib algorithm (i.e. 'blake2b', 'sha256')
 """
 }
 
+opt_hash_buffer_size = {
+    'section': 'doit core',
+    'name': 'hash_buffer_size',
+    'short': '',
+    'long': 'hash-buffer-size',
+    'type': int,
+    'default': 0,
+    'help': ("number of bytes read at a time when computing file hash with "
+             "a hashlib algorithm set on `check_file_uptodate`, 0 uses "
+             "the default (1 MB) [default: %(default)s]")
+}
+
+opt_hash_workers = {
+    'section': 'doit core',
+    'name': 'hash_workers',
+    'short': '',
+    'long': 'hash-workers',
+    'type': int,
+    'default': 0,
+    'help': ("number of threads used to compute file signatures, "
+             "0 computes them on the main thread [default: %(default)s]")
+}
+
+opt_sqlite_pragmas = {
+    'section': 'doit core',
+    'name': 'sqlite_pragmas',
+    'short': '',
+    'long': 'sqlite-pragmas',
+    'type': list,
+    'default': ['journal_mode=WAL', 'synchronous=NORMAL'],
+    'metavar': 'PRAGMA=VALUE',
+    'help': ("PRAGMA statements executed when opening the sqlite3 backend, "
+             "name=value (may be repeated) [default: %(default)s]")
+}
+
+opt_file_table = {
+    'section': 'doit core',
+    'name': 'file_table',
+    'short': '',
+    'long': 'file-table',
+    'inverse': 'no-file-table',
+    'type': bool,
+    'default': False,
+    'help': ("save file signatures in a single table shared by all tasks "
+             "instead of on each task [default: %(default)s]")
+}
+
+opt_concurrent_db = {
+    'section': 'doit core',
+    'name': 'concurrent_db',
+    'short': '',
+    'long': 'concurrent-db',
+    'inverse': 'no-concurrent-db',
+    'type': bool,
+    'default': False,
+    'help': ("several doit processes may use the same dependency DB "
+             "at the same time, changes are merged (by task) into the DB "
+             "instead of over-writing it [default: %(default)s]")
+}
+
+opt_checkpoint_tasks = {
+    'section': 'doit core',
+    'name': 'checkpoint_tasks',
+    'short': '',
+    'long': 'checkpoint-tasks',
+    'type': int,
+    'default': 0,
+    'help': ("save dependency DB every N successful tasks, so an interrupted "
+             "run keeps its progress, 0 saves only at the end "
+             "[default: %(default)s]")
+}
+
+opt_checkpoint_interval = {
+    'section': 'doit core',
+    'name': 'checkpoint_interval',
+    'short': '',
+    'long': 'checkpoint-interval',
+    'type': float,
+    'default': 0,
+    'help': ("save dependency DB every N seconds (checked when a task "
+             "succeeds), 0 disables it [default: %(default)s]")
+}
+
 
 
 #### options related to dodo.py
@@ -434,9 +524,19 @@ class DoitCmdBase(Command):
     subclass must define:
     cmd_options => list of option dictionary (see CmdOption)
     _execute => method, argument names must be option names
+
+    subclass may set:
+    read_only_db => (bool) command never modifies the dependency DB,
+                    it is opened in read-only mode and never written
     """
+    read_only_db = False
+
     base_options = (opt_depfile, opt_backend, opt_codec,
-                    opt_check_file_uptodate)
+                    opt_check_file_uptodate, opt_hash_buffer_size,
+                    opt_hash_workers,
+                    opt_file_table, opt_sqlite_pragmas,
+                    opt_checkpoint_tasks, opt_checkpoint_interval,
+                    opt_concurrent_db)
 
     def __init__(self, task_loader, cmds=None, **kwargs):
         super(DoitCmdBase, self).__init__(**kwargs)
@@ -473,9 +573,17 @@ class DoitCmdBase(Command):
                 raise InvalidDodoFile(msg.format(required=minversion,
                                                  actual=version.VERSION))
 
-    def get_checker_cls(self, check_file_uptodate):
-        """return checker class to be used by dep_manager"""
+    def get_checker_cls(self, check_file_uptodate, hash_buffer_size=None):
+        """return checker class to be used by dep_manager
+
+        Apart from CHECKERS names, `check_file_uptodate` might be the name
+        of a hashlib algorithm to be used by `HashChecker`.
+        """
         if isinstance(check_file_uptodate, str):
+            if (check_file_uptodate not in CHECKERS
+                    and check_file_uptodate in hash_algorithms()):
+                return functools.partial(HashChecker, check_file_uptodate,
+                                         hash_buffer_size)
             if check_file_uptodate not in CHECKERS:
                 msg = ("No check_file_uptodate named '{}'."
                        " Type '{} help run' to see a list "
@@ -492,6 +600,8 @@ class DoitCmdBase(Command):
         if isinstance(codec, str):
             if codec == 'json':
                 return JSONCodec
+            elif codec == 'marshal':
+                return MarshalCodec
             else:  # pragma: no cover
                 raise NotImplementedError('Implement codec plugin')
         else:
@@ -501,7 +611,8 @@ class DoitCmdBase(Command):
 
     def get_backends(self):
         """return PluginDict of DB backends, including core and plugins"""
-        backend_map = {'dbm': DbmDB, 'json': JsonDB, 'sqlite3': SqliteDB}
+        backend_map = {'dbm': DbmDB, 'json': JsonDB, 'sqlite3': SqliteDB,
+                       'journal': JournalDB}
         # add plugins
         plugins = PluginDict()
         plugins.add_plugins(self.config, 'BACKEND')
@@ -515,6 +626,32 @@ class DoitCmdBase(Command):
         return backend_map
 
 
+    def get_backend_opts(self, db_class, params):
+        """return dict with extra keyword arguments for backend `db_class`"""
+        opts = {}
+        # only passed if set, custom backends might not support it
+        if params.get('concurrent_db', False):
+            opts['concurrent'] = True
+        if not (isinstance(db_class, type) and issubclass(db_class, SqliteDB)):
+            return opts
+        pragmas = params.get('sqlite_pragmas', None)
+        if pragmas is None:
+            return opts
+        if isinstance(pragmas, dict):
+            opts['pragmas'] = pragmas
+            return opts
+        pragmas_dict = {}
+        items = [part for item in pragmas for part in item.split(',')]
+        for item in items:
+            name, sep, value = item.partition('=')
+            if not sep:
+                msg = "Invalid sqlite_pragmas item '{}', expected NAME=VALUE."
+                raise InvalidCommand(msg.format(item))
+            pragmas_dict[name.strip()] = value.strip()
+        opts['pragmas'] = pragmas_dict
+        return opts
+
+
     def execute(self, params, args):
         """load dodo.py, set attributes and call self._execute
 
@@ -540,7 +677,8 @@ class DoitCmdBase(Command):
 
         # create dep manager
         db_class = self._backends.get(params['backend'])
-        checker_cls = self.get_checker_cls(params['check_file_uptodate'])
+        checker_cls = self.get_checker_cls(params['check_file_uptodate'],
+                                           params.get('hash_buffer_size'))
         codec_cls = self.get_codec_cls(params['codec_cls'])
         # note the command have the responsibility to call dep_manager.close()
 
@@ -548,7 +686,13 @@ class DoitCmdBase(Command):
             # dep_manager might have been already set (used on unit-test)
             self.dep_manager = Dependency(
                 db_class, params['dep_file'], checker_cls=checker_cls,
-                codec_cls=codec_cls)
+                codec_cls=codec_cls,
+                hash_workers=params.get('hash_workers', 0),
+                file_table=params.get('file_table', False),
+                backend_opts=self.get_backend_opts(db_class, params),
+                checkpoint_tasks=params.get('checkpoint_tasks', 0),
+                checkpoint_interval=params.get('checkpoint_interval', 0),
+                read_only=self.read_only_db)
 
         # register dependency manager in global registry:
         Globals.dep_manager = self.dep_manager
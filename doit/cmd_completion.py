@@ -43,6 +43,7 @@ class TabCompletion(DoitCmdBase):
     doc_purpose = "generate script for tab-completion"
     doc_usage = ""
     doc_description = None
+    read_only_db = True
 
     cmd_options = (opt_shell, opt_hardcode_tasks, )
 
@@ -1,11 +1,11 @@
 import pprint
-import json
 import dbm
 from dbm import whichdb
 
 
 from .exceptions import InvalidCommand
 from .cmd_base import Command, opt_depfile
+from .dependency import MarshalCodec
 
 
 def dbm_iter(db):
@@ -44,7 +44,9 @@ class DumpDB(Command):
         if db_type in ('dbm', 'dbm.ndbm'):  # pragma: no cover
             raise InvalidCommand('ndbm does not support iteration of elements')
         data = dbm.open(dep_file)
+        # decodes both JSON and marshal data
+        codec = MarshalCodec()
         for key, value_str in dbm_iter(data):
-            value_dict = json.loads(value_str.decode('utf-8'))
+            value_dict = codec.decode(value_str)
             value_fmt = pprint.pformat(value_dict, indent=4, width=100)
             print("{key} -> {value}".format(key=key, value=value_fmt))
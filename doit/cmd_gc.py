@@ -0,0 +1,51 @@
+import os
+
+from .exceptions import InvalidCommand
+from .cmd_base import DoitCmdBase
+from .dependency import DB_FILE_SUFFIXES
+
+
+def db_files_size(name):
+    """@return int: total size in bytes of files used by DB `name`"""
+    total = 0
+    for suffix in DB_FILE_SUFFIXES:
+        try:
+            total += os.path.getsize(name + suffix)
+        except OSError:
+            pass
+    return total
+
+
+class Gc(DoitCmdBase):
+    doc_purpose = "remove data not used by current tasks from internal DB"
+    doc_usage = ""
+    doc_description = """
+Removes from the DB data saved by tasks that do not exist anymore,
+file signatures of files that are not a `file_dep` of the task anymore
+and entries of the file table not used by any task.
+Afterwards the DB file is compacted, so space used by removed data
+is reclaimed.
+"""
+
+    cmd_options = ()
+
+    def _execute(self):
+        """remove stale data from DB and compact its file"""
+        backend = self.dep_manager.backend
+        if not (hasattr(backend, 'task_ids') and hasattr(backend, 'get_task')):
+            self.dep_manager.close()
+            msg = "DB backend '{}' does not support gc"
+            raise InvalidCommand(msg.format(type(backend).__name__))
+
+        name = self.dep_manager.name
+        size_before = db_files_size(name)
+        removed = self.dep_manager.gc(self.task_list)
+        self.dep_manager.compact()
+        self.dep_manager.close()
+        reclaimed = size_before - db_files_size(name)
+
+        self.outstream.write(
+            "removed: {tasks} tasks, {deps} file states, "
+            "{files} file table entries\n".format(**removed))
+        self.outstream.write(
+            "reclaimed {} bytes\n".format(max(reclaimed, 0)))
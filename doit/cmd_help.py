@@ -108,6 +108,7 @@ class Help(DoitCmdBase):
     doc_purpose = "show help"
     doc_usage = "[TASK] [COMMAND]"
     doc_description = None
+    read_only_db = True
 
     def __init__(self, cmds=None, **kwargs):
         """
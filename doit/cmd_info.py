@@ -22,6 +22,7 @@ class Info(DoitCmdBase):
     doc_purpose = "show info about a task"
     doc_usage = "TASK"
     doc_description = None
+    read_only_db = True
 
     cmd_options = (opt_hide_status, )
 
@@ -72,6 +72,7 @@ class List(DoitCmdBase):
     doc_purpose = "list tasks from dodo file"
     doc_usage = "[TASK ...]"
     doc_description = None
+    read_only_db = True
 
     cmd_options = (opt_listall, opt_list_quiet, opt_list_status,
                    opt_list_private, opt_list_dependencies, opt_template,
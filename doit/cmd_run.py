@@ -3,10 +3,14 @@ import codecs
 
 from .exceptions import InvalidCommand
 from .plugin import PluginDict
-from .action import PythonAction
+from .action import PythonAction, CmdAction
 from .task import Stream
 from .control import TaskControl
-from .runner import Runner, MRunner, MThreadRunner
+from .runner import Runner, MRunner, MThreadRunner, ARunner
+from .action_cache import ActionCache
+from .remote_cache import HttpCache
+from .fingerprint import GraphFingerprint
+from .jobserver import get_jobserver
 from .cmd_base import DoitCmdBase
 from . import reporter
 
@@ -99,10 +103,46 @@ opt_parallel_type = {
     'help': """Tasks can be executed in parallel in different ways:
 'process': uses python multiprocessing module
 'thread': uses threads
+'async': uses asyncio, commands are executed as asynchronous
+         sub-processes, python-actions on threads
 [default: %(default)s]
 """
 }
 
+opt_worker_check = {
+    'name': 'worker_check',
+    'short': '',
+    'long': 'worker-check',
+    'type': bool,
+    'default': False,
+    'help': """Check if tasks are up-to-date on the sub-processes that execute
+them, only the new state of its file_dep is sent back to main process.
+Used only with parallel type 'process'. [default: %(default)s]"""
+}
+
+opt_pools = {
+    'name': 'pools',
+    'short': '',
+    'long': 'pool',
+    'type': list,
+    'default': [],
+    'metavar': 'POOL=SIZE',
+    'help': """Max number of tokens of a pool taken by tasks running in
+parallel, tasks take tokens through attribute `resources`.
+name=size (may be repeated) [default: no pools]"""
+}
+
+opt_jobserver = {
+    'name': 'jobserver',
+    'short': '',
+    'long': 'jobserver',
+    'type': bool,
+    'default': False,
+    'help': """Share the number of parallel jobs with sub-processes (make,
+cargo, doit) through a GNU make jobserver. Uses the jobserver of the parent
+process if available (MAKEFLAGS), otherwise creates one [default: %(default)s]"""
+}
+
 
 # pdb post-mortem
 opt_pdb = {
@@ -140,6 +180,131 @@ opt_report_failure_verbosity = {
 """
 }
 
+opt_action_cache = {
+    'name': 'action_cache',
+    'short': '',
+    'long': 'action-cache',
+    'type': str,
+    'default': '',
+    'help': """Directory used to cache targets of executed tasks.
+Targets are restored from the cache (instead of executing the task) when
+a task with same actions, file_dep content and arguments was executed before.
+[default: '' disabled]"""
+}
+
+opt_action_cache_size = {
+    'name': 'action_cache_size',
+    'short': '',
+    'long': 'action-cache-size',
+    'type': int,
+    'default': 1024,
+    'help': """Max size (MB) of action cache, least recently used entries
+are removed. 0 means no limit. [default: %(default)s]"""
+}
+
+opt_action_cache_hardlink = {
+    'name': 'action_cache_hardlink',
+    'short': '',
+    'long': 'action-cache-hardlink',
+    'type': bool,
+    'default': False,
+    'help': """Restore cached targets as (read-only) hard links instead of
+copies. [default: %(default)s]"""
+}
+
+opt_remote_cache = {
+    'name': 'remote_cache',
+    'short': '',
+    'long': 'remote-cache',
+    'type': str,
+    'default': '',
+    'help': """URL of remote cache shared by several machines, used together
+with --action-cache. Any error accessing remote is ignored.
+[default: '' disabled]"""
+}
+
+opt_remote_cache_timeout = {
+    'name': 'remote_cache_timeout',
+    'short': '',
+    'long': 'remote-cache-timeout',
+    'type': float,
+    'default': 10.0,
+    'help': "seconds to wait for remote cache response [default: %(default)s]"
+}
+
+opt_remote_cache_upload = {
+    'name': 'remote_cache_upload',
+    'short': '',
+    'long': 'remote-cache-upload',
+    'inverse': 'no-remote-cache-upload',
+    'type': bool,
+    'default': True,
+    'help': "upload new entries to remote cache [default: %(default)s]"
+}
+
+opt_fingerprint = {
+    'name': 'fingerprint',
+    'short': '',
+    'long': 'fingerprint',
+    'type': bool,
+    'default': False,
+    'help': """After a successful run save a fingerprint of tasks and stat of
+their files. If nothing changed on the next run, tasks are reported as
+up-to-date without checking each of them. [default: %(default)s]"""
+}
+
+opt_changed_from = {
+    'name': 'changed_from',
+    'short': '',
+    'long': 'changed-from',
+    'type': str,
+    'default': '',
+    'help': """File with a list of modified files (one per line, '-' for stdin).
+Only tasks that depend on those files (and its dependents) are checked,
+other tasks are considered up-to-date. [default: '' check all tasks]"""
+}
+
+
+def parse_pools(pools):
+    """@param pools: (dict) or (list - str) items "name=size"
+    @return dict: pool name -> size
+    """
+    if isinstance(pools, dict):
+        items = list(pools.items())
+    else:
+        items = []
+        for item in (part for value in pools for part in value.split(',')):
+            name, sep, size = item.partition('=')
+            if not sep:
+                msg = "Invalid pool '{}', expected NAME=SIZE."
+                raise InvalidCommand(msg.format(item))
+            items.append((name.strip(), size.strip()))
+    result = {}
+    for name, size in items:
+        try:
+            size = int(size)
+        except (TypeError, ValueError):
+            size = 0
+        if size < 1:
+            msg = "Invalid size of pool '{}', must be a positive integer."
+            raise InvalidCommand(msg.format(name))
+        result[name] = size
+    return result
+
+
+def read_changed_files(path):
+    """@return list of paths listed (one per line) on file `path`"""
+    if path == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        try:
+            with open(path, encoding='utf-8') as fp:
+                lines = fp.read().splitlines()
+        except OSError as error:
+            msg = 'Error reading --changed-from file: {}'
+            raise InvalidCommand(msg.format(error))
+    return [line.strip() for line in lines if line.strip()]
+
 
 class Run(DoitCmdBase):
     doc_purpose = "run tasks"
@@ -149,8 +314,14 @@ class Run(DoitCmdBase):
 
     cmd_options = (opt_always, opt_continue, opt_verbosity,
                    opt_reporter, opt_outfile, opt_num_process,
-                   opt_parallel_type, opt_pdb, opt_single,
-                   opt_auto_delayed_regex, opt_report_failure_verbosity)
+                   opt_parallel_type, opt_worker_check, opt_pools,
+                   opt_jobserver,
+                   opt_pdb, opt_single,
+                   opt_auto_delayed_regex, opt_report_failure_verbosity,
+                   opt_action_cache, opt_action_cache_size,
+                   opt_action_cache_hardlink, opt_remote_cache,
+                   opt_remote_cache_timeout, opt_remote_cache_upload,
+                   opt_fingerprint, opt_changed_from)
 
 
     def __init__(self, **kwargs):
@@ -186,11 +357,63 @@ class Run(DoitCmdBase):
         return reporters
 
 
+    def get_remote_cache(self, url, timeout):
+        """return remote cache for `url`, selected by the URL scheme
+
+        Plugins are registered by scheme on category REMOTE_CACHE.
+        """
+        remotes = PluginDict({'http': HttpCache, 'https': HttpCache})
+        remotes.add_plugins(self.config, 'REMOTE_CACHE')
+        scheme = url.split('://', 1)[0] if '://' in url else ''
+        if scheme not in remotes:
+            msg = 'No remote cache available for URL "{}", schemes: {}'
+            raise InvalidCommand(msg.format(url, ', '.join(sorted(remotes))))
+        return remotes.get_plugin(scheme)(url, timeout=timeout)
+
+
+    @staticmethod
+    def get_runner_class(num_process, par_type):
+        """return runner class for the given parallel options"""
+        if num_process == 0:
+            return Runner
+        if par_type == 'process':
+            if MRunner.available():
+                return MRunner
+            sys.stderr.write(
+                "WARNING: multiprocessing module not available, "
+                "running in parallel using threads.")
+            return MThreadRunner
+        if par_type == 'thread':
+            return MThreadRunner
+        if par_type == 'async':
+            return ARunner
+        msg = "Invalid parallel type %s"
+        raise InvalidCommand(msg % par_type)
+
+
+    def task_dispatcher(self, num_process):
+        """return dispatcher for selected tasks
+
+        On parallel execution, tasks on the critical path (estimated from
+        durations of previous executions) are dispatched first.
+        """
+        priority = None
+        if num_process:
+            durations = self.dep_manager.get_durations(self.control.tasks)
+            priority = self.control.task_priorities(durations)
+        return self.control.task_dispatcher(priority)
+
+
     def _execute(self, outfile,
                  verbosity=None, always=False, continue_=False,
                  reporter='console', num_process=0, par_type='process',
                  single=False, auto_delayed_regex=False, force_verbosity=False,
-                 failure_verbosity=0, pdb=False):
+                 failure_verbosity=0, pdb=False, action_cache='',
+                 action_cache_size=1024, action_cache_hardlink=False,
+                 remote_cache='', remote_cache_timeout=10.0,
+                 remote_cache_upload=True, fingerprint=False,
+                 changed_from='', worker_check=False, pools=(),
+                 jobserver=False):
         """
         @param reporter:
                (str) one of provided reporters or ...
@@ -201,11 +424,26 @@ class Run(DoitCmdBase):
         # configure PythonAction
         PythonAction.pm_pdb = pdb
 
+        # fast path for no-op runs, graph is not even built
+        graph = noop = None
+        if fingerprint and not (always or single or changed_from):
+            graph = GraphFingerprint(
+                self.dep_manager.name + '.fingerprint', self.dep_manager.name,
+                self.task_list,
+                [self.sel_tasks, auto_delayed_regex, CmdAction.STRING_FORMAT,
+                 self.dep_manager.checker_name],
+                workers=self.dep_manager.hash_workers)
+            noop = graph.check()
+            if noop is None:
+                graph.start()
+
         # get tasks to be executed
         # self.control is saved on instance to be used by 'auto' command
-        self.control = TaskControl(self.task_list,
-                                   auto_delayed_regex=auto_delayed_regex)
-        self.control.process(self.sel_tasks)
+        self.control = None
+        if noop is None:
+            self.control = TaskControl(self.task_list,
+                                       auto_delayed_regex=auto_delayed_regex)
+            self.control.process(self.sel_tasks)
 
         if single:
             self.control.process(self.sel_tasks)
@@ -218,6 +456,13 @@ class Run(DoitCmdBase):
                 else:
                     task.task_dep = []
 
+        affected = None
+        if changed_from:
+            changed = read_changed_files(changed_from)
+            new_tasks = [name for name in self.control.tasks
+                         if not self.dep_manager.was_executed(name)]
+            affected = self.control.affected_tasks(changed, new_tasks)
+
         # reporter
         if isinstance(reporter, str):
             reporter_cls = self.reporters[reporter]
@@ -233,6 +478,7 @@ class Run(DoitCmdBase):
         self.outstream = outstream
 
         # run
+        job_server = None
         try:
             if isinstance(reporter_cls, type):
                 reporter_obj = reporter_cls(
@@ -240,29 +486,50 @@ class Run(DoitCmdBase):
             else:  # also accepts reporter instances
                 reporter_obj = reporter_cls
 
+            if noop is not None:
+                self.dep_manager.close()
+                graph.replay(reporter_obj, noop)
+                return 0
+
             stream = Stream(verbosity, force_verbosity)
             run_args = [self.dep_manager, reporter_obj,
                         continue_, always, stream]
 
-            if num_process == 0:
-                RunnerClass = Runner
-            else:
-                if par_type == 'process':
-                    RunnerClass = MRunner
-                    if not MRunner.available():
-                        RunnerClass = MThreadRunner
-                        sys.stderr.write(
-                            "WARNING: multiprocessing module not available, "
-                            "running in parallel using threads.")
-                elif par_type == 'thread':
-                    RunnerClass = MThreadRunner
-                else:
-                    msg = "Invalid parallel type %s"
-                    raise InvalidCommand(msg % par_type)
+            RunnerClass = self.get_runner_class(num_process, par_type)
+            run_kwargs = {}
+            if num_process:
                 run_args.append(num_process)
-
-            runner = RunnerClass(*run_args)
-            return runner.run_all(self.control.task_dispatcher())
+                run_kwargs['worker_check'] = worker_check
+                run_kwargs['pools'] = parse_pools(pools)
+                if jobserver:
+                    job_server = get_jobserver(num_process)
+                    run_kwargs['jobserver'] = job_server
+
+            cache = None
+            if action_cache:
+                remote = None
+                if remote_cache:
+                    remote = self.get_remote_cache(remote_cache,
+                                                   remote_cache_timeout)
+                cache = ActionCache(action_cache, action_cache_size * 2 ** 20,
+                                    hardlink=action_cache_hardlink,
+                                    remote=remote, upload=remote_cache_upload)
+            elif remote_cache:
+                raise InvalidCommand('--remote-cache requires --action-cache')
+            runner = RunnerClass(*run_args, action_cache=cache,
+                                 affected=affected, **run_kwargs)
+            dispatcher = self.task_dispatcher(num_process)
+            result = runner.run_all(dispatcher)
+            if graph is not None:
+                if result == 0:
+                    graph.save([dispatcher.nodes[name]
+                                for name in runner.checked],
+                               self.control.selected_tasks)
+                else:
+                    graph.remove()
+            return result
         finally:
+            if job_server is not None:
+                job_server.close()
             if isinstance(outfile, str):
                 outstream.close()
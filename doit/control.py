@@ -1,7 +1,11 @@
 """Control tasks execution order"""
+import os
+import heapq
 import fnmatch
+import itertools
 from collections import deque
 from collections import OrderedDict
+from collections import defaultdict
 import re
 
 from .exceptions import InvalidTask, InvalidCommand, InvalidDodoFile
@@ -9,6 +13,25 @@ from .task import Task, DelayedLoaded
 from .loader import generate_tasks
 
 
+def norm_path(path):
+    """@return normalized absolute path, used to compare file paths"""
+    return os.path.normpath(os.path.abspath(path))
+
+
+def file_index(tasks):
+    """reverse index of file_dep
+
+    @param tasks: (iterable - Task)
+    @return dict: normalized file path -> set of names of tasks that
+                  have it as a `file_dep`
+    """
+    index = defaultdict(set)
+    for task in tasks:
+        for dep in task.file_dep:
+            index[norm_path(dep)].add(task.name)
+    return index
+
+
 class RegexGroup:
     '''Helper to keep track of all delayed-tasks which regexp target
     matches the target specified from command line.
@@ -259,13 +282,102 @@ class TaskControl:
             self.selected_tasks = self._def_order
 
 
-    def task_dispatcher(self):
+    def affected_tasks(self, changed_files, extra=()):
+        """tasks that might be affected by a modification of `changed_files`
+
+        Tasks with a changed `file_dep` and all tasks that depend on them
+        (through `task_dep`, including implicit ones, or `calc_dep`).
+        Tasks which `file_dep` are not known before execution (`calc_dep`
+        or created by delayed task-creators) are always included.
+
+        @param changed_files: (iterable - str) path of modified files
+        @param extra: (iterable - str) name of other tasks to be included
+        @return set - str: task names
+        """
+        index = file_index(self.tasks.values())
+        seeds = set(extra)
+        for path in changed_files:
+            seeds.update(index.get(norm_path(path), ()))
+        dependents = defaultdict(list)
+        for task in self.tasks.values():
+            if task.calc_dep or task.loader:
+                seeds.add(task.name)
+            for dep in task.task_dep + list(task.calc_dep):
+                dependents[dep].append(task.name)
+
+        affected = set()
+        to_visit = list(seeds)
+        while to_visit:
+            name = to_visit.pop()
+            if name in affected:
+                continue
+            affected.add(name)
+            to_visit.extend(dependents[name])
+        return affected
+
+
+    def task_priorities(self, durations):
+        """estimated time from the start of each task to the end of the run,
+        the longest path through tasks that depend on it (critical path)
+
+        Tasks without a known duration are estimated with the median of
+        known durations, tasks without actions take no time.
+
+        @param durations: (dict) task name -> seconds taken by last execution
+        @return dict: task name -> priority,
+                      None if no duration is known
+        """
+        if not durations:
+            return None
+        known = sorted(durations.values())
+        default = known[len(known) // 2]
+
+        # selected tasks and its dependencies
+        deps = {}
+        to_visit = list(self.selected_tasks)
+        while to_visit:
+            name = to_visit.pop()
+            if name in deps or name not in self.tasks:
+                continue
+            task = self.tasks[name]
+            deps[name] = [dep for dep in (task.task_dep + task.setup_tasks
+                                          + list(task.calc_dep))
+                          if dep in self.tasks]
+            to_visit.extend(deps[name])
+        dependents = defaultdict(list)
+        for name, dep_names in deps.items():
+            for dep in dep_names:
+                dependents[dep].append(name)
+
+        # a task is processed after all tasks that depend on it,
+        # tasks in a cycle are never processed (error on dispatch)
+        pending = {name: len(dependents[name]) for name in deps}
+        to_process = [name for name, count in pending.items() if count == 0]
+        priority = {}
+        while to_process:
+            name = to_process.pop()
+            task = self.tasks[name]
+            cost = durations.get(name, default) if task.actions else 0
+            priority[name] = cost + max(
+                (priority[dependent] for dependent in dependents[name]),
+                default=0)
+            for dep in deps[name]:
+                pending[dep] -= 1
+                if pending[dep] == 0:
+                    to_process.append(dep)
+        return priority
+
+
+    def task_dispatcher(self, priority=None):
         """return a TaskDispatcher generator
+
+        @param priority: (dict) task name -> priority (see `task_priorities`)
         """
         assert self.selected_tasks is not None, \
             "must call 'process' before this"
 
-        return TaskDispatcher(self.tasks, self.targets, self.selected_tasks)
+        return TaskDispatcher(self.tasks, self.targets, self.selected_tasks,
+                              priority)
 
 
 
@@ -349,20 +461,53 @@ def no_none(decorated):
 
 
 
+class ReadyQueue:
+    """queue of ExecNode, highest priority first
+
+    Nodes with same priority (or without priority) are FIFO.
+    Same interface as the `deque` used when no priority is given.
+    """
+    def __init__(self, priority):
+        """@param priority: (dict) task name -> priority"""
+        self.priority = priority
+        self._heap = []
+        self._count = itertools.count()
+
+    def append(self, node):
+        priority = self.priority.get(node.task.name, 0)
+        heapq.heappush(self._heap, (-priority, next(self._count), node))
+
+    def popleft(self):
+        return heapq.heappop(self._heap)[2]
+
+    def __len__(self):
+        return len(self._heap)
+
+
+
 class TaskDispatcher:
     """Dispatch another task to be selected/executed, mostly handle with MP
 
     Note that a dispatched task might not be ready to be executed.
     """
-    def __init__(self, tasks, targets, selected_tasks):
+    def __init__(self, tasks, targets, selected_tasks, priority=None):
+        """
+        @param priority: (dict) task name -> priority, ready tasks with
+                         higher priority are dispatched first.
+                         If None tasks are dispatched in selection order.
+        """
         self.tasks = tasks
         self.targets = targets
         self.selected_tasks = selected_tasks
+        self.priority = priority
 
         self.nodes = {}  # key task-name, value: ExecNode
         # queues
         self.waiting = set()  # of ExecNode
-        self.ready = deque()  # of ExecNode
+        if priority is None:
+            self.ready = deque()  # of ExecNode
+        else:
+            self.ready = ReadyQueue(priority)
 
         self.generator = self._dispatcher_generator(selected_tasks)
 
@@ -610,6 +755,9 @@ class TaskDispatcher:
         # each selected task will create a tree (from dependencies) of
         # tasks to be processed
         tasks_to_run = list(reversed(selected_tasks))
+        if self.priority is not None:
+            # stable sort, highest priority at the end of the list
+            tasks_to_run.sort(key=lambda name: self.priority.get(name, 0))
         node = None  # current active ExecNode
 
         while True:
@@ -1,21 +1,84 @@
 """Manage (save/check) task dependency-on-files data."""
 
 import os
+import time
 import hashlib
+import functools
 import subprocess
 import inspect
 import json
+import marshal
+import mmap
+import struct
 from collections import defaultdict
 import importlib
 import dbm
+import threading
+from concurrent.futures import ThreadPoolExecutor
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+    import msvcrt
+
+from . import gitindex
 
 # note: to check which DBM backend is being used:
 #   >>> doit dumpdb
 
+# suffixes of files that might be used by DB backends
+DB_FILE_SUFFIXES = ('', '.db', '.dat', '.dir', '.bak', '-wal')
+
 
 class DatabaseException(Exception):
     """Exception class for whatever backend exception"""
-    pass
+
+
+class FileLock:
+    """Inter-process exclusive lock on a file (created if necessary)
+
+    Used by backends on `concurrent` mode, the DB file itself can not be
+    used because it is replaced on writes.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def acquire(self):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            else:  # pragma: no cover
+                while True:
+                    try:
+                        # LK_LOCK gives up after 10 seconds
+                        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        pass
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+
+    def release(self):
+        fd, self._fd = self._fd, None
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:  # pragma: no cover
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(fd)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
 
 
 def get_md5(input_data):
@@ -24,21 +87,84 @@ def get_md5(input_data):
     return hashlib.md5(byte_data).hexdigest()
 
 
+# files larger than this are hashed using mmap
+MMAP_THRESHOLD = 4 * 1024 * 1024
+
+
+def _hash_file(hasher, path, block_size):
+    """update `hasher` with content of file in `path`
+
+    Large regular files are memory-mapped and passed to the hasher
+    without copying. Other files are read into a single re-used buffer.
+    @return hasher
+    """
+    with open(path, 'rb', buffering=0) as file_data:
+        fileno = file_data.fileno()
+        if os.fstat(fileno).st_size >= MMAP_THRESHOLD:
+            try:
+                with mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) as mapped:
+                    hasher.update(mapped)
+                return hasher
+            except (OSError, ValueError):
+                # file can not be mapped, fallback to read
+                file_data.seek(0)
+        buf = bytearray(block_size)
+        view = memoryview(buf)
+        while True:
+            size = file_data.readinto(buf)
+            if not size:
+                break
+            hasher.update(view[:size])
+    return hasher
+
+
 def get_file_md5(path):
     """Calculate the md5 sum from file content.
 
     @param path: (string) file path
     @return: (string) md5
     """
-    with open(path, 'rb') as file_data:
-        md5 = hashlib.md5()
-        block_size = 128 * md5.block_size
-        while True:
-            data = file_data.read(block_size)
-            if not data:
-                break
-            md5.update(data)
-    return md5.hexdigest()
+    md5 = hashlib.md5()
+    return _hash_file(md5, path, 128 * md5.block_size).hexdigest()
+
+
+def get_file_hash(path, algorithm, buffer_size=None):
+    """Calculate the hash from file content.
+
+    @param path: (string) file path
+    @param algorithm: (string) name of a `hashlib` algorithm
+    @param buffer_size: (int) number of bytes read at a time,
+                        default is 128 times the algorithm block size
+    @return: (string) hex digest
+    """
+    hasher = hashlib.new(algorithm)
+    block_size = buffer_size or 128 * hasher.block_size
+    return _hash_file(hasher, path, block_size).hexdigest()
+
+
+def hash_algorithms():
+    """@return (set - str): hashlib algorithms usable by `HashChecker`"""
+    algorithms = set()
+    for name in hashlib.algorithms_available:
+        try:
+            hasher = hashlib.new(name)
+        except ValueError:
+            # listed by OpenSSL but not available (i.e. legacy provider)
+            continue
+        # variable length digests (shake_*) are not supported
+        if hasher.digest_size:
+            algorithms.add(name)
+    return algorithms
+
+
+def _map_files(func, paths, executor):
+    """apply `func` to all `paths`, using `executor` if there is more than one
+
+    @return (list): results in the same order as `paths`
+    """
+    if executor is None or len(paths) < 2:
+        return [func(path) for path in paths]
+    return list(executor.map(func, paths))
 
 
 class JSONCodec():
@@ -54,14 +180,77 @@ class JSONCodec():
         return self.decoder.decode(data)
 
 
+class MarshalCodec():
+    """binary codec using python's `marshal`, faster than `JSONCodec`
+
+    Encoded data starts with a header containing the format version.
+    Data without the header is decoded as JSON, so a DB created with
+    `JSONCodec` can be read (and is converted when saved again).
+
+    Note that `marshal` format is not guaranteed to be stable across
+    python versions and must not be loaded from untrusted sources.
+    """
+    binary = True
+    HEADER = b'\x00doit-marshal\x01'
+    MARSHAL_VERSION = 4
+
+    def __init__(self):
+        self.json_codec = JSONCodec()
+
+    def encode(self, data):
+        return self.HEADER + marshal.dumps(data, self.MARSHAL_VERSION)
+
+    def decode(self, data):
+        if isinstance(data, bytes):
+            if data.startswith(self.HEADER):
+                try:
+                    return marshal.loads(data[len(self.HEADER):])
+                except (EOFError, TypeError) as exception:
+                    raise ValueError(str(exception))
+            data = data.decode('utf-8')
+        return self.json_codec.decode(data)
+
+
+def codec_encode(codec, data):
+    """encode data with codec, @return bytes"""
+    encoded = codec.encode(data)
+    if getattr(codec, 'binary', False):
+        return encoded
+    return encoded.encode('utf-8')
+
+
+def codec_decode(codec, raw):
+    """decode bytes `raw` (as returned by `codec_encode`)"""
+    if getattr(codec, 'binary', False):
+        return codec.decode(raw)
+    return codec.decode(raw.decode('utf-8'))
+
+
 
 class JsonDB:
-    """Backend using a single text file with JSON content"""
+    """Backend using a single text file with JSON content
 
-    def __init__(self, name, codec, *, module_name=None):
+    On `concurrent` mode, changes are merged (by task) into the current
+    content of the file while holding a lock, instead of over-writing
+    the whole file.
+    On `read_only` mode, the file is never written.
+
+    :ivar set dirty: id of tasks modified since last write
+    :ivar set removed: id of tasks removed since last write
+    :ivar bool _clear: all tasks removed since last write
+    """
+
+    def __init__(self, name, codec, *, module_name=None, concurrent=False,
+                 read_only=False):
         """Open/create a DB file"""
         self.name = name
         self.codec = codec
+        self.concurrent = concurrent
+        self.read_only = read_only
+        self._file_lock = FileLock(name + '.lock') if concurrent else None
+        self.dirty = set()
+        self.removed = set()
+        self._clear = False
         if not os.path.exists(self.name):
             self._db = {}
         else:
@@ -69,10 +258,10 @@ class JsonDB:
 
     def _load(self):
         """load db content from file"""
-        db_file = open(self.name, 'r')
+        db_file = open(self.name, 'rb')
         try:
             try:
-                return self.codec.decode(db_file.read())
+                return codec_decode(self.codec, db_file.read())
             except ValueError as error:
                 # file contains corrupted json data
                 fname = os.path.abspath(self.name)
@@ -84,19 +273,75 @@ class JsonDB:
         finally:
             db_file.close()
 
+    def _write(self, content):
+        """replace DB file, a partially written file is never visible"""
+        tmp_name = self.name + '.tmp'
+        with open(tmp_name, 'wb') as db_file:
+            db_file.write(content)
+        os.replace(tmp_name, self.name)
+
+    def _reset_changes(self):
+        self.dirty = set()
+        self.removed = set()
+        self._clear = False
+
+    def _take_changes(self):
+        """@return (changed, removed, clear) since last write"""
+        changed = {task_id: dict(self._db[task_id]) for task_id in self.dirty}
+        changes = (changed, self.removed, self._clear)
+        self._reset_changes()
+        return changes
+
+    def _merge_write(self, changed, removed, clear):
+        """merge changes into content saved by other processes"""
+        with self._file_lock:
+            if clear or not os.path.exists(self.name):
+                db = {}
+            else:
+                db = self._load()
+            for task_id in removed:
+                db.pop(task_id, None)
+            db.update(changed)
+            self._write(codec_encode(self.codec, db))
+
+    def checkpoint(self):
+        """encode current content (or changes on `concurrent` mode)
+
+        @return function that saves it in file, None if not modified
+        """
+        if self.read_only or not (self.dirty or self.removed or self._clear):
+            return None
+        if self.concurrent:
+            return functools.partial(self._merge_write, *self._take_changes())
+        self._reset_changes()
+        # values of a task are modified in place, so copy them too
+        snapshot = {task_id: dict(values)
+                    for task_id, values in self._db.items()}
+        return functools.partial(self._encode_write, snapshot)
+
+    def _encode_write(self, db):
+        """encode `db` and save it in file"""
+        self._write(codec_encode(self.codec, db))
+
     def dump(self):
         """save DB content in file"""
-        try:
-            db_file = open(self.name, 'w')
-            db_file.write(self.codec.encode(self._db))
-        finally:
-            db_file.close()
+        if self.concurrent or self.read_only:
+            write = self.checkpoint()
+            if write is not None:
+                write()
+            return
+        if (not (self.dirty or self.removed or self._clear)
+                and os.path.exists(self.name)):
+            return  # not modified, keep file untouched
+        self._reset_changes()
+        self._write(codec_encode(self.codec, self._db))
 
     def set(self, task_id, dependency, value):
         """Store value in the DB."""
         if task_id not in self._db:
             self._db[task_id] = {}
         self._db[task_id][dependency] = value
+        self.dirty.add(task_id)
 
 
     def get(self, task_id, dependency):
@@ -117,10 +362,26 @@ class JsonDB:
         """remove saved dependencies from DB for taskId"""
         if task_id in self._db:
             del self._db[task_id]
+            self.dirty.discard(task_id)
+            self.removed.add(task_id)
 
     def remove_all(self):
         """remove saved dependencies from DB for all tasks"""
         self._db = {}
+        self.dirty = set()
+        self.removed = set()
+        self._clear = True
+
+    def task_ids(self):
+        """@return list of all ids in the DB"""
+        return list(self._db)
+
+    def get_task(self, task_id):
+        """@return dict: all values saved for task_id (empty if not in DB)"""
+        return dict(self._db.get(task_id, {}))
+
+    def compact(self):
+        """file is re-written as a whole, nothing to do"""
 
 
 def get_dbm_module(mod_name):
@@ -139,21 +400,70 @@ class DbmDB:
     to the `dirty` set. Only on ``dump`` all dirty items values are encoded
     in json into ``_dbm`` and the DBM file is saved.
 
+    On `concurrent` mode the DBM file is not kept open (DBM implementations
+    do not support concurrent writers). Its items are copied into ``_dbm``
+    (a dict) on initialization, and modified/removed items are written
+    while holding a lock.
+    On `read_only` mode items are also copied into ``_dbm`` (DBM file is
+    opened without locking if supported), modifications are never saved.
+
     :ivar str name: file name/path
     :ivar module: DBM implementation name one of: 'dbm.gun', 'dbm.ndbm', 'dbm.dumb'.
     :ivar dbm _dbm: items with json encoded values
     :ivar dict _db: items with python-dict as value
     :ivar set dirty: id of modified tasks
+    :ivar set removed: id of removed tasks (only on `concurrent` mode)
+    :ivar _lock: protects ``_dbm`` while it is synced on ``checkpoint``
     """
     DBM_CONTENT_ERROR_MSG = 'db type could not be determined'
 
-    def __init__(self, name, codec, *, module_name=None):
+    def __init__(self, name, codec, *, module_name=None, concurrent=False,
+                 read_only=False):
         """Open/create a DB file"""
         self.name = name
         self.codec = codec
         self.module = get_dbm_module(module_name)
+        self.concurrent = concurrent
+        self.read_only = read_only
+        # _dbm is a dict with a copy of DBM items
+        self._snapshot = concurrent or read_only
+        self._file_lock = FileLock(name + '.lock') if concurrent else None
+        if read_only:
+            self._dbm = self._read_only_copy()
+        elif concurrent:
+            with self._file_lock:
+                self._dbm = self._copy(self._open('c'))
+        else:
+            self._dbm = self._open('c')
+        self._db = {}
+        self.dirty = set()
+        self.removed = set()
+        self._clear = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _copy(dbm_file):
+        """@return dict with all items from `dbm_file` (closed)"""
+        try:
+            return {key.decode('utf-8'): dbm_file[key]
+                    for key in dbm_file.keys()}
+        finally:
+            dbm_file.close()
+
+    def _read_only_copy(self):
+        kind = dbm.whichdb(self.name)
+        if kind is None:  # file does not exist
+            return {}
+        if not kind:  # unknown format, raise proper error
+            self._open('r')
+        module = importlib.import_module(kind)
+        # gdbm: open without locking, a writer might be using the file
+        flag = 'ru' if 'u' in getattr(module, 'open_flags', '') else 'r'
+        return self._copy(self._open(flag, module))
+
+    def _open(self, flag, module=None):
         try:
-            self._dbm = self.module.open(self.name, 'c')
+            return (module or self.module).open(self.name, flag)
         except dbm.error as exception:
             message = str(exception)
             if message == self.DBM_CONTENT_ERROR_MSG:
@@ -170,13 +480,66 @@ class DbmDB:
                 # Re-raise any other exceptions
                 raise DatabaseException(message)
 
-        self._db = {}
+    def _write_dirty(self):
+        for task_id in self.dirty:
+            self._dbm[task_id] = self.codec.encode(self._db[task_id])
         self.dirty = set()
 
+    def _sync(self):
+        with self._lock:
+            self._dbm.sync()
+
+    def _take_changes(self):
+        """@return (changed, removed, clear) since last write"""
+        changed = {}
+        for task_id in self.dirty:
+            value = self._dbm[task_id] = self.codec.encode(self._db[task_id])
+            changed[task_id] = value
+        changes = (changed, self.removed, self._clear)
+        self.dirty = set()
+        self.removed = set()
+        self._clear = False
+        return changes
+
+    def _merge_write(self, changed, removed, clear):
+        """write changes into DBM file that might be used by other processes"""
+        with self._file_lock:
+            dbm_file = self._open('n' if clear else 'c')
+            try:
+                for task_id in removed:
+                    if task_id.encode('utf-8') in dbm_file:
+                        del dbm_file[task_id]
+                for task_id, value in changed.items():
+                    dbm_file[task_id] = value
+            finally:
+                dbm_file.close()
+
+    def checkpoint(self):
+        """write modified tasks into DBM
+
+        @return function that syncs DBM file to disk
+                (None if not supported by DBM module).
+                On `concurrent` mode, function that writes modified tasks.
+        """
+        if self.read_only:
+            return None
+        if self.concurrent:
+            if not (self.dirty or self.removed or self._clear):
+                return None
+            return functools.partial(self._merge_write, *self._take_changes())
+        self._write_dirty()
+        if not hasattr(self._dbm, 'sync'):
+            return None
+        return self._sync
+
     def dump(self):
         """save/close DBM file"""
-        for task_id in self.dirty:
-            self._dbm[task_id] = self.codec.encode(self._db[task_id])
+        if self._snapshot:
+            write = self.checkpoint()
+            if write is not None:
+                write()
+            return
+        self._write_dirty()
         self._dbm.close()
 
 
@@ -195,6 +558,8 @@ class DbmDB:
 
          for get()/set() key is convert to bytes but not for 'in'
         """
+        if self._snapshot:
+            return key in self._dbm
         return key.encode('utf-8') in self._dbm
 
 
@@ -211,7 +576,7 @@ class DbmDB:
                 task_data = self._dbm[task_id]
             except KeyError:
                 return
-            self._db[task_id] = self.codec.decode(task_data.decode('utf-8'))
+            self._db[task_id] = codec_decode(self.codec, task_data)
             return self._db[task_id].get(dependency, None)
 
 
@@ -224,37 +589,118 @@ class DbmDB:
         """remove saved dependencies from DB for taskId"""
         if task_id in self._db:
             del self._db[task_id]
-        if self._in_dbm(task_id):
-            del self._dbm[task_id]
+        with self._lock:
+            if self._in_dbm(task_id):
+                del self._dbm[task_id]
         if task_id in self.dirty:
             self.dirty.remove(task_id)
+        if self.concurrent:
+            self.removed.add(task_id)
 
 
     def remove_all(self):
         """remove saved dependencies from DB for all tasks"""
         self._db = {}
-        self._dbm.close()
-        del self._dbm
-        self._dbm = self.module.open(self.name, 'n')
         self.dirty = set()
+        if self._snapshot:
+            self._dbm = {}
+            self.removed = set()
+            self._clear = True
+            return
+        with self._lock:
+            self._dbm.close()
+            del self._dbm
+            self._dbm = self.module.open(self.name, 'n')
+
+    def task_ids(self):
+        """@return list of all ids in the DB"""
+        if self._snapshot:
+            ids = list(self._dbm)
+        else:
+            ids = [key.decode('utf-8') for key in self._dbm.keys()]
+        return ids + [task_id for task_id in self.dirty
+                      if not self._in_dbm(task_id)]
 
+    def get_task(self, task_id):
+        """@return dict: all values saved for task_id (empty if not in DB)"""
+        if task_id not in self._db:
+            try:
+                task_data = self._dbm[task_id]
+            except KeyError:
+                return {}
+            self._db[task_id] = codec_decode(self.codec, task_data)
+        return dict(self._db[task_id])
 
+    def compact(self):
+        """re-write DBM file, so space used by removed items is released
+
+        DBM files usually do not shrink when items are removed.
+        """
+        if self.read_only:
+            return
+        if self._snapshot:
+            self.dump()
+            with self._file_lock:
+                items = self._copy(self._open('c'))
+                self._rewrite(items).close()
+            return
+        self._write_dirty()
+        with self._lock:
+            items = self._copy(self._dbm)
+            self._dbm = self._rewrite(items)
+
+    def _rewrite(self, items):
+        """@return new DBM file (open) containing only `items`"""
+        dbm_file = self._open('n')
+        for key, value in items.items():
+            dbm_file[key] = value
+        return dbm_file
 
-class SqliteDB:
-    """ sqlite3 json backend """
 
-    def __init__(self, name, codec, *, module_name=None):
+
+class SqliteDB:
+    """ sqlite3 json backend
+
+    :ivar dict pragmas: PRAGMA name -> value, set when connection is opened
+    :ivar set _prefetched: ids loaded by ``prefetch()``, ids not in
+                           ``_cache`` are known to be not in the DB
+    :ivar set _removed: ids to be deleted from the DB on next write
+    :ivar float timeout: seconds to wait for a lock held by another
+                         connection/process
+    """
+    DEFAULT_PRAGMAS = {'journal_mode': 'WAL', 'synchronous': 'NORMAL'}
+    # max number of parameters in a single query (SQLITE_MAX_VARIABLE_NUMBER)
+    PREFETCH_CHUNK = 900
+    TIMEOUT = 5.0
+    # other processes might be writing a large number of tasks
+    CONCURRENT_TIMEOUT = 120.0
+
+    def __init__(self, name, codec, *, module_name=None, pragmas=None,
+                 concurrent=False, read_only=False):
+        """
+        Tasks are saved using row level upserts, so the DB might be used
+        by several processes. On `concurrent` mode waits longer for locks.
+        On `read_only` mode the DB is opened with ``mode=ro``,
+        modifications are never saved.
+        """
         self.name = name
         self.codec = codec
-        self._conn = self._sqlite3(self.name)
+        self.pragmas = self.DEFAULT_PRAGMAS if pragmas is None else pragmas
+        self.concurrent = concurrent
+        self.read_only = read_only
+        self.timeout = self.CONCURRENT_TIMEOUT if concurrent else self.TIMEOUT
+        self._conn = self._sqlite3(self.name, read_only)
         self._cache = {}
         self._dirty = set()
+        self._removed = set()
+        self._prefetched = set()
 
-    def _sqlite3(self, name):
+    def _sqlite3(self, name, read_only=False):
         """Open/create a sqlite3 DB file"""
 
         # Import sqlite here so it's only imported when required
         import sqlite3
+        import pathlib
         def dict_factory(cursor, row):
             """convert row to dict"""
             data = {}
@@ -262,15 +708,22 @@ class SqliteDB:
                 data[col[0]] = row[idx]
             return data
         def converter(data):
-            return self.codec.decode(data.decode('utf-8'))
+            return codec_decode(self.codec, data)
 
         sqlite3.register_adapter(list, self.codec.encode)
         sqlite3.register_adapter(dict, self.codec.encode)
         sqlite3.register_converter("json", converter)
+        database, uri = name, False
+        if read_only:
+            if os.path.exists(name):
+                database = pathlib.Path(os.path.abspath(name)).as_uri()
+                database, uri = database + '?mode=ro', True
+            else:
+                database = ':memory:'
         conn = sqlite3.connect(
-            name,
+            database,
             detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
-            isolation_level='DEFERRED')
+            isolation_level='DEFERRED', timeout=self.timeout, uri=uri)
         conn.row_factory = dict_factory
         sqlscript = """
             create table if not exists doit (
@@ -278,6 +731,8 @@ class SqliteDB:
                 task_data json
             );"""
         try:
+            if not read_only:
+                self._set_pragmas(conn)
             conn.execute(sqlscript)
         except sqlite3.DatabaseError as exception:
             new_message = (
@@ -290,6 +745,17 @@ class SqliteDB:
             raise DatabaseException(new_message)
         return conn
 
+    def _set_pragmas(self, conn):
+        """execute PRAGMA statements from self.pragmas"""
+        for pragma, value in self.pragmas.items():
+            value = str(value)
+            # PRAGMA does not support parameter binding
+            if not (pragma.isidentifier()
+                    and value.replace('-', '').isalnum()):
+                msg = "Invalid sqlite PRAGMA: {}={}".format(pragma, value)
+                raise DatabaseException(msg)
+            conn.execute('PRAGMA {}={}'.format(pragma, value))
+
     def get(self, task_id, dependency):
         """Get value stored in the DB.
 
@@ -297,6 +763,8 @@ class SqliteDB:
         """
         if task_id in self._cache:
             return self._cache[task_id].get(dependency, None)
+        elif task_id in self._prefetched:
+            return None
         else:
             data = self._cache[task_id] = self._get_task_data(task_id)
             return data.get(dependency, None)
@@ -306,6 +774,19 @@ class SqliteDB:
                                   (task_id,)).fetchone()
         return data['task_data'] if data else {}
 
+    def prefetch(self, task_ids):
+        """load data of all `task_ids` using a few queries"""
+        task_ids = [tid for tid in task_ids
+                    if tid not in self._cache and tid not in self._prefetched]
+        for start in range(0, len(task_ids), self.PREFETCH_CHUNK):
+            chunk = task_ids[start:start + self.PREFETCH_CHUNK]
+            sql = 'select task_id, task_data from doit where task_id in ({})'
+            rows = self._conn.execute(
+                sql.format(','.join('?' * len(chunk))), chunk)
+            for row in rows:
+                self._cache[row['task_id']] = row['task_data']
+            self._prefetched.update(chunk)
+
     def set(self, task_id, dependency, value):
         """Store value in the DB."""
         if task_id not in self._cache:
@@ -317,19 +798,54 @@ class SqliteDB:
     def in_(self, task_id):
         if task_id in self._cache:
             return True
+        if task_id in self._prefetched:
+            return False
         if self._conn.execute('select task_id from doit where task_id=?',
                               (task_id,)).fetchone():
             return True
         return False
 
+    def _take_changes(self):
+        """@return (removed, rows) modified since last write"""
+        removed = [(task_id,) for task_id in self._removed]
+        rows = [(task_id, self.codec.encode(self._cache[task_id]))
+                for task_id in self._dirty]
+        self._removed = set()
+        self._dirty = set()
+        return removed, rows
+
+    @staticmethod
+    def _write(conn, removed, rows):
+        # removed are deleted first, they might have been set again
+        conn.executemany('delete from doit where task_id=?', removed)
+        conn.executemany('insert or replace into doit values (?,?)', rows)
+        conn.commit()
+
+    def _write_new_conn(self, removed, rows):
+        """write using its own connection, might be executed on any thread"""
+        import sqlite3
+        conn = sqlite3.connect(self.name, timeout=self.timeout)
+        try:
+            self._set_pragmas(conn)
+            self._write(conn, removed, rows)
+        finally:
+            conn.close()
+
+    def checkpoint(self):
+        """encode modified tasks
+
+        @return function that writes them to DB, None if nothing modified
+        """
+        if self.read_only or not (self._dirty or self._removed):
+            return None
+        return functools.partial(self._write_new_conn, *self._take_changes())
+
     def dump(self):
         """save/close sqlite3 DB file"""
-        for task_id in self._dirty:
-            self._conn.execute('insert or replace into doit values (?,?)',
-                               (task_id, self.codec.encode(self._cache[task_id])))
-        self._conn.commit()
+        changes = self._take_changes()
+        if not self.read_only:
+            self._write(self._conn, *changes)
         self._conn.close()
-        self._dirty = set()
 
     def remove(self, task_id):
         """remove saved dependencies from DB for taskId"""
@@ -337,19 +853,425 @@ class SqliteDB:
             del self._cache[task_id]
         if task_id in self._dirty:
             self._dirty.remove(task_id)
-        self._conn.execute('delete from doit where task_id=?', (task_id,))
+        # known to be not in the DB, actually deleted on next write
+        self._prefetched.add(task_id)
+        self._removed.add(task_id)
 
     def remove_all(self):
         """remove saved dependencies from DB for all task"""
-        self._conn.execute('delete from doit')
+        if self.read_only:
+            self._conn.close()
+            self._conn = self._sqlite3(':memory:')
+        else:
+            self._conn.execute('delete from doit')
+            # do not hold the write lock until dump
+            self._conn.commit()
         self._cache = {}
         self._dirty = set()
+        self._removed = set()
+        self._prefetched = set()
+
+    def task_ids(self):
+        """@return list of all ids in the DB"""
+        rows = self._conn.execute('select task_id from doit')
+        ids = [row['task_id'] for row in rows
+               if row['task_id'] not in self._removed]
+        saved = set(ids)
+        return ids + [task_id for task_id in self._dirty
+                      if task_id not in saved]
+
+    def get_task(self, task_id):
+        """@return dict: all values saved for task_id (empty if not in DB)"""
+        self.get(task_id, None)  # load into cache
+        return dict(self._cache.get(task_id, {}))
+
+    def compact(self):
+        """write changes and VACUUM the DB file"""
+        if self.read_only:
+            return
+        self._write(self._conn, *self._take_changes())
+        self._conn.execute('VACUUM')
+
+
+class JournalDB:
+    """Backend using an append-only log file (journal)
+
+    Each record contains the whole data of a task, or a tombstone
+    for a removed task.
+    On initialization the journal is replayed, only the latest record of
+    each task is kept (still encoded) on ``_raw``.
+    On ``dump`` only modified/removed tasks are appended to the file.
+    When the ratio of dead records (overwritten or removed) is greater
+    than ``compact_ratio`` the journal is re-written with only live records.
+
+    Record format: header ``struct('>BII')`` with record type,
+    key length and value length; followed by the key (utf-8) and
+    value (codec encoded) bytes.
+
+    On `concurrent` mode the journal is read and written while holding
+    a lock. Records are just appended to the file (so tasks saved by other
+    processes are kept), when compacting the journal is read again.
+    On `read_only` mode the journal is never written.
+
+    :ivar dict _raw: task_id -> encoded task data (as in the file)
+    :ivar dict _db: task_id -> decoded task data
+    :ivar set dirty: id of modified tasks
+    :ivar set removed: id of removed tasks
+    :ivar int num_records: number of records in the journal file
+    """
+    desc = 'append-only journal file'
+    MAGIC = b'doit-journal\x01\n'
+    HEADER = struct.Struct('>BII')
+    SET, DELETE = 1, 2
+    # do not compact small journals
+    COMPACT_MIN_RECORDS = 1000
+
+    def __init__(self, name, codec, *, module_name=None, compact_ratio=0.5,
+                 concurrent=False, read_only=False):
+        self.name = name
+        self.codec = codec
+        self.compact_ratio = compact_ratio
+        self.concurrent = concurrent
+        self.read_only = read_only
+        self._file_lock = FileLock(name + '.lock') if concurrent else None
+        self._raw = {}
+        self._db = {}
+        self.dirty = set()
+        self.removed = set()
+        self.num_records = 0
+        self._rewrite = False  # must re-create file on dump
+        self._clear = False  # all tasks removed
+        if self.concurrent and not read_only:
+            with self._file_lock:
+                self._load()
+        else:
+            self._load()
+
+    def _load(self):
+        if not os.path.exists(self.name):
+            self._rewrite = True
+            return
+        self._raw, self.num_records, complete = self._read()
+        if not complete:
+            # drop incomplete record
+            self._rewrite = True
+
+    def _read(self):
+        """replay journal file
+
+        @return (raw, num_records, complete): `complete` is False if file
+                ends with an incomplete record
+        """
+        raw = {}
+        num_records = 0
+        with open(self.name, 'rb') as journal:
+            content = journal.read()
+        if not content.startswith(self.MAGIC):
+            fname = os.path.abspath(self.name)
+            msg = (f"Invalid journal data in {fname}\n"
+                   "To fix this problem, you can just remove the "
+                   "corrupted file, a new one will be generated.\n")
+            raise DatabaseException(msg)
+        pos = len(self.MAGIC)
+        header_size = self.HEADER.size
+        while pos + header_size <= len(content):
+            rtype, key_len, value_len = self.HEADER.unpack_from(content, pos)
+            end = pos + header_size + key_len + value_len
+            if end > len(content) or rtype not in (self.SET, self.DELETE):
+                break  # truncated record, process was interrupted
+            key_end = pos + header_size + key_len
+            task_id = content[pos + header_size:key_end].decode('utf-8')
+            if rtype == self.SET:
+                raw[task_id] = content[key_end:end]
+            else:
+                raw.pop(task_id, None)
+            num_records += 1
+            pos = end
+        return raw, num_records, pos == len(content)
+
+    def _record(self, rtype, task_id, value=b''):
+        key = task_id.encode('utf-8')
+        return self.HEADER.pack(rtype, len(key), len(value)) + key + value
+
+    def _encode(self, task_id):
+        return codec_encode(self.codec, self._db[task_id])
+
+    def _need_compact(self, total, live):
+        """@param total, live: (int) number of records, live records"""
+        if total < self.COMPACT_MIN_RECORDS:
+            return False
+        return (total - live) / total > self.compact_ratio
+
+    def checkpoint(self):
+        """encode records for modified tasks
+
+        @return function that appends them to the journal (or compacts it),
+                None if nothing modified
+        """
+        if self.read_only:
+            return None
+        removed = self.removed
+        records = [self._record(self.DELETE, task_id) for task_id in removed]
+        changed = {}
+        for task_id in self.dirty:
+            value = self._raw[task_id] = changed[task_id] = self._encode(task_id)
+            records.append(self._record(self.SET, task_id, value))
+        self.dirty = set()
+        self.removed = set()
+
+        if self.concurrent:
+            if not (records or self._clear):
+                return None
+            clear, self._clear = self._clear, False
+            return functools.partial(self._merge_write, records, changed,
+                                     removed, clear)
+        total = self.num_records + len(records)
+        if self._rewrite or self._need_compact(total, len(self._raw)):
+            return functools.partial(self._replace, self._compact_content())
+        if records:
+            self.num_records += len(records)
+            return functools.partial(self._append, b''.join(records))
+        return None
+
+    def dump(self):
+        """append modified tasks to the journal (or compact it)"""
+        write = self.checkpoint()
+        if write is not None:
+            write()
+
+    def _append(self, content):
+        with open(self.name, 'ab') as journal:
+            journal.write(content)
+
+    def _replace(self, content):
+        tmp_name = self.name + '.tmp'
+        with open(tmp_name, 'wb') as journal:
+            journal.write(content)
+        os.replace(tmp_name, self.name)
+
+    def _content(self, raw):
+        """@return journal content containing only live records"""
+        return self.MAGIC + b''.join(
+            self._record(self.SET, task_id, value)
+            for task_id, value in raw.items())
+
+    def _compact_content(self):
+        for task_id in self.dirty:
+            self._raw[task_id] = self._encode(task_id)
+        self.dirty = set()
+        self.removed = set()
+        self.num_records = len(self._raw)
+        self._rewrite = False
+        return self._content(self._raw)
+
+    def _merge_write(self, records, changed, removed, clear):
+        """append records to a journal that might be used by other processes
+
+        @param records: (list - bytes) encoded records
+        @param changed: (dict) task_id -> encoded value of SET records
+        @param removed: ids of DELETE records
+        @param clear: (bool) ignore content of current file
+        """
+        with self._file_lock:
+            if clear or not os.path.exists(self.name):
+                raw, num_records, complete = {}, 0, False
+            else:
+                raw, num_records, complete = self._read()
+            for task_id in removed:
+                raw.pop(task_id, None)
+            raw.update(changed)
+            total = num_records + len(records)
+            if not complete or self._need_compact(total, len(raw)):
+                self._replace(self._content(raw))
+            elif records:
+                self._append(b''.join(records))
+
+    def compact(self):
+        """re-write journal file containing only live records"""
+        if self.read_only:
+            return
+        if self.concurrent:
+            self.dump()
+            with self._file_lock:
+                raw, _, _ = self._read()
+                self._replace(self._content(raw))
+            return
+        self._replace(self._compact_content())
+
+
+    def set(self, task_id, dependency, value):
+        """Store value in the DB."""
+        if task_id not in self._db:
+            self._db[task_id] = self._decode(task_id) or {}
+        self._db[task_id][dependency] = value
+        self.dirty.add(task_id)
+        self.removed.discard(task_id)
+
+    def _decode(self, task_id):
+        raw = self._raw.get(task_id)
+        if raw is None:
+            return None
+        return codec_decode(self.codec, raw)
+
+    def get(self, task_id, dependency):
+        """Get value stored in the DB.
+
+        :return: string or None if entry not found
+        """
+        if task_id not in self._db:
+            task_data = self._decode(task_id)
+            if task_data is None:
+                return
+            self._db[task_id] = task_data
+        return self._db[task_id].get(dependency, None)
+
+
+    def in_(self, task_id):
+        """@return bool if task_id is in DB"""
+        return task_id in self._raw or task_id in self.dirty
+
+
+    def remove(self, task_id):
+        """remove saved dependencies from DB for taskId"""
+        self._db.pop(task_id, None)
+        self.dirty.discard(task_id)
+        # on concurrent mode, task might have been saved by another process
+        if self._raw.pop(task_id, None) is not None or self.concurrent:
+            self.removed.add(task_id)
+
+
+    def remove_all(self):
+        """remove saved dependencies from DB for all tasks"""
+        self._raw = {}
+        self._db = {}
+        self.dirty = set()
+        self.removed = set()
+        self._rewrite = True
+        self._clear = True
+
+    def task_ids(self):
+        """@return list of all ids in the DB"""
+        return list(self._raw) + [task_id for task_id in self.dirty
+                                  if task_id not in self._raw]
+
+    def get_task(self, task_id):
+        """@return dict: all values saved for task_id (empty if not in DB)"""
+        if task_id not in self._db:
+            task_data = self._decode(task_id)
+            if task_data is None:
+                return {}
+            self._db[task_id] = task_data
+        return dict(self._db[task_id])
+
+
+class MemoryDB:
+    """Backend keeping data only in memory, nothing is written to a file
+
+    Used to check a single task on a sub-process from a copy of its saved
+    data (see `Dependency.task_snapshot()`).
+    """
+
+    def __init__(self, name, codec, *, module_name=None, data=None):
+        """@param data: (dict) task_id -> dict of saved values"""
+        self.name = name
+        self.codec = codec
+        self._db = {task_id: dict(values)
+                    for task_id, values in (data or {}).items()}
+
+    def dump(self):
+        """nothing to be written"""
+
+    def set(self, task_id, dependency, value):
+        """Store value in the DB."""
+        self._db.setdefault(task_id, {})[dependency] = value
+
+    def get(self, task_id, dependency):
+        """Get value stored in the DB, None if not found"""
+        return self._db.get(task_id, {}).get(dependency)
+
+    def in_(self, task_id):
+        """@return bool if task_id is in DB"""
+        return task_id in self._db
+
+    def remove(self, task_id):
+        """remove saved dependencies from DB for taskId"""
+        self._db.pop(task_id, None)
+
+    def remove_all(self):
+        """remove saved dependencies from DB for all tasks"""
+        self._db = {}
+
+    def task_ids(self):
+        """@return list of all ids in the DB"""
+        return list(self._db)
+
+    def get_task(self, task_id):
+        """@return dict: all values saved for task_id (empty if not in DB)"""
+        return dict(self._db.get(task_id, {}))
+
+
+class FileStateCache:
+    """Run-scoped cache of file stat and content signature.
+
+    The same file is usually a `file_dep` of many tasks, the cache makes
+    sure it is stat'ed and hashed only once during a run.
+    Entries must be invalidated when a task that has the file as a target
+    is executed.
+
+    :ivar int hits: number of lookups served from the cache
+    :ivar int misses: number of lookups that accessed the file system
+    """
+    def __init__(self):
+        self._stat = {}  # path -> os.stat_result
+        self._hash = {}  # path -> {hash_func: signature}
+        self.hits = 0
+        self.misses = 0
+
+    def stat(self, path, stat_func):
+        """return stat for path, calling `stat_func` if not in cache"""
+        try:
+            file_stat = self._stat[path]
+        except KeyError:
+            self.misses += 1
+            file_stat = self._stat[path] = stat_func(path)
+        else:
+            self.hits += 1
+        return file_stat
+
+    def get_stat(self, path):
+        """return stat for path if in cache, otherwise None"""
+        file_stat = self._stat.get(path)
+        if file_stat is not None:
+            self.hits += 1
+        return file_stat
+
+    def file_hash(self, path, hash_func):
+        """return content signature, calling `hash_func` if not in cache"""
+        hashes = self._hash.setdefault(path, {})
+        try:
+            value = hashes[hash_func]
+        except KeyError:
+            self.misses += 1
+            value = hashes[hash_func] = hash_func(path)
+        else:
+            self.hits += 1
+        return value
+
+    def invalidate(self, paths):
+        """remove entries for all `paths`"""
+        for path in paths:
+            self._stat.pop(path, None)
+            self._hash.pop(path, None)
 
 
 class FileChangedChecker:
-    """Base checker for dependencies, must be inherited."""
+    """Base checker for dependencies, must be inherited.
+
+    :ivar file_cache: (FileStateCache) set by `Dependency` during a run
+    """
 
     CheckerError = os.error
+    file_cache = None
 
     def exists(self, file_path):
         return os.path.exists(file_path)
@@ -368,6 +1290,32 @@ class FileChangedChecker:
         """
         raise NotImplementedError()
 
+    def check_modified_states(self, items, executor=None):
+        """Batch version of ``check_modified()``.
+
+        @param items (list): of 3-tuple (file_path, file_stat, state)
+        @param executor: (concurrent.futures.Executor) optional thread pool
+            that might be used to check files concurrently
+        @returns (list - bool): in the same order as `items`
+
+        The default implementation calls ``check_modified()`` for each item.
+        """
+        return [self.check_modified(*item) for item in items]
+
+    def refresh_states(self, items, modified, checked_ns):
+        """States to be saved again for files found not modified.
+
+        @param items (list): same as ``check_modified_states()``
+        @param modified (list - bool): result of ``check_modified_states()``
+        @param checked_ns (int): time (ns) before `items` were checked
+        @returns (list): new state, or None to keep saved state,
+            in the same order as `items`
+
+        Allows a checker to avoid repeating an expensive check on every
+        run, see StatMD5Checker.refresh_states().
+        """
+        return [None] * len(items)
+
     def get_state(self, dep, current_state):
         """Compute the state of a task after it has been successfully executed.
 
@@ -381,6 +1329,31 @@ class FileChangedChecker:
         """
         raise NotImplementedError()
 
+    def get_states(self, deps, executor=None):
+        """Batch version of ``get_state()``.
+
+        @param deps (list): of 2-tuple (dep, current_state)
+        @param executor: (concurrent.futures.Executor) optional thread pool
+            that might be used to compute the states concurrently
+        @returns (list): new states in the same order as `deps`
+
+        The default implementation calls ``get_state()`` for each item.
+        Checkers that spend time reading file contents should overwrite
+        this method to make use of `executor`.
+        """
+        return [self.get_state(dep, current) for dep, current in deps]
+
+    def same_signature(self, state, other):
+        """Check if two states saved by ``get_state()`` are for the same content
+
+        Used by the file table to decide if tasks that saw `state`
+        are affected by a new `other` state.
+        Note that values loaded from DB might have tuples converted to lists.
+        """
+        if isinstance(state, (list, tuple)) and isinstance(other, (list, tuple)):
+            return list(state) == list(other)
+        return state == other
+
 
 class MD5Checker(FileChangedChecker):
     """MD5 checker, uses the md5sum.
@@ -393,10 +1366,13 @@ class MD5Checker(FileChangedChecker):
     Finally the md5 is used for a different timestamp with the same size.
     """
 
-    def check_modified(self, file_path, file_stat, state):
-        """Check if file in file_path is modified from previous "state".
+    @staticmethod
+    def _check_stat(file_stat, state):
+        """check modification without reading the file content
+
+        @returns: True/False if modified, None if md5 must be checked
         """
-        timestamp, size, file_md5 = state
+        timestamp, size, _ = state
 
         # 1 - if timestamp is not modified file is the same
         if file_stat.st_mtime == timestamp:
@@ -406,8 +1382,37 @@ class MD5Checker(FileChangedChecker):
         if file_stat.st_size != size:
             return True
 
+        return None
+
+    def check_modified(self, file_path, file_stat, state):
+        """Check if file in file_path is modified from previous "state".
+        """
+        modified = self._check_stat(file_stat, state)
+        if modified is not None:
+            return modified
+
         # 3 - check md5
-        return file_md5 != get_file_md5(file_path)
+        return self._state_md5(state) != self._file_md5(file_path)
+
+    def check_modified_states(self, items, executor=None):
+        """check all items, computing md5 of files concurrently"""
+        result = []
+        to_hash = []  # index of items that need md5 to be checked
+        for file_path, file_stat, state in items:
+            modified = self._check_stat(file_stat, state)
+            if modified is None:
+                to_hash.append(len(result))
+            result.append(modified)
+
+        paths = [items[idx][0] for idx in to_hash]
+        for idx, md5 in zip(to_hash, _map_files(self._file_md5, paths, executor)):
+            result[idx] = self._state_md5(items[idx][2]) != md5
+        return result
+
+    @staticmethod
+    def _state_md5(state):
+        """@return md5 saved on state"""
+        return state[2]
 
 
     def get_state(self, dep, current_state):
@@ -417,9 +1422,228 @@ class MD5Checker(FileChangedChecker):
         if current_state and current_state[0] == timestamp:
             return
         size = os.path.getsize(dep)
-        md5 = get_file_md5(dep)
+        md5 = self._file_md5(dep)
         return timestamp, size, md5
 
+    def get_states(self, deps, executor=None):
+        """get state of all deps, computing md5 of files concurrently"""
+        states = []
+        to_hash = []  # index of deps that need md5 to be computed
+        for dep, current_state in deps:
+            timestamp, size = self._mtime_size(dep)
+            if current_state and current_state[0] == timestamp:
+                states.append(None)
+            else:
+                to_hash.append(len(states))
+                states.append((timestamp, size))
+
+        paths = [deps[idx][0] for idx in to_hash]
+        for idx, md5 in zip(to_hash, _map_files(self._file_md5, paths, executor)):
+            states[idx] = states[idx] + (md5,)
+        return states
+
+    def same_signature(self, state, other):
+        """timestamp is not part of file content signature"""
+        return list(state[1:]) == list(other[1:])
+
+    def _mtime_size(self, dep):
+        """get (mtime, size) re-using stat from file_cache if available"""
+        file_stat = self.file_cache.get_stat(dep) if self.file_cache else None
+        if file_stat is None:
+            return os.path.getmtime(dep), os.path.getsize(dep)
+        return file_stat.st_mtime, file_stat.st_size
+
+    def _file_md5(self, path):
+        """md5 of file content, using file_cache if available"""
+        if self.file_cache is None:
+            return get_file_md5(path)
+        return self.file_cache.file_hash(path, get_file_md5)
+
+
+class StatMD5Checker(MD5Checker):
+    """MD5 checker that uses the full file `stat` to skip hashing.
+
+    State is (mtime_ns, size, inode, ctime_ns, md5, racy).
+    If size, mtime, inode and ctime are the same the file is considered
+    not modified without reading its content.
+
+    A file modified just before its state was saved is "racy",
+    a later modification might get the same timestamp
+    (see git's racy-git). The md5 of racy files is always checked.
+    The window considered racy is `racy_ns`, or `racy_coarse_ns`
+    for file systems that store timestamps with a resolution of seconds.
+
+    States saved by `MD5Checker` (mtime, size, md5) are also accepted,
+    they are upgraded when the task is executed again.
+    """
+    migrate_from = ('MD5Checker',)
+    racy_ns = 100_000_000  # 0.1 second
+    racy_coarse_ns = 2_000_000_000
+
+    @staticmethod
+    def _check_stat(file_stat, state):
+        """check modification without reading the file content
+
+        @returns: True/False if modified, None if md5 must be checked
+        """
+        if len(state) == 3:
+            return MD5Checker._check_stat(file_stat, state)
+        mtime_ns, size, ino, ctime_ns, _, racy = state
+        if file_stat.st_size != size:
+            return True
+        if not racy and (file_stat.st_mtime_ns == mtime_ns
+                         and file_stat.st_ino == ino
+                         and file_stat.st_ctime_ns == ctime_ns):
+            return False
+        return None
+
+    @staticmethod
+    def _state_md5(state):
+        """@return md5 saved on state"""
+        return state[2] if len(state) == 3 else state[4]
+
+    def _is_racy(self, file_stat, now_ns):
+        """file was modified too close to `now_ns` to rely on its timestamp"""
+        mtime_ns = file_stat.st_mtime_ns
+        window = self.racy_coarse_ns if mtime_ns % 1_000_000_000 == 0 \
+            else self.racy_ns
+        return now_ns - mtime_ns < window
+
+    def get_state(self, dep, current_state):
+        return self.get_states([(dep, current_state)])[0]
+
+    def get_states(self, deps, executor=None):
+        """get state of all deps, computing md5 of files concurrently"""
+        now_ns = time.time_ns()
+        states = []
+        to_hash = []  # index of deps that need md5 to be computed
+        for dep, current_state in deps:
+            file_stat = self._stat(dep)
+            if (current_state and len(current_state) == 6
+                    and self._check_stat(file_stat, current_state) is False):
+                states.append(None)
+            else:
+                to_hash.append(len(states))
+                states.append(file_stat)
+
+        paths = [deps[idx][0] for idx in to_hash]
+        for idx, md5 in zip(to_hash, _map_files(self._file_md5, paths, executor)):
+            file_stat = states[idx]
+            states[idx] = (file_stat.st_mtime_ns, file_stat.st_size,
+                           file_stat.st_ino, file_stat.st_ctime_ns, md5,
+                           self._is_racy(file_stat, now_ns))
+        return states
+
+    def same_signature(self, state, other):
+        return (state[1] == other[1]
+                and self._state_md5(state) == self._state_md5(other))
+
+    def refresh_states(self, items, modified, checked_ns):
+        """new state for files whose md5 was checked (i.e. racy) and are
+        not racy anymore, so next checks can skip reading their content
+        """
+        states = []
+        for (_, file_stat, state), mod in zip(items, modified):
+            if (not mod and len(state) == 6
+                    and self._check_stat(file_stat, state) is None
+                    and not self._is_racy(file_stat, checked_ns)):
+                states.append((file_stat.st_mtime_ns, file_stat.st_size,
+                               file_stat.st_ino, file_stat.st_ctime_ns,
+                               state[4], False))
+            else:
+                states.append(None)
+        return states
+
+    def _stat(self, dep):
+        """stat re-using file_cache if available"""
+        file_stat = self.file_cache.get_stat(dep) if self.file_cache else None
+        if file_stat is None:
+            return os.stat(dep)
+        return file_stat
+
+
+class HashChecker(MD5Checker):
+    """Same as MD5Checker but using any `hashlib` algorithm.
+
+    The algorithm is included in the `checker_name`, so changing
+    the algorithm forces tasks to be executed again.
+
+    :ivar str algorithm: name of hashlib algorithm
+    :ivar int buffer_size: number of bytes read from file at a time
+    """
+    DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+    def __init__(self, algorithm='blake2b', buffer_size=None):
+        if algorithm not in hash_algorithms():
+            raise ValueError(
+                "Hash algorithm '{}' not available.".format(algorithm))
+        self.algorithm = algorithm
+        self.buffer_size = buffer_size or self.DEFAULT_BUFFER_SIZE
+        self.checker_name = '{}:{}'.format(self.__class__.__name__, algorithm)
+        self._hash_func = functools.partial(
+            get_file_hash, algorithm=algorithm, buffer_size=self.buffer_size)
+
+    def _file_md5(self, path):
+        """file hash, using file_cache if available"""
+        if self.file_cache is None:
+            return self._hash_func(path)
+        return self.file_cache.file_hash(path, self._hash_func)
+
+
+class GitIndexChecker(MD5Checker):
+    """Same as MD5Checker but the signature is the git object id (blob hash)
+
+    For files tracked by git and not modified since added to the index,
+    the object id is read from git's index (``.git/index``).
+    Other files are hashed as a git blob.
+    This way a fresh checkout does not need to read the content of
+    tracked files to check they are not modified.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dir_index = {}  # directory path -> GitIndex or None
+        self._indexes = {}  # git_dir -> GitIndex
+
+    def _get_index(self, dir_path):
+        """return GitIndex of repository containing `dir_path` (or None)"""
+        with self._lock:
+            try:
+                return self._dir_index[dir_path]
+            except KeyError:
+                pass
+            found = gitindex.find_git_dir(dir_path)
+            index = None
+            if found:
+                worktree, git_dir = found
+                index = self._indexes.get(git_dir)
+                if index is None:
+                    index = self._indexes[git_dir] = gitindex.GitIndex(
+                        worktree, git_dir)
+            self._dir_index[dir_path] = index
+            return index
+
+    def _blob_id(self, path):
+        """object id from git index if file is clean, otherwise hash it"""
+        path = os.path.abspath(path)
+        index = self._get_index(os.path.dirname(path))
+        file_stat = self.file_cache.get_stat(path) if self.file_cache else None
+        if file_stat is None:
+            file_stat = os.stat(path)
+        if index is not None:
+            object_id = index.get_object_id(path, file_stat)
+            if object_id is not None:
+                return object_id
+        algorithm = index.algorithm if index is not None else 'sha1'
+        hasher = gitindex.blob_hasher(file_stat.st_size, algorithm)
+        return _hash_file(hasher, path, 128 * hasher.block_size).hexdigest()
+
+    def _file_md5(self, path):
+        """git object id, using file_cache if available"""
+        if self.file_cache is None:
+            return self._blob_id(path)
+        return self.file_cache.file_hash(path, self._blob_id)
+
 
 class TimestampChecker(FileChangedChecker):
     """Checker that use only the timestamp."""
@@ -434,9 +1658,21 @@ class TimestampChecker(FileChangedChecker):
 
 # name of checkers class available
 CHECKERS = {'md5': MD5Checker,
+            'md5_stat': StatMD5Checker,
+            'git': GitIndexChecker,
             'timestamp': TimestampChecker}
 
 
+def _accepts_kwarg(func, name):
+    """@return bool: callable `func` accepts keyword argument `name`"""
+    try:
+        params = inspect.signature(func).parameters
+    except (TypeError, ValueError):  # pragma: no cover
+        return False
+    return name in params or any(
+        param.kind == param.VAR_KEYWORD for param in params.values())
+
+
 class DependencyStatus:
     """Result object for Dependency.get_status.
 
@@ -486,6 +1722,7 @@ class Dependency:
 
     * ``_values_:`` task's values
     * ``result:`` task result
+    * ``duration:`` seconds taken by last successful execution
 
     And also some internal doit attributes:
 
@@ -495,15 +1732,60 @@ class Dependency:
 
     Those can be accessed with generic DB ``get()``, see below...
 
+    If `file_table` is enabled the file signatures are not saved on every
+    task that depends on it. Each file has a single entry with
+    id ``=file:<path>`` (task names can not contain ``=``) containing:
+
+    * ``state:`` the file signature
+    * ``version:`` incremented every time the file content changes
+    * ``checker:``
+
+    And the task dictionary saves only the version of each ``file_dep``
+    on ``refs:``.
+    Tasks saved with the per-task layout are still read and converted
+    on its next successful execution.
+
     :ivar string name: filepath of the DB file
     :ivar bool _closed: DB was flushed to file
+    :ivar int hash_workers: number of threads used by the checker to
+                            compute file signatures (0 -> no threads)
+    :ivar file_cache: (FileStateCache) shared file stat/hash of current run
+    :ivar bool file_table: save file signatures in a table shared by all tasks
+    :ivar int checkpoint_tasks: save modified data to file every N
+                                successful tasks (0 -> disabled)
+    :ivar float checkpoint_interval: save modified data to file every N
+                                     seconds (0 -> disabled)
+    :ivar bool read_only: never write the DB file, the backend is opened
+                          in read-only mode if supported
     """
+    FILE_PREFIX = '=file:'
+
     def __init__(self, db_class, backend_name, checker_cls=MD5Checker,
-                 codec_cls=JSONCodec, module_name=None):
+                 codec_cls=JSONCodec, module_name=None, hash_workers=0,
+                 file_table=False, backend_opts=None,
+                 checkpoint_tasks=0, checkpoint_interval=0, read_only=False):
+        """
+        :param dict backend_opts: extra keyword arguments for `db_class`
+        """
         self._closed = False
         self.checker = checker_cls()
+        self.file_table = file_table
+        self.hash_workers = hash_workers
+        self._hash_executor = None
+        self.checkpoint_tasks = checkpoint_tasks
+        self.checkpoint_interval = checkpoint_interval
+        self._checkpoint_executor = None
+        self._checkpoint_future = None
+        self._saved_since_checkpoint = 0
+        self._last_checkpoint = time.monotonic()
+        self.file_cache = None
         self.db_class = db_class
-        self.backend = db_class(backend_name, codec=codec_cls(), module_name=module_name)
+        self.read_only = read_only
+        backend_opts = dict(backend_opts or {})
+        if read_only and _accepts_kwarg(db_class, 'read_only'):
+            backend_opts['read_only'] = True
+        self.backend = db_class(backend_name, codec=codec_cls(),
+                                module_name=module_name, **backend_opts)
         self._set = self.backend.set
         self._get = self.backend.get
         self.remove = self.backend.remove
@@ -511,23 +1793,140 @@ class Dependency:
         self._in = self.backend.in_
         self.name = self.backend.name
 
+    @property
+    def checker_name(self):
+        """name of checker, saved to detect a checker change"""
+        return getattr(self.checker, 'checker_name',
+                       self.checker.__class__.__name__)
+
+    def _compatible_checker(self, name):
+        """states saved by checker `name` can be used by current checker"""
+        return (name == self.checker_name
+                or name in getattr(self.checker, 'migrate_from', ()))
+
     def close(self):
         """Write DB in file"""
         if not self._closed:
-            self.backend.dump()
-            self._closed = True
+            try:
+                self._wait_checkpoint()
+            finally:
+                # read-only backends just release resources on dump
+                if (not self.read_only
+                        or getattr(self.backend, 'read_only', False)):
+                    self.backend.dump()
+                self._closed = True
+        if self._hash_executor is not None:
+            self._hash_executor.shutdown()
+            self._hash_executor = None
+        if self._checkpoint_executor is not None:
+            self._checkpoint_executor.shutdown()
+            self._checkpoint_executor = None
+
+    def checkpoint(self, background=False):
+        """save data modified since last checkpoint, DB is kept open
+
+        Data is collected on the caller thread, if `background` the file
+        is written on a separate thread. A background checkpoint is
+        skipped while the previous one is still being written.
+
+        @return bool: False if checkpoint was skipped
+        """
+        checkpoint = getattr(self.backend, 'checkpoint', None)
+        if checkpoint is None or self._closed or self.read_only:
+            return False
+        future = self._checkpoint_future
+        if background and future is not None and not future.done():
+            return False
+        self._wait_checkpoint()
+        self._saved_since_checkpoint = 0
+        self._last_checkpoint = time.monotonic()
+        write = checkpoint()
+        if write is None:
+            return True
+        if not background:
+            write()
+            return True
+        if self._checkpoint_executor is None:
+            self._checkpoint_executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix='doit-checkpoint')
+        self._checkpoint_future = self._checkpoint_executor.submit(write)
+        return True
+
+    def _wait_checkpoint(self):
+        """wait for background checkpoint, raise its exception if any"""
+        future, self._checkpoint_future = self._checkpoint_future, None
+        if future is not None:
+            future.result()
+
+    def _checkpoint_due(self):
+        """@return bool: periodic checkpoint should be done"""
+        if (self.checkpoint_tasks
+                and self._saved_since_checkpoint >= self.checkpoint_tasks):
+            return True
+        return bool(
+            self.checkpoint_interval
+            and time.monotonic() - self._last_checkpoint >= self.checkpoint_interval)
+
+    def start_file_cache(self):
+        """enable a new FileStateCache, to be used during a single run
+
+        Outside a run files might be modified at any time, so the cache
+        is not used.
+        """
+        self.file_cache = FileStateCache()
+        self.checker.file_cache = self.file_cache
+        return self.file_cache
+
+    def stop_file_cache(self):
+        """stop using file_cache (statistics are still available)"""
+        self.checker.file_cache = None
+
+    def _file_info(self, path):
+        """stat path using checker, through file_cache if enabled"""
+        if self.checker.file_cache is None:
+            return self.checker.info(path)
+        return self.file_cache.stat(path, self.checker.info)
+
+    def prefetch(self, tasks):
+        """load saved data of all `tasks` in bulk (if supported by backend)
+
+        @param tasks: (list - Task)
+        """
+        prefetch = getattr(self.backend, 'prefetch', None)
+        if prefetch is None:
+            return
+        ids = []
+        for task in tasks:
+            ids.append(task.name)
+            if self.file_table:
+                ids.extend(self.FILE_PREFIX + dep for dep in task.file_dep)
+        prefetch(list(dict.fromkeys(ids)))
+
+    def _executor(self):
+        """return thread pool used by checker (created on first use)"""
+        if self.hash_workers and self._hash_executor is None:
+            self._hash_executor = ThreadPoolExecutor(
+                max_workers=self.hash_workers,
+                thread_name_prefix='doit-hash')
+        return self._hash_executor
 
 
     ####### task specific
 
-    def save_success(self, task, result_hash=None):
+    def save_success(self, task, result_hash=None, states=None):
         """save info after a task is successfully executed
 
         :param str result_hash: explicitly set result_hash
+        :param dict states: `file_dep` states already computed by
+                            `get_file_states()` (i.e. on other process)
         """
         # save task values
         self._set(task.name, "_values_:", task.values)
 
+        # duration is not known if task was not executed (i.e. cached)
+        if task.duration is not None:
+            self._set(task.name, "duration:", task.duration)
+
         # save task result md5
         if result_hash is not None:
             self._set(task.name, "result:", result_hash)
@@ -538,14 +1937,179 @@ class Dependency:
                 self._set(task.name, "result:", get_md5(task.result))
 
         # file-dep
-        self._set(task.name, 'checker:', self.checker.__class__.__name__)
-        for dep in task.file_dep:
-            state = self.checker.get_state(dep, self._get(task.name, dep))
-            if state is not None:
-                self._set(task.name, dep, state)
+        if self.file_table:
+            self._save_file_table(task, states)
+        else:
+            self._set(task.name, 'checker:', self.checker_name)
+            if self._get(task.name, 'refs:') is not None:
+                self._set(task.name, 'refs:', None)
+            deps = self._saved_dep_states(task)
+            states = self._new_dep_states(deps, states)
+            for (dep, _), state in zip(deps, states):
+                if state is not None:
+                    self._set(task.name, dep, state)
 
         # save list of file_deps
         self._set(task.name, 'deps:', tuple(task.file_dep))
+        self._invalidate_targets(task)
+        if task.restat:
+            self._restat_targets(task)
+        elif self._get(task.name, 'restat:') is not None:
+            self._set(task.name, 'restat:', None)
+
+        if self.checkpoint_tasks or self.checkpoint_interval:
+            self._saved_since_checkpoint += 1
+            if self._checkpoint_due():
+                self.checkpoint(background=True)
+
+    def _file_record(self, dep):
+        """@return (str, state): file table id and its state (or None)"""
+        record = self.FILE_PREFIX + dep
+        checker = self._get(record, 'checker:')
+        if checker is None or not self._compatible_checker(checker):
+            return record, None
+        return record, self._get(record, 'state:')
+
+    def _saved_dep_states(self, task):
+        """@return list of (dep, state) of `file_dep` saved by last execution"""
+        if not self.file_table:
+            return [(dep, self._get(task.name, dep)) for dep in task.file_dep]
+        refs = self._get(task.name, 'refs:')
+        deps = []
+        for dep in task.file_dep:
+            current = self._file_record(dep)[1]
+            if current is None and refs is None:
+                # saved by previous DB layout
+                current = self._get(task.name, dep)
+            deps.append((dep, current))
+        return deps
+
+    def _new_dep_states(self, deps, states=None):
+        """@return list of new states (None if unchanged) for `deps` items,
+        computed by checker unless given on `states` dict
+        """
+        if states is None:
+            return self.checker.get_states(deps, self._executor())
+        return [states.get(dep) for dep, _ in deps]
+
+    def get_file_states(self, task):
+        """compute states of `file_dep`, to be passed to `save_success()`
+
+        @return dict: dep -> new state (None if unchanged)
+        """
+        deps = self._saved_dep_states(task)
+        return {dep: state for (dep, _), state
+                in zip(deps, self._new_dep_states(deps))}
+
+    def task_snapshot(self, task):
+        """copy of saved data used to check status of `task` on other process
+
+        @return dict: task_id -> dict of saved values, to be used as
+                      `data` of a `MemoryDB`
+        """
+        ids = [task.name]
+        if self.file_table:
+            ids.extend(self.FILE_PREFIX + dep for dep in task.file_dep)
+        snapshot = {}
+        for task_id in ids:
+            values = self.backend.get_task(task_id)
+            if values:
+                snapshot[task_id] = values
+        return snapshot
+
+    def _save_file_table(self, task, states=None):
+        """save file_dep states on file table and its version on task"""
+        refs = self._get(task.name, 'refs:')
+        deps = self._saved_dep_states(task)
+        records = [self._file_record(dep) for dep in task.file_dep]
+        states = self._new_dep_states(deps, states)
+
+        if refs is None and self._in(task.name):
+            # convert from per-task layout: drop task's file states
+            kept = {key: self._get(task.name, key)
+                    for key in ('_values_:', 'result:', 'ignore:',
+                                'restat:', 'duration:')}
+            self.remove(task.name)
+            for key, value in kept.items():
+                if value is not None:
+                    self._set(task.name, key, value)
+
+        new_refs = {}
+        for (dep, current), (record, saved), state in zip(deps, records, states):
+            version = self._get(record, 'version:') if saved else None
+            if state is None:
+                state = current
+            if saved is None or state != saved:
+                if version is None:
+                    version = 1
+                elif not self.checker.same_signature(saved, state):
+                    version += 1
+                self._set(record, 'checker:', self.checker_name)
+                self._set(record, 'state:', state)
+                self._set(record, 'version:', version)
+            new_refs[dep] = version
+        self._set(task.name, 'checker:', self.checker_name)
+        self._set(task.name, 'refs:', new_refs)
+
+    def _get_dep_state(self, task_id, dep, refs):
+        """get state of a file_dep as seen by the task last execution
+
+        @param refs: (dict) version of file_dep saved on file table, None
+                     if task was saved on per-task layout.
+        """
+        if refs is None:
+            return self._get(task_id, dep)
+        version = refs.get(dep)
+        if version is None:
+            return None
+        record, state = self._file_record(dep)
+        if self._get(record, 'version:') != version:
+            return None
+        return state
+
+    def _refresh_dep_state(self, task_id, dep, refs, state):
+        """replace saved state of a not modified file_dep
+
+        On the file table the version is kept, the file content is the same.
+        """
+        if refs is None:
+            self._set(task_id, dep, state)
+        else:
+            self._set(self.FILE_PREFIX + dep, 'state:', state)
+
+    def _invalidate_targets(self, task):
+        """targets of an executed task must not be taken from file_cache"""
+        if self.checker.file_cache is not None:
+            self.file_cache.invalidate(task.targets)
+
+    def _restat_targets(self, task):
+        """keep previous mtime of targets re-generated with the same content
+
+        Tasks that have the target as a `file_dep` see it as not modified,
+        not even its content is hashed again (for checkers using mtime).
+        The (mtime_ns, size, md5) of targets is saved on ``restat:``.
+        Stat and md5 of targets are put on `file_cache`.
+        """
+        saved = self._get(task.name, 'restat:') or {}
+        states = {}
+        for target in task.targets:
+            if not os.path.isfile(target):
+                continue
+            file_stat = os.stat(target)
+            if self.checker.file_cache is None:
+                md5 = get_file_md5(target)
+            else:
+                md5 = self.file_cache.file_hash(target, get_file_md5)
+            mtime = file_stat.st_mtime_ns
+            previous = saved.get(target)
+            if (previous and previous[0] != mtime
+                    and list(previous[1:]) == [file_stat.st_size, md5]):
+                mtime = previous[0]
+                os.utime(target, ns=(file_stat.st_atime_ns, mtime))
+            if self.checker.file_cache is not None:
+                self._file_info(target)
+            states[target] = (mtime, file_stat.st_size, md5)
+        self._set(task.name, 'restat:', states)
 
     def get_values(self, task_name):
         """get all saved values from a task
@@ -577,9 +2141,99 @@ class Dependency:
         """
         return self._get(task_name, 'result:')
 
+    def get_durations(self, task_names):
+        """get duration (in seconds) of last successful execution of tasks
+
+        :return dict: task_name -> duration, only for tasks with a
+                      saved duration
+        """
+        durations = {}
+        for name in task_names:
+            duration = self._get(name, 'duration:')
+            if duration is not None:
+                durations[name] = duration
+        return durations
+
     def remove_success(self, task):
         """remove saved info from task"""
         self.remove(task.name)
+        self._invalidate_targets(task)
+
+    def _gc_task(self, task_id, data):
+        """drop file states not on task's current ``deps:``
+
+        @return int: number of dropped file states
+        """
+        deps = set(data.get('deps:') or ())
+        stale = [key for key in data
+                 if not key.endswith(':') and key not in deps]
+        refs = data.get('refs:')
+        stale_refs = [dep for dep in (refs or ()) if dep not in deps]
+        if not (stale or stale_refs):
+            return 0
+        for key in stale:
+            del data[key]
+        if stale_refs:
+            data['refs:'] = {dep: version for dep, version in refs.items()
+                             if dep in deps}
+        self.remove(task_id)
+        for key, value in data.items():
+            self._set(task_id, key, value)
+        return len(stale) + len(stale_refs)
+
+    def gc(self, tasks):
+        """remove data not used by any of `tasks`
+
+        - tasks not in `tasks`
+        - file states of a file not in the task's ``deps:``
+        - file table entries not referenced by any task
+
+        Tasks created by a delayed loader are kept if its loader is
+        in `tasks` (they might not be created yet).
+
+        @param tasks: (list - Task) all tasks from current dodo
+        @return dict: number of removed 'tasks', 'deps' and 'files'
+        """
+        names = set()
+        prefixes = []
+        for task in tasks:
+            names.add(task.name)
+            if task.loader and not task.loader.created:
+                prefixes.append(task.name + ':')
+                for created in task.loader.creates:
+                    names.add(created)
+                    prefixes.append(created + ':')
+        prefixes = tuple(prefixes)
+
+        removed = {'tasks': 0, 'deps': 0, 'files': 0}
+        used_files = set()
+        file_ids = []
+        for task_id in self.backend.task_ids():
+            if task_id.startswith(self.FILE_PREFIX):
+                file_ids.append(task_id)
+                continue
+            if task_id not in names and not task_id.startswith(prefixes):
+                self.remove(task_id)
+                removed['tasks'] += 1
+                continue
+            data = self.backend.get_task(task_id)
+            if data.get('deps:') is not None:
+                removed['deps'] += self._gc_task(task_id, data)
+            used_files.update(
+                self.FILE_PREFIX + dep for dep in (data.get('refs:') or ()))
+
+        for file_id in file_ids:
+            if file_id not in used_files:
+                self.remove(file_id)
+                removed['files'] += 1
+        return removed
+
+    def compact(self):
+        """save data and release space not used by the DB file"""
+        self._wait_checkpoint()
+        compact = getattr(self.backend, 'compact', None)
+        if compact is not None:
+            compact()
 
     def ignore(self, task):
         """mark task to be ignored"""
@@ -589,6 +2243,10 @@ class Dependency:
         """check if task is marked to be ignored"""
         return self._get(task.name, "ignore:")
 
+    def was_executed(self, task_name):
+        """check if task was successfully executed (has saved state)"""
+        return self._get(task_name, 'deps:') is not None
+
     def get_status(self, task, tasks_dict, get_log=False):
         """Check if task is up to date. set task.dep_changed
 
@@ -667,8 +2325,8 @@ class Dependency:
 
         # check for modified file_dep checker
         previous = self._get(task.name, 'checker:')
-        checker_name = self.checker.__class__.__name__
-        if previous and previous != checker_name:
+        checker_name = self.checker_name
+        if previous and not self._compatible_checker(previous):
             task.dep_changed = list(task.file_dep)
             # remove all saved values otherwise they might be re-used by
             # some optimization on MD5Checker.get_state()
@@ -688,20 +2346,32 @@ class Dependency:
             result.status = 'run'
 
         # list of file_dep that changed
-        check_modified = self.checker.check_modified
-        changed = []
+        refs = self._get(task.name, 'refs:')
+        existing = []  # file_dep that exist, in order
+        to_check = []  # (dep, file_stat, state) for deps with saved state
         for dep in task.file_dep:
-            state = self._get(task.name, dep)
+            state = self._get_dep_state(task.name, dep, refs)
             try:
-                file_stat = self.checker.info(dep)
+                file_stat = self._file_info(dep)
             except self.checker.CheckerError:
                 error_msg = "Dependent file '{}' does not exist.".format(dep)
                 result.error_reason = error_msg.format(dep)
                 if result.add_reason('missing_file_dep', dep, 'error'):
                     return result
             else:
-                if state is None or check_modified(dep, file_stat, state):
-                    changed.append(dep)
+                existing.append(dep)
+                if state is not None:
+                    to_check.append((dep, file_stat, state))
+        checked_ns = time.time_ns()
+        modified = self.checker.check_modified_states(
+            to_check, self._executor())
+        refreshed = self.checker.refresh_states(to_check, modified, checked_ns)
+        for (dep, _, _), state in zip(to_check, refreshed):
+            if state is not None:
+                self._refresh_dep_state(task.name, dep, refs, state)
+        unchanged = set(item[0] for item, mod in zip(to_check, modified)
+                        if not mod)
+        changed = [dep for dep in existing if dep not in unchanged]
         task.dep_changed = changed
 
         if len(changed) > 0:
@@ -23,6 +23,8 @@ from .cmd_dumpdb import DumpDB
 from .cmd_strace import Strace
 from .cmd_completion import TabCompletion
 from .cmd_resetdep import ResetDep
+from .cmd_gc import Gc
+from .cmd_auto import Auto
 
 
 # used to save variable values passed from command line
@@ -154,7 +156,7 @@ class DoitMain:
     # core doit commands
     BIN_NAME = os.path.split(sys.argv[0])[-1]
     DOIT_CMDS = (Help, Run, List, Info, Clean, Forget, Ignore, DumpDB,
-                 Strace, TabCompletion, ResetDep)
+                 Strace, TabCompletion, ResetDep, Gc, Auto)
 
     def __init__(self, task_loader=None,
                  config_filenames=('pyproject.toml', 'doit.cfg'),
@@ -205,18 +207,28 @@ class DoitMain:
         return sub_cmds
 
 
-    def process_args(self, cmd_args):
+    def process_args(self, cmd_args, cmdparser=None):
         """process cmd line set "global" variables/parameters
         return list of args without processed variables
+
+        :param cmdparser: (CmdParse) values of its options are not
+                          taken as variables (i.e. `--pool name=4`)
         """
         # get cmdline variables from args
         reset_vars()
         args_no_vars = []
+        option_value = False  # arg is the value of previous option
         for arg in cmd_args:
-            if (arg[0] != '-') and ('=' in arg):
+            if option_value:
+                option_value = False
+                args_no_vars.append(arg)
+            elif (arg[0] != '-') and ('=' in arg):
                 name, value = arg.split('=', 1)
                 set_var(name, value)
             else:
+                if cmdparser is not None:
+                    opt = cmdparser.get_option(arg)[0]
+                    option_value = opt is not None and opt.type is not bool
                 args_no_vars.append(arg)
         return args_no_vars
 
@@ -279,7 +291,7 @@ class DoitMain:
             cmd_name = 'run'
         else:
             specified_run = True
-            cmd_name = args.pop(0)
+            cmd_name = args[0]
 
         # execute command
         command = sub_cmds.get_plugin(cmd_name)(
@@ -291,6 +303,10 @@ class DoitMain:
         )
 
         try:
+            # values of command options may contain '=', not variables
+            args = self.process_args(cmd_args, command.cmdparser)
+            if specified_run:
+                args.pop(0)
             return command.parse_execute(args)
 
         # dont show traceback for user errors.
@@ -0,0 +1,200 @@
+"""Watch file system modifications using Linux inotify (through ctypes)
+
+The directories containing the watched files are watched, instead of the
+files themselves, so files replaced by editors (write to a temporary file
+and rename it) are still detected.
+"""
+
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+
+
+# inotify constants, from <sys/inotify.h>
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+              | IN_ONLYDIR)
+
+# struct inotify_event {int wd; uint32 mask; uint32 cookie; uint32 len;}
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def _load_libc():
+    """@return libc with inotify functions, None if not available"""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [
+            ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+_libc = _load_libc()
+
+
+class FileWatcher:
+    """Watch files and directories for modifications
+
+    :ivar set files: watched files (absolute normalized paths)
+    :ivar set dirs: watched directories, any modification of its entries
+                    is reported as a modification of the directory
+    :ivar ignore: (callable) `ignore(path)` returns True for paths
+                  which modifications should not be reported
+    """
+
+    def __init__(self, ignore=None):
+        if _libc is None:
+            raise OSError(errno.ENOSYS, 'inotify is not available')
+        self.fd = _libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, 'inotify_init1: ' + os.strerror(err))
+        self.ignore = ignore
+        self.files = set()
+        self.dirs = set()
+        self._wds = {}  # watch descriptor -> directory path
+        self._paths = {}  # directory path -> watch descriptor
+
+
+    @staticmethod
+    def available():
+        """check if inotify is supported on this platform"""
+        return _libc is not None
+
+
+    def watch(self, files, dirs=()):
+        """set paths to be watched, replacing previous ones
+
+        Directories that do not exist are not watched, they will be watched
+        on next call of this method if created in the mean time.
+
+        @param files: (iterable - str) absolute normalized file paths
+        @param dirs: (iterable - str) absolute normalized directory paths
+        """
+        self.files = set(files)
+        self.dirs = set(dirs)
+        wanted = {os.path.dirname(path) for path in self.files} | self.dirs
+        for path in list(self._paths):
+            if path not in wanted:
+                wd = self._paths.pop(path)
+                self._wds.pop(wd, None)
+                _libc.inotify_rm_watch(self.fd, wd)
+        for path in wanted:
+            if path not in self._paths:
+                self._add_watch(path)
+
+    def _add_watch(self, path):
+        wd = _libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                return
+            msg = 'inotify_add_watch "{}": {}'.format(path, os.strerror(err))
+            if err == errno.ENOSPC:
+                msg += ' (increase fs.inotify.max_user_watches)'
+            raise OSError(err, msg)
+        self._wds[wd] = path
+        self._paths[path] = wd
+
+
+    def _read_events(self):
+        """read available events
+
+        @return (list - str) modified watched paths,
+                None if events were lost (queue overflow)
+        """
+        data = os.read(self.fd, 64 * 1024)
+        changed = []
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            directory = self._wds.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_IGNORED:
+                # directory removed, watched again by next call to `watch()`
+                del self._wds[wd]
+                self._paths.pop(directory, None)
+                continue
+            if name:
+                path = os.path.join(directory, os.fsdecode(name))
+            else:  # event on the directory itself
+                path = directory
+            if self.ignore is not None and self.ignore(path):
+                continue
+            if path in self.files:
+                changed.append(path)
+            elif directory in self.dirs:
+                changed.append(directory)
+        return changed
+
+
+    def wait(self, debounce=0.1, timeout=None):
+        """block until a watched path is modified
+
+        After the first modification, events are collected until no event
+        is received for `debounce` seconds, so a burst of modifications
+        is reported at once.
+
+        @param timeout: (float) max seconds waiting for first modification
+        @return (set - str) modified paths (empty on timeout),
+                None if events were lost (all paths might be modified)
+        """
+        changed = set()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if changed:
+                wait_time = debounce
+            elif deadline is None:
+                wait_time = None
+            else:
+                wait_time = max(0, deadline - time.monotonic())
+            ready, _, _ = select.select([self.fd], [], [], wait_time)
+            if not ready:
+                return changed
+            events = self._read_events()
+            if events is None:
+                # drain queue, everything must be checked anyway
+                self._drain(debounce)
+                return None
+            changed.update(events)
+
+    def _drain(self, debounce):
+        while select.select([self.fd], [], [], debounce)[0]:
+            os.read(self.fd, 64 * 1024)
+
+
+    def close(self):
+        """release inotify resources"""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+            self._wds = {}
+            self._paths = {}
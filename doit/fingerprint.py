@@ -0,0 +1,238 @@
+"""Fingerprint of the selected tasks graph, used to skip no-op runs
+
+After a run where all tasks were successful (or up-to-date) a fingerprint
+is saved containing:
+
+ - a hash of the definition of all tasks and run options
+ - `stat` of every `file_dep` and target of tasks that were checked
+ - `stat` of the dependency DB files
+
+On the next run, if the fingerprint matches, no task would be executed.
+So tasks are just reported as up-to-date, without building the graph
+or checking the status of each task.
+
+Files are also stat'ed before the run, a fingerprint is not saved if
+a file was modified during the run (other than targets of executed tasks),
+as its task might have been checked before the modification.
+
+Only tasks that are up-to-date when its files are not modified are
+supported. A fingerprint is not saved if any task has `uptodate`
+(other than `True`), `calc_dep`, `getargs`, is created by a delayed
+loader or is always executed (has actions but no dependencies).
+"""
+
+import os
+import marshal
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from .version import VERSION as DOIT_VERSION
+from .action import BaseAction
+from .action_cache import callable_key, action_key
+from .dependency import DB_FILE_SUFFIXES
+
+
+def _raw_action_key(action):
+    """@return description of an action as given on task definition"""
+    if isinstance(action, str):
+        return action
+    if isinstance(action, BaseAction):
+        return action_key(action)
+    if isinstance(action, tuple) and action and callable(action[0]):
+        return ['tuple', callable_key(action[0]), list(action[1:])]
+    if callable(action):
+        return ['callable', callable_key(action)]
+    return action
+
+
+def task_definition(task):
+    """@return description of task attributes that might change the result
+    of checking if it is up-to-date
+
+    Values are compared by its `repr()`, objects whose `repr()` contains
+    its memory address never match.
+    """
+    return (task.name, [_raw_action_key(a) for a in task._actions],
+            sorted(task.file_dep), task.targets, task.task_dep,
+            task.setup_tasks, sorted(task.calc_dep), task.uptodate,
+            task.params, task.cfg_values, task.pos_arg,
+            task.subtask_of, task.has_subtask, task.loader is not None)
+
+
+def noop_status(task):
+    """@return status of `task` on a run where its files were not modified
+
+    - 'up-to-date'
+    - 'run': task without actions and dependencies (always executed)
+    - None: can not be known without checking its dependencies
+    """
+    if task.loader or task.calc_dep or task.getargs:
+        return None
+    if any(utd not in (True, None) for utd, _, _ in task.uptodate):
+        return None
+    has_uptodate = any(utd is True for utd, _, _ in task.uptodate)
+    if task.file_dep or has_uptodate:
+        return 'up-to-date'
+    if task._actions:
+        return None
+    return 'run'
+
+
+def files_stat(paths):
+    """@return list: stat values that change when a file is modified"""
+    stats = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            stats.append(None)
+        else:
+            stats.append((st.st_mtime_ns, st.st_size, st.st_ino,
+                          st.st_ctime_ns))
+    return stats
+
+
+class GraphFingerprint:
+    """Save/check fingerprint of a successful run
+
+    :ivar str path: fingerprint file
+    :ivar str db_name: dependency DB file name
+    :ivar dict tasks: all tasks by name
+    :ivar str graph_key: hash of task definitions and run `options`
+    :ivar int workers: number of threads used to stat files
+    """
+    VERSION = 1
+    MIN_CHUNK = 1000  # min number of files to stat on each thread
+
+    def __init__(self, path, db_name, tasks, options, workers=0):
+        """
+        @param tasks: (list - Task) all tasks, before graph is built
+        @param options: (list) run options that may change task selection,
+                        compared by its `repr()`
+        """
+        self.path = path
+        self.db_name = db_name
+        self.workers = workers
+        self.tasks = {task.name: task for task in tasks}
+        self._initial = {}  # path -> stat before run, see `start()`
+        data = (self.VERSION, DOIT_VERSION, options,
+                [task_definition(task) for task in tasks])
+        encoded = repr(data).encode('utf-8')
+        self.graph_key = hashlib.sha256(encoded).hexdigest()
+
+    def _files_stat(self, files):
+        """stat files in a single pass, split in chunks among threads"""
+        if self.workers < 2 or len(files) < 2 * self.MIN_CHUNK:
+            return files_stat(files)
+        size = max(len(files) // self.workers + 1, self.MIN_CHUNK)
+        chunks = [files[i:i + size] for i in range(0, len(files), size)]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return [stat for chunk in executor.map(files_stat, chunks)
+                    for stat in chunk]
+
+    def _digest(self, files, stats=None):
+        db_files = files_stat(self.db_name + suffix
+                              for suffix in DB_FILE_SUFFIXES)
+        if stats is None:
+            stats = self._files_stat(files)
+        # not marshal, its output depends on reference counts
+        data = (self.graph_key, db_files, stats)
+        return hashlib.sha256(repr(data).encode('utf-8')).hexdigest()
+
+    def check(self):
+        """@return (dict) saved fingerprint if nothing changed, else None"""
+        # marshal format is not stable among python versions, any error
+        # just means there is no valid fingerprint.
+        try:
+            with open(self.path, 'rb') as fp:
+                entry = marshal.load(fp)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if not isinstance(entry, dict):
+            return None
+        if entry.get('version') != self.VERSION:
+            return None
+        if entry['digest'] != self._digest(entry['files']):
+            return None
+        if not all(name in self.tasks for name, _ in entry['tasks']):
+            return None
+        return entry
+
+    def replay(self, reporter, entry):
+        """report all tasks as they would be reported on a no-op run"""
+        if hasattr(reporter, 'initialize'):
+            reporter.initialize(self.tasks, entry['selected'])
+        for name, status in entry['tasks']:
+            task = self.tasks[name]
+            reporter.get_status(task)
+            if status == 'ignore':
+                reporter.skip_ignore(task)
+            elif status == 'up-to-date':
+                reporter.skip_uptodate(task)
+            else:  # no actions, nothing to execute
+                reporter.execute_task(task)
+                reporter.add_success(task)
+        reporter.complete_run()
+
+    def start(self):
+        """stat files of all tasks, must be called before tasks are checked"""
+        files = sorted({path for task in self.tasks.values()
+                        for path in list(task.file_dep) + task.targets})
+        self._initial = dict(zip(files, self._files_stat(files)))
+
+    def save(self, nodes, selected):
+        """save fingerprint after a successful run, must be called
+        after DB was closed
+
+        @param nodes: (list - ExecNode) in the order they were checked
+        @param selected: (list - str) selected task names
+        @return bool: fingerprint saved (all tasks are supported)
+        """
+        tasks = []
+        files = set()
+        written = set()  # targets of executed tasks
+        for node in nodes:
+            task = node.task
+            if self.tasks.get(task.name) is not task:
+                return self.remove()  # created during execution
+            if node.run_status == 'ignore':
+                status = 'ignore'
+            elif node.run_status in ('up-to-date', 'successful'):
+                status = noop_status(task)
+                if status is None:
+                    return self.remove()
+                if not all(os.path.exists(t) for t in task.targets):
+                    return self.remove()
+            else:
+                return self.remove()
+            tasks.append((task.name, status))
+            files.update(task.file_dep)
+            files.update(task.targets)
+            if node.run_status == 'successful':
+                written.update(task.targets)
+
+        files = sorted(files)
+        stats = self._files_stat(files)
+        for path, stat in zip(files, stats):
+            # modified during the run, maybe after its task was checked
+            if path not in written and self._initial.get(path) != stat:
+                return self.remove()
+        entry = {'version': self.VERSION,
+                 'digest': self._digest(files, stats),
+                 'files': files, 'selected': list(selected), 'tasks': tasks}
+        temp = self.path + '.tmp'
+        with open(temp, 'wb') as fp:
+            marshal.dump(entry, fp)
+        os.replace(temp, self.path)
+        return True
+
+    def remove(self):
+        """remove saved fingerprint
+
+        @return bool: False
+        """
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        return False
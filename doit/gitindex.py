@@ -0,0 +1,209 @@
+"""Read file information from git's index (``.git/index``)
+
+Only the information required to get the object id (blob hash) of
+files that are clean (not modified since added to the index) is read.
+See: https://git-scm.com/docs/index-format
+"""
+
+import os
+import re
+import struct
+import hashlib
+from collections import namedtuple
+
+
+IndexEntry = namedtuple(
+    'IndexEntry',
+    ['ctime_s', 'ctime_ns', 'mtime_s', 'mtime_ns', 'dev', 'ino', 'mode',
+     'uid', 'gid', 'size', 'object_id', 'flags'])
+
+_STAT_FIELDS = struct.Struct('>10I')
+_FLAGS = struct.Struct('>H')
+
+# flags
+_ASSUME_VALID = 0x8000
+_EXTENDED = 0x4000
+_STAGE_MASK = 0x3000
+_NAME_MASK = 0x0FFF
+# extended flags
+_SKIP_WORKTREE = 0x4000
+_INTENT_TO_ADD = 0x2000
+
+_S_IFREG = 0o100000
+
+
+class GitIndexError(Exception):
+    """index file could not be parsed"""
+
+
+def _read_varint(data, pos):
+    """decode git's offset varint, @return (value, new_pos)"""
+    byte = data[pos]
+    pos += 1
+    value = byte & 0x7F
+    while byte & 0x80:
+        byte = data[pos]
+        pos += 1
+        value = ((value + 1) << 7) | (byte & 0x7F)
+    return value, pos
+
+
+def parse_index(data, hash_size=20):
+    """parse content of index file
+
+    Only regular files on stage 0 that are not marked as assume-valid,
+    skip-worktree or intent-to-add are returned.
+
+    @param data: (bytes) index file content
+    @param hash_size: (int) 20 for sha1 repositories, 32 for sha256
+    @return dict: path (str, relative to worktree using '/') -> IndexEntry
+    """
+    if data[:4] != b'DIRC':
+        raise GitIndexError('Invalid index file signature')
+    version, num_entries = struct.unpack_from('>II', data, 4)
+    if version not in (2, 3, 4):
+        raise GitIndexError('Unsupported index version {}'.format(version))
+
+    entries = {}
+    pos = 12
+    path = b''
+    try:
+        for _ in range(num_entries):
+            start = pos
+            stat = _STAT_FIELDS.unpack_from(data, pos)
+            pos += _STAT_FIELDS.size
+            object_id = data[pos:pos + hash_size].hex()
+            pos += hash_size
+            flags, = _FLAGS.unpack_from(data, pos)
+            pos += _FLAGS.size
+            extended = 0
+            if version >= 3 and flags & _EXTENDED:
+                extended, = _FLAGS.unpack_from(data, pos)
+                pos += _FLAGS.size
+
+            if version == 4:
+                strip, pos = _read_varint(data, pos)
+                end = data.index(b'\0', pos)
+                path = path[:len(path) - strip] + data[pos:end]
+                pos = end + 1
+            else:
+                name_len = flags & _NAME_MASK
+                if name_len < _NAME_MASK:
+                    end = pos + name_len
+                else:
+                    end = data.index(b'\0', pos)
+                path = data[pos:end]
+                # entries are padded with 1-8 NUL bytes
+                entry_len = end - start
+                pos = start + ((entry_len + 8) & ~7)
+
+            if (flags & (_ASSUME_VALID | _STAGE_MASK)
+                    or extended & (_SKIP_WORKTREE | _INTENT_TO_ADD)):
+                continue
+            if stat[6] & 0o170000 != _S_IFREG:  # mode
+                continue
+            entries[path.decode('utf-8', 'surrogateescape')] = IndexEntry(
+                *stat, object_id, flags)
+    except (struct.error, ValueError, IndexError) as exception:
+        raise GitIndexError('Corrupted index: {}'.format(exception))
+    return entries
+
+
+def find_git_dir(path):
+    """find git repository containing `path` (a directory)
+
+    @return (worktree, git_dir) or None if not inside a repository
+    """
+    path = os.path.abspath(path)
+    while True:
+        dot_git = os.path.join(path, '.git')
+        if os.path.isdir(dot_git):
+            return path, dot_git
+        if os.path.isfile(dot_git):
+            # worktree or submodule, file contains "gitdir: <path>"
+            with open(dot_git, 'r') as fp:
+                content = fp.read().strip()
+            if content.startswith('gitdir:'):
+                git_dir = content[len('gitdir:'):].strip()
+                return path, os.path.join(path, git_dir)
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+def object_format(git_dir):
+    """@return (str): hash algorithm used by repository objects"""
+    common_dir = git_dir
+    commondir_file = os.path.join(git_dir, 'commondir')
+    if os.path.exists(commondir_file):
+        with open(commondir_file, 'r') as fp:
+            common_dir = os.path.join(git_dir, fp.read().strip())
+    try:
+        with open(os.path.join(common_dir, 'config'), 'r') as fp:
+            config = fp.read()
+    except OSError:
+        return 'sha1'
+    match = re.search(r'^\s*objectformat\s*=\s*(\w+)', config,
+                      re.IGNORECASE | re.MULTILINE)
+    return match.group(1).lower() if match else 'sha1'
+
+
+def blob_hasher(size, algorithm='sha1'):
+    """@return hashlib object initialized with header of a git blob"""
+    hasher = hashlib.new(algorithm)
+    hasher.update(b'blob %d\0' % size)
+    return hasher
+
+
+class GitIndex:
+    """Index of a git repository
+
+    :ivar str worktree: root path of working tree
+    :ivar str algorithm: hash algorithm of repository objects
+    :ivar dict entries: relative path -> IndexEntry
+    :ivar int index_mtime_ns: used to detect racily clean entries
+    """
+    def __init__(self, worktree, git_dir):
+        self.worktree = worktree
+        self.algorithm = object_format(git_dir)
+        hash_size = hashlib.new(self.algorithm).digest_size
+        index_file = os.environ.get('GIT_INDEX_FILE',
+                                    os.path.join(git_dir, 'index'))
+        try:
+            with open(index_file, 'rb') as fp:
+                self.index_mtime_ns = os.fstat(fp.fileno()).st_mtime_ns
+                data = fp.read()
+        except OSError:
+            self.index_mtime_ns = 0
+            self.entries = {}
+            return
+        try:
+            self.entries = parse_index(data, hash_size)
+        except GitIndexError:
+            self.entries = {}
+
+    def get_object_id(self, path, file_stat):
+        """return object id for a clean file, None if unknown/modified
+
+        @param path: (str) absolute path
+        @param file_stat: os.stat_result of path
+        """
+        rel_path = os.path.relpath(path, self.worktree)
+        if os.sep != '/':
+            rel_path = rel_path.replace(os.sep, '/')
+        entry = self.entries.get(rel_path)
+        if entry is None:
+            return None
+        mtime_ns = entry.mtime_s * 1_000_000_000 + entry.mtime_ns
+        # racily clean: modified on the same time index was written
+        if mtime_ns >= self.index_mtime_ns:
+            return None
+        # index saves only lower 32 bits of stat fields
+        if (mtime_ns != file_stat.st_mtime_ns
+                or entry.ctime_s != int(file_stat.st_ctime) & 0xFFFFFFFF
+                or entry.ctime_ns != file_stat.st_ctime_ns % 1_000_000_000
+                or entry.size != file_stat.st_size & 0xFFFFFFFF
+                or entry.ino != file_stat.st_ino & 0xFFFFFFFF):
+            return None
+        return entry.object_id
@@ -0,0 +1,192 @@
+"""GNU make jobserver, limit the number of jobs of a whole process tree
+
+A jobserver is a pipe (or named FIFO) shared by all processes of a build
+containing one byte (token) for each job that can run in parallel.
+A process always owns one implicit token, to run more jobs at the same time
+it must read a token from the jobserver, the token is written back when
+the job is finished.
+See https://www.gnu.org/software/make/manual/html_node/Job-Slots.html
+
+Sub-processes find the jobserver through the environment variable MAKEFLAGS
+(option `--jobserver-auth`), either a FIFO path (make >= 4.4) or the file
+descriptors of a pipe inherited from the parent process.
+"""
+
+import os
+import re
+import sys
+import shutil
+import select
+import tempfile
+
+
+# --jobserver-fds is used by make < 4.2
+AUTH_REGEX = re.compile(r'--jobserver-(?:auth|fds)=(\S+)')
+
+
+class JobServer:
+    """Take and give back jobserver tokens
+
+    :ivar read_fd: file descriptor tokens are read from
+    :ivar write_fd: file descriptor tokens are written to
+    :ivar makeflags: (str) MAKEFLAGS exported to sub-processes,
+                     None for clients (parent's MAKEFLAGS is inherited)
+    """
+    TOKEN = b'+'
+
+    def __init__(self, read_fd, write_fd, makeflags=None, tmpdir=None,
+                 pass_fds=()):
+        self.read_fd = read_fd
+        self.write_fd = write_fd
+        self.makeflags = makeflags
+        self._tmpdir = tmpdir  # directory of FIFO created by server
+        self._pass_fds = pass_fds  # exported file descriptors (server)
+        self._old_makeflags = None
+
+    @staticmethod
+    def available():
+        """server requires named FIFO (not available on Windows)"""
+        return hasattr(os, 'mkfifo')
+
+
+    @classmethod
+    def create(cls, num_jobs):
+        """create jobserver with tokens for `num_jobs` jobs (including the
+        implicit token) on a named FIFO
+        """
+        tmpdir = tempfile.mkdtemp(prefix='doit-jobserver-')
+        path = os.path.join(tmpdir, 'fifo')
+        os.mkfifo(path, 0o600)
+        # open for read and write, so never blocks or gets EOF
+        fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+        os.write(fd, cls.TOKEN * (num_jobs - 1))
+        # sub-processes get blocking file descriptors (pipe style) as
+        # supported by all versions of make
+        read_fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+        os.set_blocking(read_fd, True)
+        write_fd = os.open(path, os.O_WRONLY)
+        makeflags = '-j{} --jobserver-auth={},{}'.format(
+            num_jobs, read_fd, write_fd)
+        return cls(fd, fd, makeflags, tmpdir, (read_fd, write_fd))
+
+
+    @classmethod
+    def from_environ(cls, environ=None):
+        """client of jobserver from parent process
+
+        @return JobServer, or None if there is no jobserver or it is
+                not accessible
+        """
+        environ = os.environ if environ is None else environ
+        found = AUTH_REGEX.findall(environ.get('MAKEFLAGS', ''))
+        if not found:
+            return None
+        auth = found[-1]
+        if auth.startswith('fifo:'):
+            try:
+                fd = os.open(auth[5:], os.O_RDWR | os.O_NONBLOCK)
+            except OSError:
+                return None
+            return cls(fd, fd)
+
+        # pipe file descriptors inherited from parent
+        fds = _auth_fds(auth)
+        if fds is None or len(fds) != 2:
+            # i.e. parent make did not consider doit a recursive make
+            return None
+        read_fd, write_fd = fds
+        # setting O_NONBLOCK on the inherited pipe would also affect
+        # other processes, so open a new file description (Linux only)
+        try:
+            read_fd = os.open('/proc/self/fd/{}'.format(read_fd),
+                              os.O_RDONLY | os.O_NONBLOCK)
+        except OSError:
+            read_fd = os.dup(read_fd)
+        return cls(read_fd, os.dup(write_fd))
+
+
+    def try_acquire(self):
+        """take a token without blocking
+        @return (bytes) token, None if no token is available
+        """
+        if os.get_blocking(self.read_fd):
+            ready, _, _ = select.select([self.read_fd], [], [], 0)
+            if not ready:
+                return None
+        try:
+            token = os.read(self.read_fd, 1)
+        except BlockingIOError:
+            return None
+        return token or None
+
+    def release(self, token):
+        """give back a token taken with `try_acquire`"""
+        os.write(self.write_fd, token)
+
+
+    def export(self):
+        """set MAKEFLAGS used by sub-processes (server only)"""
+        if self.makeflags is None:
+            return
+        self._old_makeflags = os.environ.get('MAKEFLAGS')
+        if self._old_makeflags:
+            os.environ['MAKEFLAGS'] = '{} {}'.format(
+                self._old_makeflags, self.makeflags)
+        else:
+            os.environ['MAKEFLAGS'] = self.makeflags
+
+    def close(self):
+        """close file descriptors, restore MAKEFLAGS and remove FIFO"""
+        if self.makeflags is not None:
+            if self._old_makeflags is None:
+                os.environ.pop('MAKEFLAGS', None)
+            else:
+                os.environ['MAKEFLAGS'] = self._old_makeflags
+        os.close(self.read_fd)
+        if self.write_fd != self.read_fd:
+            os.close(self.write_fd)
+        for fd in self._pass_fds:
+            os.close(fd)
+        if self._tmpdir:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+
+def _auth_fds(auth):
+    """@return tuple of (int) file descriptors from `--jobserver-auth`
+    value, None if not a pipe or not open on this process
+    """
+    try:
+        fds = tuple(int(fd) for fd in auth.split(','))
+        for fd in fds:
+            os.fstat(fd)
+    except (ValueError, OSError):
+        return None
+    return fds
+
+
+def inherited_fds(environ=None):
+    """file descriptors of jobserver pipe that must be kept open on
+    sub-processes (python closes them by default)
+
+    @return tuple of (int) file descriptors
+    """
+    environ = os.environ if environ is None else environ
+    found = AUTH_REGEX.findall(environ.get('MAKEFLAGS', ''))
+    if not found:
+        return ()
+    return _auth_fds(found[-1]) or ()
+
+
+def get_jobserver(num_jobs):
+    """@return JobServer: from parent process, or a new server for
+    `num_jobs` if doit is not executed by a jobserver
+    """
+    jobserver = JobServer.from_environ()
+    if jobserver is None:
+        if not JobServer.available():
+            sys.stderr.write(
+                "WARNING: jobserver not available on this platform.\n")
+            return None
+        jobserver = JobServer.create(num_jobs)
+    jobserver.export()
+    return jobserver
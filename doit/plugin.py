@@ -63,11 +63,12 @@ class PluginDict(dict):
     to make sure the plugin is loaded.
 
     Typically, one dict is created for each kind of plugin.
-    doit supports 4 categories:
+    doit supports 5 categories:
      - COMMAND
      - LOADER
      - BACKEND
      - REPORTER
+     - REMOTE_CACHE
     """
 
     entry_point_prefix = 'doit'
@@ -64,6 +64,22 @@ class ConsoleReporter:
         """skipped ignored task"""
         self.write("!! %s\n" % task.title())
 
+    def skip_cached(self, task):
+        """task targets restored from action cache"""
+        if task.name[0] != '_':
+            self.write("C  %s\n" % task.title())
+
+    def cache_stats(self, stats):
+        """action cache statistics, called before `complete_run`"""
+        lookups = stats['hits'] + stats['misses']
+        if lookups:
+            remote = ''
+            if stats.get('remote_hits'):
+                remote = ' ({} remote)'.format(stats['remote_hits'])
+            self.write("action cache: {} hits{}, {} misses ({:.0%} hit rate)\n"
+                       .format(stats['hits'], remote, stats['misses'],
+                               stats['hits'] / lookups))
+
     def cleanup_error(self, exception):
         """error during cleanup"""
         sys.stderr.write(exception.get_msg())
@@ -140,8 +156,8 @@ class ZeroReporter(ConsoleReporter):
         pass
 
     get_status = execute_task = add_failure = add_success \
-        = skip_uptodate = skip_ignore = teardown_task = complete_run \
-        = _just_pass
+        = skip_uptodate = skip_ignore = skip_cached = cache_stats \
+        = teardown_task = complete_run = _just_pass
 
     def runtime_error(self, msg):
         sys.stderr.write(msg)
@@ -164,7 +180,7 @@ class TaskResult:
     # FIXME what about returned value from python-actions ?
     def __init__(self, task):
         self.task = task
-        self.result = None  # fail, success, up-to-date, ignore
+        self.result = None  # fail, success, up-to-date, ignore, cached
         self.out = None  # stdout from task
         self.err = None  # stderr from task
         self.error = None  # error from doit (exception traceback)
@@ -207,6 +223,7 @@ class JsonReporter:
 
     - out (str)
     - err (str)
+    - cache (dict): action cache statistics (only if cache is enabled)
     - tasks (list - dict):
          - name (str)
          - result (str)
@@ -233,6 +250,7 @@ class JsonReporter:
         self.outstream = outstream
         # runtime and cleanup errors
         self.errors = []
+        self.cache = None  # action cache statistics
 
     def get_status(self, task):
         """called when task is selected (check if up-to-date)"""
@@ -258,6 +276,14 @@ class JsonReporter:
         """skipped ignored task"""
         self.t_results[task.name].set_result('ignore')
 
+    def skip_cached(self, task):
+        """task targets restored from action cache"""
+        self.t_results[task.name].set_result('cached')
+
+    def cache_stats(self, stats):
+        """action cache statistics"""
+        self.cache = stats
+
     def cleanup_error(self, exception):
         """error during cleanup"""
         self.errors.append(exception.get_msg())
@@ -287,6 +313,8 @@ class JsonReporter:
         json_data = {'tasks': task_result_list,
                      'out': log_out,
                      'err': log_err}
+        if self.cache is not None:
+            json_data['cache'] = self.cache
         # indent not available on simplejson 1.3 (debian etch)
         # json.dump(json_data, sys.stdout, indent=4)
         json.dump(json_data, self.outstream)
@@ -2,8 +2,10 @@
 
 from multiprocessing import Process, Queue as MQueue
 from threading import Thread
+import copy
 import pickle
 import queue
+from collections import deque, defaultdict
 
 try:
     import cloudpickle
@@ -14,6 +16,8 @@ except ImportError:
 from .exceptions import InvalidTask, BaseFail
 from .exceptions import TaskFailed, SetupError, DependencyError, UnmetDependency
 from .task import Stream, DelayedLoaded
+from .dependency import get_file_md5, Dependency, MemoryDB
+from .dependency import UptodateCalculator
 
 
 # execution result.
@@ -34,19 +38,31 @@ class Runner():
 
     """
     def __init__(self, dep_manager, reporter, continue_=False,
-                 always_execute=False, stream=None):
+                 always_execute=False, stream=None, action_cache=None,
+                 affected=None, keep_db_open=False):
         """
         @param dep_manager: DependencyBase
         @param reporter: reporter object to be used
         @param continue_: (bool) execute all tasks even after a task failure
         @param always_execute: (bool) execute even if up-to-date or ignored
         @param stream: (task.Stream) global verbosity
+        @param action_cache: (ActionCache) restore targets instead of
+                             executing tasks
+        @param affected: (set - str) name of tasks to be checked, other
+                         tasks are considered up-to-date (None -> check all)
+        @param keep_db_open: (bool) on finish DB is just saved (checkpoint),
+                             so it can be used by another run
         """
         self.dep_manager = dep_manager
         self.reporter = reporter
         self.continue_ = continue_
         self.always_execute = always_execute
         self.stream = stream if stream else Stream(0)
+        self.action_cache = action_cache
+        self.affected = affected
+        self.keep_db_open = keep_db_open
+        self._cache_keys = {}  # task name -> action_cache key
+        self.checked = []  # task names in the order its status was checked
 
         self.teardown_list = []  # list of tasks to be teardown
         self.final_result = SUCCESS  # until something fails
@@ -72,6 +88,18 @@ class Runner():
             self._stop_running = True
 
 
+    def _handle_status_error(self, node, message):
+        """error while checking if task is up-to-date"""
+        msg = "ERROR: Task '{}' checking dependencies: {}".format(
+            node.task.name, message)
+        self._handle_task_error(node, DependencyError(msg))
+
+
+    def _check_on_worker(self, task):
+        """task status is checked by the process that executes it"""
+        return False
+
+
     def _get_task_args(self, task, tasks_dict):
         """get values from other tasks"""
         task.init_options()
@@ -114,6 +142,7 @@ class Runner():
         if node.run_status is None:
 
             self.reporter.get_status(task)
+            self.checked.append(task.name)
 
             # overwrite with effective verbosity
             task.overwrite_verbosity(self.stream)
@@ -130,12 +159,24 @@ class Runner():
                 self._handle_task_error(node, UnmetDependency(bad_str))
                 return False
 
+            # not affected by changed files, created tasks are always checked
+            if (self.affected is not None
+                    and task.name not in self.affected
+                    and task.loader is not DelayedLoaded):
+                node.run_status = 'up-to-date'
+                self.reporter.skip_uptodate(task)
+                task.values = self.dep_manager.get_values(task.name)
+                return False
+
+            # status checked by the sub-process that executes the task
+            if self._check_on_worker(task):
+                node.run_status = 'run'
+                return True
+
             # check if task is up-to-date
             res = self.dep_manager.get_status(task, tasks_dict)
             if res.status == 'error':
-                msg = "ERROR: Task '{}' checking dependencies: {}".format(
-                    task.name, res.get_error_message())
-                self._handle_task_error(node, DependencyError(msg))
+                self._handle_status_error(node, res.get_error_message())
                 return False
 
             # set node.run_status
@@ -166,6 +207,47 @@ class Runner():
             self._handle_task_error(node, DependencyError(msg))
             return False
 
+        if self.action_cache is not None:
+            if self._restore_cached(node):
+                return False
+            # actions must not write into the content of the cache
+            self.action_cache.unlink_hardlinks(task.targets)
+        return True
+
+
+    def _file_hash(self, path):
+        """md5 of file content, shared with dep_manager file_cache"""
+        if self.dep_manager.file_cache is None:
+            return get_file_md5(path)
+        return self.dep_manager.file_cache.file_hash(path, get_file_md5)
+
+    def _restore_cached(self, node):
+        """restore task targets from action_cache
+
+        @return bool: task was restored and does not need to be executed
+        """
+        task = node.task
+        key = self.action_cache.task_key(task, self._file_hash)
+        if key is None:
+            return False
+        self._cache_keys[task.name] = key
+        if self.always_execute:
+            return False
+        entry = self.action_cache.restore(key, task.targets)
+        if entry is None:
+            return False
+        task.values = entry['values']
+        task.result = entry['result']
+        # values saved by `uptodate`, i.e. result of tasks used by `getargs`
+        task.save_extra_values()
+        try:
+            self.dep_manager.save_success(task)
+        except FileNotFoundError:
+            return False
+        node.run_status = "successful"
+        skip_cached = getattr(self.reporter, 'skip_cached',
+                              self.reporter.skip_uptodate)
+        skip_cached(task)
         return True
 
 
@@ -180,14 +262,17 @@ class Runner():
         return task.execute(self.stream)
 
 
-    def process_task_result(self, node, base_fail):
-        """handles result"""
+    def process_task_result(self, node, base_fail, states=None):
+        """handles result
+
+        @param states: (dict) file_dep states already computed
+        """
         task = node.task
         # save execution successful
         if base_fail is None:
             task.save_extra_values()
             try:
-                self.dep_manager.save_success(task)
+                self.dep_manager.save_success(task, states=states)
             except FileNotFoundError as exception:
                 msg = (f"ERROR: Task '{task.name}' saving success: "
                        f"Dependent file '{exception.filename}' does not exist.")
@@ -195,6 +280,9 @@ class Runner():
             else:
                 node.run_status = "successful"
                 self.reporter.add_success(task)
+                key = self._cache_keys.pop(task.name, None)
+                if key is not None:
+                    self.action_cache.put(key, task)
                 return
         # task error
         self._handle_task_error(node, base_fail)
@@ -239,9 +327,18 @@ class Runner():
     def finish(self):
         """finish running tasks"""
         # flush update dependencies
-        self.dep_manager.close()
+        self.dep_manager.stop_file_cache()
+        if self.keep_db_open:
+            self.dep_manager.checkpoint()
+        else:
+            self.dep_manager.close()
         self.teardown()
 
+        if self.action_cache is not None:
+            self.action_cache.close()
+            if hasattr(self.reporter, 'cache_stats'):
+                self.reporter.cache_stats(self.action_cache.stats())
+
         # report final results
         self.reporter.complete_run()
         return self.final_result
@@ -251,7 +348,9 @@ class Runner():
         """entry point to run tasks
         @ivar task_dispatcher (TaskDispatcher)
         """
+        self.dep_manager.start_file_cache()
         try:
+            self.dep_manager.prefetch(task_dispatcher.tasks.values())
             if hasattr(self.reporter, 'initialize'):
                 self.reporter.initialize(task_dispatcher.tasks,
                                          task_dispatcher.selected_tasks)
@@ -273,6 +372,7 @@ class JobHold:
 class JobTask:
     """Contains a Task object"""
     type = object()
+    snapshot = None  # saved data of task, status is checked on sub-process
     def __init__(self, task):
         self.name = task.name
         try:
@@ -292,6 +392,7 @@ Original exception {}: {}
 class JobTaskPickle:
     """dict of Task object excluding attributes that might be unpicklable"""
     type = object()
+    snapshot = None  # saved data of task, status is checked on sub-process
     def __init__(self, task):
         # actually a dict to be pickled
         self.task_dict = task.pickle_safe_dict()
@@ -348,10 +449,37 @@ class MRunner(Runner):
 
     def __init__(self, dep_manager, reporter,
                  continue_=False, always_execute=False,
-                 stream=None, num_process=1):
+                 stream=None, num_process=1, action_cache=None,
+                 affected=None, keep_db_open=False, worker_check=False,
+                 pools=None, jobserver=None):
+        """
+        @param worker_check: (bool) check if tasks are up-to-date and
+                 compute file_dep states on sub-processes, only the result
+                 is sent back to the main process (process based only).
+        @param pools: (dict) pool name -> max number of tokens used by
+                 tasks running at the same time (see Task.resources)
+        @param jobserver: (JobServer) every task running while other
+                 tasks are running takes a token from the jobserver
+        """
         Runner.__init__(self, dep_manager, reporter, continue_=continue_,
-                        always_execute=always_execute, stream=stream)
+                        always_execute=always_execute, stream=stream,
+                        action_cache=action_cache, affected=affected,
+                        keep_db_open=keep_db_open)
         self.num_process = num_process
+        # tasks are checked on main process if results are cached or
+        # always executed, or backend can not copy saved data of a task
+        self.worker_check = (
+            worker_check and self.Child == Process
+            and action_cache is None and not always_execute
+            and hasattr(dep_manager.backend, 'get_task'))
+        self._worker_checker = None  # (checker, file_table) for sub-process
+        self.pools = pools or {}
+        self._pool_used = defaultdict(int)  # pool name -> tokens in use
+        self._blocked = deque()  # ExecNode to run, waiting for pool tokens
+        self._unreported = deque()  # finished ExecNode not sent to dispatcher
+        self.jobserver = jobserver
+        self._job_tokens = {}  # task name -> jobserver token (None: implicit)
+        self._implicit_token = True  # implicit job token is not in use
 
         self.free_proc = 0   # number of free process
         self.task_dispatcher = None  # TaskDispatcher retrieve tasks
@@ -367,6 +495,8 @@ class MRunner(Runner):
         pickle_dict['reporter'] = None
         pickle_dict['task_dispatcher'] = None
         pickle_dict['dep_manager'] = None
+        pickle_dict['affected'] = None
+        pickle_dict['jobserver'] = None
         return pickle_dict
 
     def get_next_job(self, completed):
@@ -376,36 +506,135 @@ class MRunner(Runner):
         @returns : - None -> no more tasks to be executed
                    - JobXXX
         """
+        if completed is not None:
+            self._release(completed.task)
+            self._unreported.append(completed)
         if self._stop_running:
             return None  # gentle stop
-        node = completed
+        # tasks waiting for pool tokens have precedence
+        for node in self._blocked:
+            if self._acquire(node.task):
+                self._blocked.remove(node)
+                return self._create_job(node)
+
         while True:
-            # get next task from controller
+            # get next task from controller, sending finished tasks
+            node = self._unreported.popleft() if self._unreported else None
             try:
                 node = self.task_dispatcher.generator.send(node)
                 if node == "hold on":
+                    if self._unreported:
+                        continue
                     self.free_proc += 1
                     return JobHold()
             # no more tasks from controller...
             except StopIteration:
+                # ... wait for running tasks to release pool tokens
+                if self._blocked:
+                    self.free_proc += 1
+                    return JobHold()
                 # ... terminate one sub process if no other task waiting
                 return None
 
             # send a task to be executed
             if self.select_task(node, self.tasks):
-                # If sub-process already contains the Task object send
-                # only safe pickle data, otherwise send whole object.
-                task = node.task
-                if task.loader is DelayedLoaded and self.Child == Process:
-                    return JobTask(task)
-                else:
-                    return JobTaskPickle(task)
+                if self._acquire(node.task):
+                    return self._create_job(node)
+                # keep processes busy with tasks that do not use the pool
+                self._blocked.append(node)
+            else:
+                # not executed, send it back to controller as done
+                self._unreported.appendleft(node)
+
+
+    def _create_job(self, node):
+        """job to execute the task of a selected `node`"""
+        # If sub-process already contains the Task object send
+        # only safe pickle data, otherwise send whole object.
+        task = node.task
+        if task.loader is DelayedLoaded and self.Child == Process:
+            job = JobTask(task)
+        else:
+            job = JobTaskPickle(task)
+        if self._check_on_worker(task):
+            job.snapshot = self.dep_manager.task_snapshot(task)
+        return job
+
+
+    def _task_tokens(self, task):
+        """@return dict: pool name -> tokens taken by `task`
+
+        A task can not take more tokens than the pool size,
+        resources without a pool are not limited.
+        """
+        return {pool: min(amount, self.pools[pool])
+                for pool, amount in task.resources.items()
+                if pool in self.pools}
+
+    def _acquire(self, task):
+        """take pool and jobserver tokens used by `task`
+        @return bool: False if not enough tokens available (none are taken)
+        """
+        tokens = self._task_tokens(task)
+        for pool, amount in tokens.items():
+            if self._pool_used[pool] + amount > self.pools[pool]:
+                return False
+        if self.jobserver is not None:
+            if self._implicit_token:
+                self._implicit_token = False
+                self._job_tokens[task.name] = None
+            else:
+                job_token = self.jobserver.try_acquire()
+                if job_token is None:
+                    return False
+                self._job_tokens[task.name] = job_token
+        for pool, amount in tokens.items():
+            self._pool_used[pool] += amount
+        return True
+
+    def _release(self, task):
+        """give back pool and jobserver tokens taken by a finished `task`"""
+        for pool, amount in self._task_tokens(task).items():
+            self._pool_used[pool] -= amount
+        if task.name in self._job_tokens:
+            job_token = self._job_tokens.pop(task.name)
+            if job_token is None:
+                self._implicit_token = True
+            else:
+                self.jobserver.release(job_token)
+
+
+    def finish(self):
+        """give back jobserver tokens of tasks not finished
+        (interrupted run) before finishing"""
+        for job_token in self._job_tokens.values():
+            if job_token is not None:
+                self.jobserver.release(job_token)
+        self._job_tokens.clear()
+        self._implicit_token = True
+        return Runner.finish(self)
+
+
+    def _check_on_worker(self, task):
+        """tasks with file_dep are checked on sub-process, except if
+        setup-tasks depend on its status or uptodate needs data from
+        other tasks (only available on main process)
+        """
+        if not self.worker_check or not task.file_dep or task.setup_tasks:
+            return False
+        return not any(isinstance(utd, UptodateCalculator)
+                       for utd, _, _ in task.uptodate)
 
 
     def _run_tasks_init(self, task_dispatcher):
         """initialization for run_tasks"""
         self.task_dispatcher = task_dispatcher
         self.tasks = task_dispatcher.tasks
+        if self.worker_check:
+            # file_cache is not shared with sub-processes
+            checker = copy.copy(self.dep_manager.checker)
+            checker.file_cache = None
+            self._worker_checker = (checker, self.dep_manager.file_table)
 
 
     def _run_start_processes(self, job_q, result_q):
@@ -442,13 +671,21 @@ class MRunner(Runner):
 
     def _process_result(self, node, task, result):
         """process result received from sub-process"""
+        if 'check_error' in result:
+            self._handle_status_error(node, result['check_error'])
+            return
+        if result.get('status') == 'up-to-date':
+            node.run_status = 'up-to-date'
+            self.reporter.skip_uptodate(task)
+            task.values = self.dep_manager.get_values(task.name)
+            return
         base_fail = result.get('failure')
         task.update_from_pickle(result['task'])
         for action, output in zip(task.actions, result['out']):
             action.out = output
         for action, output in zip(task.actions, result['err']):
             action.err = output
-        self.process_task_result(node, base_fail)
+        self.process_task_result(node, base_fail, result.get('states'))
 
 
     def run_tasks(self, task_dispatcher):
@@ -544,14 +781,10 @@ class MRunner(Runner):
                     assert job.type is JobHold.type
                     continue  # pragma: no cover
 
-                result = {'name': task.name}
-                task_failure = self.execute_task(task)
-                if task_failure:
-                    result['failure'] = task_failure
-                result['task'] = task.pickle_safe_dict()
-                result['out'] = [action.out for action in task.actions]
-                result['err'] = [action.err for action in task.actions]
-
+                if job.snapshot is None:
+                    result = self._job_result(task, self.execute_task(task))
+                else:
+                    result = self._check_execute_task(task, job.snapshot)
                 result_q.put(result)
         except (SystemExit, KeyboardInterrupt, Exception) as exception:
             # error, blow-up everything. send exception info to master process
@@ -560,6 +793,49 @@ class MRunner(Runner):
                 'exception': str(exception)})
 
 
+    @staticmethod
+    def _job_result(task, task_failure, states=None):
+        """result of task execution sent to main process"""
+        result = {'name': task.name}
+        if task_failure:
+            result['failure'] = task_failure
+        if states is not None:
+            result['states'] = states
+        result['task'] = task.pickle_safe_dict()
+        result['out'] = [action.out for action in task.actions]
+        result['err'] = [action.err for action in task.actions]
+        return result
+
+
+    def _check_execute_task(self, task, snapshot):
+        """executed on sub-process: check task status using a copy of its
+        saved data, execute it if not up-to-date and compute file_dep states
+        """
+        checker, file_table = self._worker_checker
+        dep_manager = Dependency(MemoryDB, 'snapshot',
+                                 checker_cls=lambda: checker,
+                                 file_table=file_table,
+                                 backend_opts={'data': snapshot})
+        dep_manager.start_file_cache()
+        status = dep_manager.get_status(task, self.tasks)
+        if status.status == 'error':
+            return {'name': task.name,
+                    'check_error': status.get_error_message()}
+        if status.status == 'up-to-date':
+            return {'name': task.name, 'status': 'up-to-date'}
+
+        task_failure = self.execute_task(task)
+        states = None
+        if not task_failure:
+            # value_savers added by uptodate checks on this process
+            task.save_extra_values()
+            try:
+                states = dep_manager.get_file_states(task)
+            except FileNotFoundError:
+                pass  # reported by main process when saving success
+        return self._job_result(task, task_failure, states)
+
+
 class MThreadRunner(MRunner):
     """Parallel runner using threads"""
     Queue = staticmethod(queue.Queue)
@@ -575,3 +851,89 @@ class MThreadRunner(MRunner):
     @staticmethod
     def available():
         return True
+
+
+class ARunner(MRunner):
+    """Parallel runner using asyncio
+
+    Actions that support it (CmdAction) are executed asynchronously on the
+    event loop of the main thread, other actions are executed on a pool
+    of `num_process` threads.
+    At most `num_process` tasks are executed at the same time.
+    """
+    Child = None  # tasks are executed on main process
+
+    @staticmethod
+    def available():
+        return True
+
+    def _create_job(self, node):
+        """no need to create a job, task is executed on main process"""
+        return node
+
+
+    async def _execute_node(self, node, executor):
+        """execute task of `node`
+        @return (ExecNode, failure)
+        """
+        task = node.task
+        if task.teardown:
+            self.teardown_list.append(task)
+        self.reporter.execute_task(task)
+        return node, await task.execute_async(self.stream, executor)
+
+
+    async def _run_loop(self):
+        """dispatch tasks while there are free slots, process results
+        as tasks finish their execution
+        """
+        import asyncio  # only used by this runner
+        from concurrent.futures import ThreadPoolExecutor
+
+        executor = ThreadPoolExecutor(self.num_process)
+        running = set()  # asyncio.Future of executing tasks
+        done_nodes = deque()  # finished ExecNode not sent to dispatcher yet
+        finished = False
+        try:
+            while True:
+                while not finished and len(running) < self.num_process:
+                    completed = done_nodes.popleft() if done_nodes else None
+                    node = self.get_next_job(completed)
+                    if node is None:
+                        finished = True
+                    elif isinstance(node, JobHold):
+                        if not done_nodes:
+                            break  # wait for a running task to finish
+                    else:
+                        running.add(asyncio.ensure_future(
+                            self._execute_node(node, executor)))
+                if finished:
+                    # not sent to dispatcher anymore, just give back tokens
+                    while done_nodes:
+                        self._release(done_nodes.popleft().task)
+                if not running:
+                    # check for cyclic dependencies
+                    assert finished
+                    break
+                done, running = await asyncio.wait(
+                    running, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    node, base_fail = future.result()
+                    self.process_task_result(node, base_fail)
+                    done_nodes.append(node)
+        except BaseException:
+            for future in running:
+                future.cancel()
+            if running:
+                await asyncio.wait(running)
+            raise
+        finally:
+            executor.shutdown(wait=False)
+
+
+    def run_tasks(self, task_dispatcher):
+        """execute tasks on an asyncio event loop"""
+        import asyncio  # only used by this runner
+
+        self._run_tasks_init(task_dispatcher)
+        asyncio.run(self._run_loop())
@@ -3,6 +3,7 @@
 
 import os
 import sys
+import time
 import inspect
 from collections import OrderedDict
 from collections.abc import Callable
@@ -129,9 +130,13 @@ class Task:
     @ivar has_subtask: (bool) indicate this task has subtasks
     @ivar result: (str) last action "result". used to check task-result-dep
     @ivar values: (dict) values saved by task that might be used by other tasks
+    @ivar duration: (float) seconds taken to execute actions on last execution
     @ivar getargs: (dict) values from other tasks
     @ivar doc: (string) task documentation
     @ivar meta: (dict) extra info from user/plugin not directly used by doit
+    @ivar restat: (bool) keep mtime of targets re-generated with same content
+    @ivar resources: (dict) pool name -> number of tokens taken while
+                     running (limit concurrency on parallel execution)
 
     @ivar options: (dict) calculated params values (from getargs and taskopt)
     @ivar taskopt: (cmdparse.CmdParse)
@@ -164,7 +169,9 @@ class Task:
                   'getargs': ((dict,), ()),
                   'title': ((Callable,), (None,)),
                   'watch': ((list, tuple), ()),
-                  'meta': ((dict,), (None,))
+                  'meta': ((dict,), (None,)),
+                  'restat': ((bool,), ()),
+                  'resources': ((dict,), (None,)),
                   }
 
 
@@ -174,7 +181,8 @@ class Task:
                  subtask_of=None, has_subtask=False,
                  doc=None, params=(), pos_arg=None,
                  verbosity=None, io=None, title=None, getargs=None,
-                 watch=(), meta=None, loader=None):
+                 watch=(), meta=None, loader=None, restat=False,
+                 resources=None):
         """sanity checks and initialization
 
         @param params: (list of dict for parameters) see cmdparse.CmdOption
@@ -200,6 +208,9 @@ class Task:
         self.check_attr(name, 'title', title, self.valid_attr['title'])
         self.check_attr(name, 'watch', watch, self.valid_attr['watch'])
         self.check_attr(name, 'meta', meta, self.valid_attr['meta'])
+        self.check_attr(name, 'restat', restat, self.valid_attr['restat'])
+        self.check_attr(name, 'resources', resources,
+                        self.valid_attr['resources'])
 
         if '=' in name:
             msg = "Task '{}': name must not use the char '=' (equal sign)."
@@ -241,6 +252,7 @@ class Task:
         self.has_subtask = has_subtask
         self.result = None
         self.values = {}
+        self.duration = None
         self.verbosity = verbosity
         self.custom_title = title
         self.cfg_values = None
@@ -257,10 +269,24 @@ class Task:
         self.doc = self._init_doc(doc)
         self.watch = watch
         self.meta = meta
+        self.restat = restat
+        self.resources = self._init_resources(resources)
         # just indicate if actions were executed at all
         self.executed = False
 
 
+    def _init_resources(self, resources):
+        """validate resources, number of tokens must be a positive integer"""
+        resources = dict(resources or {})
+        for pool, amount in resources.items():
+            if (not isinstance(amount, int) or isinstance(amount, bool)
+                    or amount < 1):
+                msg = ("Task '{}': resources '{}' must be a positive "
+                       "integer, got: {!r}")
+                raise InvalidTask(msg.format(self.name, pool, amount))
+        return resources
+
+
     def _init_deps(self, file_dep, task_dep, calc_dep):
         """init for dependency related attributes"""
         self.dep_changed = None
@@ -469,12 +495,46 @@ class Task:
         self.executed = True
         self.init_options()
         task_stdout, task_stderr = stream._get_out_err(self.verbosity)
-        for action in self.actions:
-            action_return = action.execute(task_stdout, task_stderr)
-            if isinstance(action_return, BaseFail):
-                return action_return
-            self.result = action.result
-            self.values.update(action.values)
+        start = time.monotonic()
+        try:
+            for action in self.actions:
+                action_return = action.execute(task_stdout, task_stderr)
+                if isinstance(action_return, BaseFail):
+                    return action_return
+                self.result = action.result
+                self.values.update(action.values)
+        finally:
+            self.duration = time.monotonic() - start
+
+
+    async def execute_async(self, stream, executor=None):
+        """Executes the task on a running asyncio event loop.
+
+        Actions providing `execute_async` (CmdAction) are awaited,
+        other actions are executed on `executor`.
+        @return failure: see CmdAction.execute
+        """
+        import asyncio  # only used by asynchronous runner
+
+        self.executed = True
+        self.init_options()
+        task_stdout, task_stderr = stream._get_out_err(self.verbosity)
+        loop = asyncio.get_running_loop()
+        start = time.monotonic()
+        try:
+            for action in self.actions:
+                if hasattr(action, 'execute_async'):
+                    action_return = await action.execute_async(
+                        task_stdout, task_stderr)
+                else:
+                    action_return = await loop.run_in_executor(
+                        executor, action.execute, task_stdout, task_stderr)
+                if isinstance(action_return, BaseFail):
+                    return action_return
+                self.result = action.result
+                self.values.update(action.values)
+        finally:
+            self.duration = time.monotonic() - start
 
 
     def execute_teardown(self, stream):
@@ -1,3 +1,4 @@
+import asyncio
 import contextlib
 import io
 import locale
@@ -80,6 +81,21 @@ class TestCmdAction(unittest.TestCase):
         my_action.execute()
         self.assertEqual({}, my_action.values)
 
+    @unittest.skipIf(os.name != 'posix', 'jobserver pipe is posix only')
+    def test_jobserver_fds(self):
+        read_fd, write_fd = os.pipe()
+        self.addCleanup(os.close, read_fd)
+        self.addCleanup(os.close, write_fd)
+        env = os.environ.copy()
+        env['MAKEFLAGS'] = '-j2 --jobserver-auth={},{}'.format(
+            read_fd, write_fd)
+        # jobserver pipe is not closed on sub-process
+        code = 'import os; os.write({}, b"+")'.format(write_fd)
+        my_action = action.CmdAction([executable, '-c', code],
+                                     shell=False, env=env)
+        self.assertIsNone(my_action.execute())
+        self.assertEqual(b'+', os.read(read_fd, 1))
+
 
 class TestCmdActionParams(unittest.TestCase):
     def setUp(self):
@@ -469,6 +485,82 @@ class TestCmdSaveOuput(unittest.TestCase):
         self.assertEqual({'out': 'x1'}, my_action.values)
 
 
+class TestCmdActionAsync(unittest.TestCase):
+    def run_async(self, my_action, out=None, err=None):
+        return asyncio.run(my_action.execute_async(out, err))
+
+    def test_success(self):
+        my_action = action.CmdAction("%s hi_stdout hi2" % PROGRAM)
+        got = self.run_async(my_action)
+        self.assertIsNone(got)
+        self.assertEqual("hi_stdout", my_action.out)
+        self.assertEqual("hi2", my_action.err)
+        self.assertEqual("hi_stdouthi2", my_action.result)
+
+    def test_success_noshell(self):
+        my_action = action.CmdAction(PROGRAM.split() + ['hi'], shell=False)
+        self.assertIsNone(self.run_async(my_action))
+        self.assertEqual("hi", my_action.out)
+
+    def test_list_shell(self):
+        # can not be spawned by asyncio, executed on a thread
+        my_action = action.CmdAction(["%s hi" % PROGRAM], shell=True)
+        self.assertIsNone(self.run_async(my_action))
+        self.assertEqual("hi", my_action.out)
+
+    def test_error(self):
+        my_action = action.CmdAction("%s 1 2 3" % PROGRAM)
+        self.assertIsInstance(self.run_async(my_action), TaskError)
+
+    def test_failure(self):
+        my_action = action.CmdAction("%s please fail" % PROGRAM)
+        self.assertIsInstance(self.run_async(my_action), TaskFailed)
+        self.assertEqual("err output on failure", my_action.err)
+
+    def test_env(self):
+        env = os.environ.copy()
+        env['GELKIPWDUZLOVSXE'] = '1'
+        my_action = action.CmdAction("%s check env" % PROGRAM, env=env)
+        self.assertIsNone(self.run_async(my_action))
+
+    def test_realtime(self):
+        with tempfile.TemporaryFile('w+', encoding="utf-8") as fp_out:
+            my_action = action.CmdAction(
+                "%s hi_stdout hi2" % PROGRAM, buffering=1)
+            self.assertIsNone(self.run_async(my_action, out=fp_out))
+            fp_out.seek(0)
+            self.assertEqual("hi_stdout", fp_out.read())
+        self.assertEqual("hi_stdout", my_action.out)
+
+    def test_multiple_lines(self):
+        my_action = action.CmdAction("echo line1; echo line2")
+        self.assertIsNone(self.run_async(my_action))
+        self.assertEqual("line1\nline2\n", my_action.out)
+
+    def test_decode_error(self):
+        my_action = action.CmdAction(
+            [executable, '-c',
+             'import sys; sys.stdout.buffer.write(b"\\xa9")'],
+            shell=False, decode_error='strict')
+        self.assertIsInstance(self.run_async(my_action), TaskError)
+
+    def test_io_capture_no(self):
+        with tempfile.TemporaryFile('w+') as fp_out:
+            task = Task(name='foo', actions=[f"{PROGRAM} hi_stdout hi2"],
+                        io={'capture': False})
+            task.init_options()
+            my_action = task.actions[0]
+            self.assertIsNone(self.run_async(my_action, out=fp_out))
+            self.assertIsNone(my_action.out)
+            fp_out.seek(0)
+            self.assertEqual('hi_stdout', fp_out.read())
+
+    def test_save_out(self):
+        my_action = action.CmdAction(PROGRAM + " x1 x2", save_out='out')
+        self.run_async(my_action)
+        self.assertEqual({'out': 'x1'}, my_action.values)
+
+
 class FakeStream():
     def __init__(self, tty, fileno=None):
         self.tty = tty
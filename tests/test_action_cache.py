@@ -0,0 +1,259 @@
+import os
+import stat
+import time
+import shutil
+import tempfile
+import functools
+import unittest
+
+from doit.task import Task, result_dep
+from doit.action_cache import ActionCache, callable_key, action_key
+
+
+def write_file(path, content):
+    with open(path, 'w') as fp:
+        fp.write(content)
+
+def read_file(path):
+    with open(path) as fp:
+        return fp.read()
+
+def build(targets):
+    for target in targets:
+        write_file(target, 'built')
+
+def other_build(targets):
+    for target in targets:
+        write_file(target, 'other')
+
+
+class ActionCacheMixin:
+    """Provides self.cache (ActionCache) and self.tmpdir"""
+
+    def setUp(self):
+        super().setUp()
+        self.tmpdir = tempfile.mkdtemp(prefix='doit-test-cache-')
+        self.cache = ActionCache(os.path.join(self.tmpdir, 'cache'))
+        self.dep = os.path.join(self.tmpdir, 'dep.txt')
+        write_file(self.dep, 'dep content')
+        self.target = os.path.join(self.tmpdir, 'out', 'target.txt')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+        super().tearDown()
+
+    def new_task(self, action=build, **kwargs):
+        task = Task('t1', [action], file_dep=[self.dep],
+                    targets=[self.target], **kwargs)
+        task.init_options()
+        return task
+
+
+class TestCallableKey(unittest.TestCase):
+
+    def test_function(self):
+        self.assertEqual(callable_key(build), callable_key(build))
+        self.assertNotEqual(callable_key(build), callable_key(other_build))
+        self.assertIn('test_action_cache.build', callable_key(build)[0])
+
+    def test_partial(self):
+        key = callable_key(functools.partial(build, ['x']))
+        self.assertEqual('partial', key[0])
+        self.assertEqual(callable_key(build), key[1])
+
+    def test_lambda_constant(self):
+        # nested code objects do not include memory address
+        key1 = callable_key(lambda: [x for x in 'abc'])
+        key2 = callable_key(lambda: [x for x in 'abc'])
+        self.assertEqual(key1[1], key2[1])
+
+    def test_defaults(self):
+        def action(targets, content='built', *, mode='w'):
+            pass
+        key = callable_key(action)
+        action.__defaults__ = ('other',)
+        self.assertNotEqual(key, callable_key(action))
+        action.__defaults__ = ('built',)
+        self.assertEqual(key, callable_key(action))
+        action.__kwdefaults__ = {'mode': 'a'}
+        self.assertNotEqual(key, callable_key(action))
+
+    def test_closure(self):
+        def make_action(content):
+            def action(targets):
+                return content
+            return action
+        self.assertEqual(callable_key(make_action('a')),
+                         callable_key(make_action('a')))
+        self.assertNotEqual(callable_key(make_action('a')),
+                            callable_key(make_action('b')))
+
+    def test_recursive_closure(self):
+        def action(n):
+            return action(n - 1) if n else 0
+        self.assertEqual(callable_key(action), callable_key(action))
+
+    def test_partial_values(self):
+        self.assertNotEqual(
+            callable_key(functools.partial(build, content='a')),
+            callable_key(functools.partial(build, content='b')))
+        # functions as arguments are described by its code
+        self.assertNotEqual(
+            callable_key(functools.partial(build, build)),
+            callable_key(functools.partial(build, other_build)))
+
+    def test_callable_object(self):
+        class Builder:
+            def __init__(self, content):
+                self.content = content
+            def __call__(self, targets):
+                pass
+        self.assertEqual(callable_key(Builder('a')), callable_key(Builder('a')))
+        self.assertNotEqual(callable_key(Builder('a')),
+                            callable_key(Builder('b')))
+        self.assertIn('Builder.__call__', callable_key(Builder('a'))[0])
+
+    def test_cmd_action(self):
+        task = Task('t1', ['echo hi'])
+        self.assertEqual(['cmd', 'echo hi', True, None, {}],
+                         action_key(task.actions[0]))
+
+
+class TestTaskKey(ActionCacheMixin, unittest.TestCase):
+
+    def test_same_inputs(self):
+        self.assertEqual(self.cache.task_key(self.new_task()),
+                         self.cache.task_key(self.new_task()))
+
+    def test_dep_content(self):
+        key = self.cache.task_key(self.new_task())
+        write_file(self.dep, 'modified')
+        self.assertNotEqual(key, self.cache.task_key(self.new_task()))
+        # only content matters
+        write_file(self.dep, 'dep content')
+        os.utime(self.dep, (1600000000, 1600000000))
+        self.assertEqual(key, self.cache.task_key(self.new_task()))
+
+    def test_action(self):
+        self.assertNotEqual(
+            self.cache.task_key(self.new_task()),
+            self.cache.task_key(self.new_task(action=other_build)))
+
+    def test_options(self):
+        task = self.new_task()
+        key = self.cache.task_key(task)
+        task.options['x'] = 1
+        self.assertNotEqual(key, self.cache.task_key(task))
+
+    def test_not_cacheable(self):
+        self.assertIsNone(self.cache.task_key(Task('t1', [build])))
+        task = self.new_task(uptodate=[False])
+        self.assertIsNone(self.cache.task_key(task))
+
+    def test_getargs(self):
+        # values from getargs are part of task options
+        task = self.new_task(getargs={'x': ('t0', 'x')})
+        task.options['x'] = 1
+        key = self.cache.task_key(task)
+        self.assertIsNotNone(key)
+        task.options['x'] = 2
+        self.assertNotEqual(key, self.cache.task_key(task))
+
+    def test_result_dep_not_cacheable(self):
+        task = self.new_task(uptodate=[result_dep('t0')])
+        self.assertIsNone(self.cache.task_key(task))
+
+    def test_missing_dep(self):
+        os.remove(self.dep)
+        self.assertIsNone(self.cache.task_key(self.new_task()))
+
+
+class TestActionCache(ActionCacheMixin, unittest.TestCase):
+
+    def put(self, task):
+        os.makedirs(os.path.dirname(self.target), exist_ok=True)
+        build(task.targets)
+        key = self.cache.task_key(task)
+        self.assertTrue(self.cache.put(key, task))
+        return key
+
+    def test_put_restore(self):
+        task = self.new_task()
+        task.values = {'x': 1}
+        task.result = 'my-result'
+        key = self.put(task)
+        shutil.rmtree(os.path.dirname(self.target))
+        entry = self.cache.restore(key, [self.target])
+        self.assertEqual({'x': 1}, entry['values'])
+        self.assertEqual('my-result', entry['result'])
+        self.assertEqual('built', read_file(self.target))
+        # restored target is writable
+        write_file(self.target, 'modified')
+        self.assertEqual({'hits': 1, 'misses': 0, 'stored': 1, 'evicted': 0},
+                         self.cache.stats())
+
+    def test_miss(self):
+        self.assertIsNone(self.cache.restore('abcdef', [self.target]))
+        self.assertEqual(1, self.cache.misses)
+
+    def test_missing_blob(self):
+        key = self.put(self.new_task())
+        shutil.rmtree(os.path.join(self.cache.path, 'cas'))
+        self.assertIsNone(self.cache.restore(key, [self.target]))
+
+    def test_content_shared(self):
+        self.put(self.new_task())
+        write_file(self.dep, 'modified')
+        self.put(self.new_task())
+        blobs = self.cache._scan('cas')
+        self.assertEqual(1, len(blobs))
+        self.assertEqual(2, len(self.cache._scan('ac')))
+
+    def test_target_not_file(self):
+        task = self.new_task()
+        key = self.cache.task_key(task)
+        self.assertFalse(self.cache.put(key, task))
+
+    def test_hardlink(self):
+        self.cache.hardlink = True
+        key = self.put(self.new_task())
+        os.remove(self.target)
+        self.assertIsNotNone(self.cache.restore(key, [self.target]))
+        self.assertEqual('built', read_file(self.target))
+        self.assertGreater(os.stat(self.target).st_nlink, 1)
+        self.assertFalse(os.stat(self.target).st_mode & stat.S_IWUSR)
+
+    def test_unlink_hardlinks(self):
+        self.cache.hardlink = True
+        key = self.put(self.new_task())
+        self.cache.unlink_hardlinks([self.target])
+        self.assertTrue(os.path.exists(self.target))  # not a hard-link
+        self.cache.restore(key, [self.target])
+        other = os.path.join(self.tmpdir, 'other.txt')
+        os.link(self.dep, other)  # hard-link not in the cache
+        self.cache.unlink_hardlinks([self.target, other])
+        self.assertFalse(os.path.exists(self.target))
+        self.assertTrue(os.path.exists(other))
+
+    def test_evict(self):
+        self.cache.max_size = 6  # each target has 5 bytes
+        first = self.put(self.new_task())
+        entry_path = self.cache._entry_path(first)
+        os.utime(entry_path, (time.time() - 100, time.time() - 100))
+        write_file(self.dep, 'modified')
+        task = self.new_task()
+        os.makedirs(os.path.dirname(self.target), exist_ok=True)
+        other_build(task.targets)
+        second = self.cache.task_key(task)
+        self.cache.put(second, task)
+        self.cache.close()
+        # least recently used removed
+        self.assertEqual(1, self.cache.evicted)
+        self.assertFalse(os.path.exists(entry_path))
+        self.assertIsNotNone(self.cache.restore(second, [self.target]))
+        self.assertEqual(1, len(self.cache._scan('cas')))
+
+    def test_no_limit(self):
+        self.put(self.new_task())
+        self.cache.close()
+        self.assertEqual(0, self.cache.evicted)
@@ -0,0 +1,143 @@
+import os
+import unittest
+from io import StringIO
+
+from doit.exceptions import InvalidCommand
+from doit.task import Task
+from doit.cmd_auto import Auto
+from tests.support import CmdFactory, DepfileNameMixin, DependencyFileMixin
+
+
+class FakeWatcher:
+    """replay modifications from `changes`, interrupt when it is empty
+
+    `changes` items are functions that modify files and return
+    the modified paths.
+    """
+    changes = []
+    watched = []
+
+    def __init__(self, ignore=None):
+        self.ignore = ignore
+
+    @staticmethod
+    def available():
+        return True
+
+    def watch(self, files, dirs=()):
+        self.watched.append((files, dirs))
+
+    def wait(self, debounce=0.1, timeout=None):
+        if not self.changes:
+            raise KeyboardInterrupt()
+        return self.changes.pop(0)()
+
+    def close(self):
+        pass
+
+
+def check_content(dependencies):
+    with open(list(dependencies)[0]) as fp:
+        return 'fail' not in fp.read()
+
+
+class TestCmdAuto(DependencyFileMixin, DepfileNameMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        FakeWatcher.changes = []
+        FakeWatcher.watched = []
+
+    def modify(self, path, content='modified'):
+        def change():
+            with open(path, 'a') as fp:
+                fp.write(content)
+            return {path}
+        return change
+
+    def run_auto(self, task_list, changes, **kwargs):
+        FakeWatcher.changes = changes
+        output = StringIO()
+        cmd = CmdFactory(Auto, outstream=output, backend='dbm',
+                         dep_file=self.depfile_name, task_list=task_list)
+        cmd.watcher_class = FakeWatcher
+        result = cmd._execute(debounce=0, **kwargs)
+        return result, output.getvalue().split("\n")[:-1]
+
+    def test_affected_only(self):
+        task_list = [Task("t1", [""], file_dep=[self.dependency1]),
+                     Task("t2", [""], file_dep=[self.dependency2])]
+        changes = [self.modify(self.dependency1),
+                   self.modify(self.dependency2)]
+        result, got = self.run_auto(task_list, changes)
+        self.assertEqual(0, result)
+        self.assertEqual([".  t1", ".  t2",
+                          ".  t1", "-- t2",
+                          "-- t1", ".  t2"], got)
+        files, dirs = FakeWatcher.watched[0]
+        self.assertEqual({self.dependency1, self.dependency2}, files)
+
+    def test_lost_events(self):
+        task_list = [Task("t1", [""], file_dep=[self.dependency1])]
+        result, got = self.run_auto(task_list, [lambda: None])
+        self.assertEqual([".  t1", "-- t1"], got)
+
+    def test_failed_checked_again(self):
+        task_list = [Task("t1", [check_content], file_dep=[self.dependency1]),
+                     Task("t2", [""], file_dep=[self.dependency2])]
+        changes = [self.modify(self.dependency1, 'fail'),
+                   self.modify(self.dependency2)]
+        result, got = self.run_auto(task_list, changes, continue_=True)
+        self.assertEqual(1, result)
+        # t1 failed on second run, so it is executed again on third run
+        status = [line for line in got if line[:3] in ('.  ', '-- ')]
+        self.assertEqual([".  t1", ".  t2",
+                          ".  t1", "-- t2",
+                          ".  t1", ".  t2"], status)
+
+    def test_watch(self):
+        watch_dir = os.path.dirname(self.depfile_name)
+        target = os.path.join(watch_dir, 'target')
+        task_list = [Task("t1", [""], watch=[watch_dir]),
+                     Task("t2", [""], file_dep=[self.dependency1],
+                          targets=[target]),
+                     Task("t3", [""], file_dep=[self.dependency2],
+                          uptodate=[True])]
+        changes = [lambda: {watch_dir}]
+        result, got = self.run_auto(task_list, changes)
+        self.assertEqual([".  t1", ".  t2", ".  t3",
+                          ".  t1", "-- t2", "-- t3"], got)
+        files, dirs = FakeWatcher.watched[0]
+        self.assertEqual({watch_dir}, dirs)
+        self.assertNotIn(target, files)
+
+    def test_ignore_path(self):
+        target = os.path.abspath('generated')
+        cmd = CmdFactory(Auto, backend='dbm', dep_file=self.depfile_name,
+                         task_list=[Task("t1", [""], targets=[target])])
+        cmd.watcher_class = FakeWatcher
+        cmd._execute(debounce=0)
+        self.assertTrue(cmd.ignore_path(target))
+        self.assertTrue(cmd.ignore_path(os.path.abspath(self.depfile_name)))
+        self.assertFalse(cmd.ignore_path(self.dependency1))
+
+    def test_callbacks(self):
+        result_file = os.path.join(os.path.dirname(self.depfile_name),
+                                   'callback')
+        task_list = [Task("t1", [check_content], file_dep=[self.dependency1])]
+        changes = [self.modify(self.dependency1, 'fail')]
+        self.run_auto(task_list, changes,
+                      success_callback='echo success >> ' + result_file,
+                      failure_callback='echo failure >> ' + result_file)
+        with open(result_file) as fp:
+            self.assertEqual(['success', 'failure'], fp.read().split())
+
+    def test_not_available(self):
+        class NotAvailable(FakeWatcher):
+            @staticmethod
+            def available():
+                return False
+        cmd = CmdFactory(Auto, backend='dbm', dep_file=self.depfile_name,
+                         task_list=[Task("t1", [""])])
+        cmd.watcher_class = NotAvailable
+        self.assertRaises(InvalidCommand, cmd._execute)
@@ -6,7 +6,8 @@ from unittest.mock import patch
 from doit import version
 from doit.cmdparse import CmdParseError, CmdParse
 from doit.exceptions import InvalidCommand, InvalidDodoFile
-from doit.dependency import FileChangedChecker, JSONCodec
+from doit.dependency import FileChangedChecker, JSONCodec, MarshalCodec
+from doit.dependency import HashChecker
 from doit.task import Task
 from doit.loader import task_params
 from doit.cmd_base import version_tuple, Command, DoitCmdBase
@@ -288,6 +289,17 @@ class TestDoitCmdBase(DepfileNameMixin, unittest.TestCase):
         mycmd.execute(params, args)
         self.assertIsInstance(mycmd.dep_manager.checker, MyChecker)
 
+    def testHashChecker(self):
+        mycmd = self.MyCmd(task_loader=ModuleTaskLoader({}))
+        params, args = CmdParse(mycmd.get_options()).parse(
+            ['--check_file_uptodate', 'sha256', '--hash-buffer-size', '4096'])
+        params['dep_file'] = self.depfile_name
+        mycmd.execute(params, args)
+        checker = mycmd.dep_manager.checker
+        self.assertIsInstance(checker, HashChecker)
+        self.assertEqual('sha256', checker.algorithm)
+        self.assertEqual(4096, checker.buffer_size)
+
     def testCustomCodec(self):
         class MyCodec(JSONCodec):
             pass
@@ -299,6 +311,80 @@ class TestDoitCmdBase(DepfileNameMixin, unittest.TestCase):
         mycmd.execute(params, args)
         self.assertIsInstance(mycmd.dep_manager.backend.codec, MyCodec)
 
+    def testMarshalCodec(self):
+        mycmd = self.MyCmd(task_loader=ModuleTaskLoader({}))
+        params, args = CmdParse(mycmd.get_options()).parse([])
+        params['codec_cls'] = 'marshal'
+        params['dep_file'] = self.depfile_name
+        mycmd.execute(params, args)
+        self.assertIsInstance(mycmd.dep_manager.backend.codec, MarshalCodec)
+
+    def testHashWorkers(self):
+        mycmd = self.MyCmd(task_loader=ModuleTaskLoader({}))
+        params, args = CmdParse(mycmd.get_options()).parse(
+            ['--hash-workers', '4'])
+        params['dep_file'] = self.depfile_name
+        mycmd.execute(params, args)
+        self.assertEqual(4, mycmd.dep_manager.hash_workers)
+
+    def testFileTable(self):
+        mycmd = self.MyCmd(task_loader=ModuleTaskLoader({}))
+        params, args = CmdParse(mycmd.get_options()).parse(['--file-table'])
+        params['dep_file'] = self.depfile_name
+        mycmd.execute(params, args)
+        self.assertTrue(mycmd.dep_manager.file_table)
+
+    def testCheckpoint(self):
+        mycmd = self.MyCmd(task_loader=ModuleTaskLoader({}))
+        params, args = CmdParse(mycmd.get_options()).parse(
+            ['--checkpoint-tasks', '50', '--checkpoint-interval', '2.5'])
+        params['dep_file'] = self.depfile_name
+        mycmd.execute(params, args)
+        self.assertEqual(50, mycmd.dep_manager.checkpoint_tasks)
+        self.assertEqual(2.5, mycmd.dep_manager.checkpoint_interval)
+
+    def testSqlitePragmas(self):
+        mycmd = self.MyCmd(task_loader=ModuleTaskLoader({}))
+        params, args = CmdParse(mycmd.get_options()).parse(
+            ['--backend', 'sqlite3',
+             '--sqlite-pragmas', 'journal_mode=delete',
+             '--sqlite-pragmas', 'synchronous=FULL'])
+        params['dep_file'] = self.depfile_name
+        mycmd.execute(params, args)
+        self.assertEqual({'journal_mode': 'delete', 'synchronous': 'FULL'},
+                         mycmd.dep_manager.backend.pragmas)
+        mycmd.dep_manager.close()
+
+    def testReadOnlyDB(self):
+        class ReadCmd(self.MyCmd):
+            read_only_db = True
+        for backend in ('dbm', 'json', 'sqlite3', 'journal'):
+            mycmd = ReadCmd(task_loader=ModuleTaskLoader({}))
+            params, args = CmdParse(mycmd.get_options()).parse(
+                ['--backend', backend])
+            params['dep_file'] = self.depfile_name
+            mycmd.execute(params, args)
+            self.assertTrue(mycmd.dep_manager.read_only)
+            mycmd.dep_manager.close()
+            self.assertFalse(os.path.exists(self.depfile_name), backend)
+
+    def testConcurrentDB(self):
+        for backend in ('json', 'sqlite3', 'journal'):
+            mycmd = self.MyCmd(task_loader=ModuleTaskLoader({}))
+            params, args = CmdParse(mycmd.get_options()).parse(
+                ['--backend', backend, '--concurrent-db'])
+            params['dep_file'] = self.depfile_name + backend
+            mycmd.execute(params, args)
+            self.assertTrue(mycmd.dep_manager.backend.concurrent)
+            mycmd.dep_manager.close()
+
+    def testSqlitePragmasInvalid(self):
+        mycmd = self.MyCmd(task_loader=ModuleTaskLoader({}))
+        params, args = CmdParse(mycmd.get_options()).parse(
+            ['--backend', 'sqlite3', '--sqlite-pragmas', 'journal_mode'])
+        params['dep_file'] = self.depfile_name
+        self.assertRaises(InvalidCommand, mycmd.execute, params, args)
+
     def testPluginBackend(self):
         mycmd = self.MyCmd(task_loader=ModuleTaskLoader({}),
                            config={'BACKEND': {'j2': 'doit.dependency:JsonDB'}})
@@ -4,6 +4,7 @@ import contextlib
 from dbm import whichdb
 
 from doit.cmd_dumpdb import DumpDB
+from doit.dependency import Dependency, DbmDB, MarshalCodec
 from tests.support import DepManagerMixin
 
 
@@ -24,3 +25,20 @@ class TestCmdDumpDB(DepManagerMixin, unittest.TestCase):
         self.assertIn('tid', got)
         self.assertIn('my_dep', got)
         self.assertIn('xxx', got)
+
+    def testMarshal(self):
+        self.dep_manager.close()
+        dep_manager = Dependency(DbmDB, self.dep_manager.name,
+                                 codec_cls=MarshalCodec)
+        dep_manager._set('tid', 'my_dep', 'xxx')
+        dep_manager.close()
+        dbm_kind = whichdb(self.dep_manager.name)
+        if dbm_kind in ('dbm', 'dbm.ndbm'):  # pragma: no cover
+            self.skipTest(f'"{dbm_kind}" not supported for this operation')
+        cmd_dump = DumpDB()
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            cmd_dump.execute({'dep_file': self.dep_manager.name}, [])
+        got = out.getvalue()
+        self.assertIn('my_dep', got)
+        self.assertIn('xxx', got)
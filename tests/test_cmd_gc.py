@@ -0,0 +1,60 @@
+import unittest
+from unittest.mock import Mock
+from io import StringIO
+
+from doit.exceptions import InvalidCommand
+from doit.dependency import DbmDB, SqliteDB, Dependency
+from doit.cmd_gc import Gc
+from tests.support import tasks_sample, CmdFactory, DepfileNameMixin
+
+
+class TestCmdGc(DepfileNameMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tasks = tasks_sample()
+
+    def _add_task_deps(self, db_class, names):
+        """put some data on DB"""
+        dep = Dependency(db_class, self.depfile_name)
+        for name in names:
+            dep._set(name, "_values_:", {'x': 'y' * 1000})
+        dep.close()
+
+    def testGc(self):
+        removed = ['old_%d' % num for num in range(50)]
+        self._add_task_deps(DbmDB, [t.name for t in self.tasks] + removed)
+        output = StringIO()
+        cmd_gc = CmdFactory(Gc, outstream=output, dep_file=self.depfile_name,
+                            backend='dbm', task_list=self.tasks)
+        cmd_gc._execute()
+        got = output.getvalue().split("\n")[:-1]
+        self.assertEqual(
+            "removed: 50 tasks, 0 file states, 0 file table entries", got[0])
+        self.assertTrue(got[1].startswith("reclaimed "))
+        dep = Dependency(DbmDB, self.depfile_name)
+        for name in removed:
+            self.assertFalse(dep._in(name))
+        for task in self.tasks:
+            self.assertEqual({'x': 'y' * 1000}, dep.get_values(task.name))
+        dep.close()
+
+    def testReclaimed(self):
+        removed = ['old_%d' % num for num in range(50)]
+        self._add_task_deps(SqliteDB, [t.name for t in self.tasks] + removed)
+        output = StringIO()
+        cmd_gc = CmdFactory(Gc, outstream=output, dep_file=self.depfile_name,
+                            backend='sqlite3', task_list=self.tasks)
+        cmd_gc._execute()
+        reclaimed = output.getvalue().split("\n")[1]
+        self.assertGreater(int(reclaimed.split()[1]), 0)
+
+    def testNotSupported(self):
+        output = StringIO()
+        cmd_gc = CmdFactory(Gc, outstream=output, dep_file=self.depfile_name,
+                            backend='dbm', task_list=self.tasks)
+        cmd_gc.dep_manager.close()
+        # backend without task_ids() / get_task()
+        cmd_gc.dep_manager.backend = Mock(spec=['dump'])
+        cmd_gc.dep_manager._closed = False
+        self.assertRaises(InvalidCommand, cmd_gc._execute)
@@ -7,7 +7,10 @@ from unittest.mock import Mock, patch
 
 from doit.exceptions import InvalidCommand
 from doit import reporter, runner
-from doit.cmd_run import Run
+from doit.task import Task
+from doit.control import TaskControl
+from doit.cmd_run import Run, parse_pools
+from doit.remote_cache import HttpCache
 from tests.support import tasks_sample, CmdFactory
 from tests.support import DepfileNameMixin, DependencyFileMixin
 
@@ -33,6 +36,20 @@ class TestCmdRun(DependencyFileMixin, DepfileNameMixin, unittest.TestCase):
         got = output.getvalue().split("\n")[:-1]
         self.assertEqual([".  t1", ".  t2", ".  g1.a", ".  g1.b", ".  t3"], got)
 
+    @unittest.skipIf(not runner.MRunner.available(), 'MRunner not available')
+    def testProcessRunMPWorkerCheck(self):
+        for expected in ([".  t1", ".  t2", ".  g1.a", ".  g1.b", ".  t3"],
+                         [".  t1", "-- t2", ".  g1.a", ".  g1.b", ".  t3"]):
+            output = StringIO()
+            cmd_run = CmdFactory(Run, backend='dbm',
+                                 dep_file=self.depfile_name,
+                                 task_list=tasks_sample(self.dependency1))
+            result = cmd_run._execute(output, num_process=1, worker_check=True)
+            self.assertEqual(0, result)
+            # order depends on durations of previous execution
+            got = output.getvalue().split("\n")[:-1]
+            self.assertEqual(sorted(expected), sorted(got))
+
     def testProcessRunMThread(self):
         output = StringIO()
         cmd_run = CmdFactory(Run, backend='dbm', dep_file=self.depfile_name,
@@ -42,6 +59,15 @@ class TestCmdRun(DependencyFileMixin, DepfileNameMixin, unittest.TestCase):
         got = output.getvalue().split("\n")[:-1]
         self.assertEqual([".  t1", ".  t2", ".  g1.a", ".  g1.b", ".  t3"], got)
 
+    def testProcessRunAsync(self):
+        output = StringIO()
+        cmd_run = CmdFactory(Run, backend='dbm', dep_file=self.depfile_name,
+                             task_list=tasks_sample(self.dependency1))
+        result = cmd_run._execute(output, num_process=1, par_type='async')
+        self.assertEqual(0, result)
+        got = output.getvalue().split("\n")[:-1]
+        self.assertEqual([".  t1", ".  t2", ".  g1.a", ".  g1.b", ".  t3"], got)
+
     def testInvalidParType(self):
         output = StringIO()
         cmd_run = CmdFactory(Run, backend='dbm', dep_file=self.depfile_name,
@@ -115,6 +141,195 @@ class TestCmdRun(DependencyFileMixin, DepfileNameMixin, unittest.TestCase):
         self.assertEqual([], got)
 
 
+    def testActionCache(self):
+        cache_dir = os.path.join(os.path.dirname(self.depfile_name), 'cache')
+        target = os.path.join(os.path.dirname(self.depfile_name), 'target')
+        def make_task():
+            return Task("t1", ["echo built > %(targets)s"],
+                        file_dep=[self.dependency1], targets=[target])
+        cmd_run = CmdFactory(Run, backend='dbm', dep_file=self.depfile_name,
+                             task_list=[make_task()])
+        output = StringIO()
+        self.assertEqual(0, cmd_run._execute(output, action_cache=cache_dir))
+        self.assertEqual(
+            [".  t1", "action cache: 0 hits, 1 misses (0% hit rate)"],
+            output.getvalue().split("\n")[:-1])
+
+        # new DB, target restored from cache
+        os.remove(target)
+        cmd_run = CmdFactory(Run, backend='dbm',
+                             dep_file=self.depfile_name + '_2',
+                             task_list=[make_task()])
+        output = StringIO()
+        self.assertEqual(0, cmd_run._execute(output, action_cache=cache_dir))
+        self.assertEqual(
+            ["C  t1", "action cache: 1 hits, 0 misses (100% hit rate)"],
+            output.getvalue().split("\n")[:-1])
+        self.assertTrue(os.path.exists(target))
+
+    def testFingerprint(self):
+        target = os.path.join(os.path.dirname(self.depfile_name), 'target')
+        def run():
+            task_list = [
+                Task("t1", ["echo built > %(targets)s"],
+                     file_dep=[self.dependency1], targets=[target]),
+                Task("t2", None, task_dep=["t1"]),
+            ]
+            cmd_run = CmdFactory(Run, backend='dbm',
+                                 dep_file=self.depfile_name,
+                                 task_list=task_list)
+            output = StringIO()
+            self.assertEqual(0, cmd_run._execute(output, fingerprint=True))
+            return cmd_run, output.getvalue().split("\n")[:-1]
+
+        cmd_run, got = run()
+        self.assertEqual([".  t1"], got)
+        self.assertTrue(os.path.exists(self.depfile_name + '.fingerprint'))
+        # nothing changed, graph not built
+        cmd_run, got = run()
+        self.assertEqual(["-- t1"], got)
+        self.assertIsNone(cmd_run.control)
+        # file_dep modified
+        with open(self.dependency1, 'a') as fp:
+            fp.write('modified')
+        cmd_run, got = run()
+        self.assertEqual([".  t1"], got)
+        self.assertIsNotNone(cmd_run.control)
+
+    def testFingerprintModifiedDuringRun(self):
+        def modify_dep():
+            with open(self.dependency1, 'a') as fp:
+                fp.write('modified')
+        def run(actions):
+            task_list = [
+                Task("t1", ["echo t1"], file_dep=[self.dependency1]),
+                Task("t2", actions, file_dep=[self.dependency2],
+                     task_dep=["t1"]),
+            ]
+            cmd_run = CmdFactory(Run, backend='dbm',
+                                 dep_file=self.depfile_name,
+                                 task_list=task_list)
+            output = StringIO()
+            self.assertEqual(0, cmd_run._execute(output, fingerprint=True))
+            return output.getvalue().split("\n")[:-1]
+
+        # dependency1 is modified after t1 was checked
+        self.assertEqual([".  t1", ".  t2"], run([modify_dep]))
+        self.assertFalse(os.path.exists(self.depfile_name + '.fingerprint'))
+        self.assertEqual([".  t1", "-- t2"], run([modify_dep]))
+
+    def testFingerprintNotSupported(self):
+        # task without dependencies is always executed
+        cmd_run = CmdFactory(Run, backend='dbm', dep_file=self.depfile_name,
+                             task_list=tasks_sample(self.dependency1))
+        self.assertEqual(0, cmd_run._execute(StringIO(), fingerprint=True))
+        self.assertFalse(os.path.exists(self.depfile_name + '.fingerprint'))
+
+    def testChangedFrom(self):
+        changed = os.path.join(os.path.dirname(self.depfile_name), 'changed')
+        def run(task_names):
+            task_list = [Task(name, ["echo %s" % name],
+                              file_dep=[self.dependency1])
+                         for name in task_names]
+            task_list.append(Task("t3", [""], file_dep=[self.dependency2],
+                                  task_dep=["t1"]))
+            cmd_run = CmdFactory(Run, backend='dbm',
+                                 dep_file=self.depfile_name,
+                                 task_list=task_list)
+            output = StringIO()
+            self.assertEqual(0, cmd_run._execute(output, changed_from=changed))
+            return output.getvalue().split("\n")[:-1]
+
+        with open(changed, 'w') as fp:
+            fp.write('\n')
+        # never executed tasks are always checked
+        self.assertEqual([".  t1", ".  t3"], run(["t1"]))
+        # modification of a file not listed is not detected
+        with open(self.dependency1, 'a') as fp:
+            fp.write('modified')
+        self.assertEqual(["-- t1", ".  t2", "-- t3"], run(["t1", "t2"]))
+        # tasks with listed files and its dependents are checked
+        with open(self.dependency1, 'a') as fp:
+            fp.write('modified again')
+        with open(changed, 'w') as fp:
+            fp.write(self.dependency1 + '\n')
+        self.assertEqual([".  t1", ".  t2", "-- t3"], run(["t1", "t2"]))
+
+    def testTaskDispatcherPriority(self):
+        task_list = [Task("t1", [""]), Task("t2", [""], task_dep=["t1"])]
+        cmd_run = CmdFactory(Run, backend='dbm', dep_file=self.depfile_name,
+                             task_list=task_list)
+        self.assertEqual(0, cmd_run._execute(StringIO(), num_process=2))
+        cmd_run = CmdFactory(Run, backend='dbm', dep_file=self.depfile_name,
+                             task_list=task_list)
+        cmd_run.control = TaskControl(task_list)
+        cmd_run.control.process(None)
+        # serial execution keep definition order
+        self.assertIsNone(cmd_run.task_dispatcher(0).priority)
+        # durations saved by previous execution
+        priority = cmd_run.task_dispatcher(2).priority
+        self.assertEqual({'t1', 't2'}, set(priority))
+        self.assertGreater(priority['t1'], priority['t2'])
+        cmd_run.dep_manager.close()
+
+    def testPools(self):
+        task_list = [Task("t1", [""], resources={'link': 1}),
+                     Task("t2", [""], resources={'link': 1})]
+        cmd_run = CmdFactory(Run, backend='dbm', dep_file=self.depfile_name,
+                             task_list=task_list)
+        with patch.object(runner.MThreadRunner, '_acquire',
+                          autospec=True,
+                          side_effect=runner.MThreadRunner._acquire) as acq:
+            result = cmd_run._execute(StringIO(), num_process=2,
+                                      par_type='thread', pools=['link=1'])
+        self.assertEqual(0, result)
+        self.assertEqual({'link': 1}, acq.call_args[0][0].pools)
+
+    @patch.dict(os.environ)
+    def testJobserver(self):
+        os.environ.pop('MAKEFLAGS', None)
+        makeflags = []
+        def get_makeflags():
+            makeflags.append(os.environ.get('MAKEFLAGS'))
+        task_list = [Task("t1", [get_makeflags])]
+        cmd_run = CmdFactory(Run, backend='dbm', dep_file=self.depfile_name,
+                             task_list=task_list)
+        result = cmd_run._execute(StringIO(), num_process=2,
+                                  par_type='thread', jobserver=True)
+        self.assertEqual(0, result)
+        self.assertIn('-j2 --jobserver-auth=', makeflags[0])
+        # restored after execution
+        self.assertNotIn('MAKEFLAGS', os.environ)
+
+    def testParsePools(self):
+        self.assertEqual({'a': 1, 'b': 2}, parse_pools(['a=1', 'b = 2']))
+        self.assertEqual({'a': 1, 'b': 2}, parse_pools(['a=1,b=2']))
+        self.assertEqual({'a': 3}, parse_pools({'a': 3}))
+        self.assertRaises(InvalidCommand, parse_pools, ['a'])
+        self.assertRaises(InvalidCommand, parse_pools, ['a=x'])
+        self.assertRaises(InvalidCommand, parse_pools, {'a': 0})
+
+    def testChangedFromMissingFile(self):
+        cmd_run = CmdFactory(Run, backend='dbm', dep_file=self.depfile_name,
+                             task_list=tasks_sample())
+        self.assertRaises(InvalidCommand, cmd_run._execute, StringIO(),
+                          changed_from='i_dont_exist')
+
+    def testRemoteCacheRequiresActionCache(self):
+        cmd_run = CmdFactory(Run, backend='dbm', dep_file=self.depfile_name,
+                             task_list=tasks_sample())
+        self.assertRaises(InvalidCommand, cmd_run._execute, StringIO(),
+                          remote_cache='http://localhost:9090')
+
+    def testGetRemoteCache(self):
+        cmd_run = CmdFactory(Run, task_list=tasks_sample())
+        remote = cmd_run.get_remote_cache('https://cache.example.com/', 3)
+        self.assertIsInstance(remote, HttpCache)
+        self.assertEqual(3, remote.timeout)
+        self.assertRaises(InvalidCommand, cmd_run.get_remote_cache,
+                          'grpc://cache.example.com', 3)
+
+
 class MyReporter(reporter.ConsoleReporter):
     def get_status(self, task):
         self.outstream.write('MyReporter.start %s\n' % task.name)
@@ -1,10 +1,11 @@
+import os
 import unittest
 from collections import deque
 
 from doit.exceptions import InvalidDodoFile, InvalidCommand
 from doit.task import Stream, InvalidTask, Task, DelayedLoader
 from doit.control import TaskControl, TaskDispatcher, ExecNode
-from doit.control import no_none
+from doit.control import no_none, file_index, ReadyQueue
 
 
 def _make_tasks_sample():
@@ -235,6 +236,106 @@ class TestTaskControlCmdOptions(unittest.TestCase):
             ["hello option!", "t1"], tc.tasks['tP'].pos_arg_val)
 
 
+class TestFileIndex(unittest.TestCase):
+
+    def test_index(self):
+        tasks = [Task('t1', None, file_dep=['a.txt', 'sub/../b.txt']),
+                 Task('t2', None, file_dep=['b.txt'])]
+        index = file_index(tasks)
+        self.assertEqual({'t1'}, index[os.path.abspath('a.txt')])
+        self.assertEqual({'t1', 't2'}, index[os.path.abspath('b.txt')])
+
+
+class TestTaskControlAffectedTasks(unittest.TestCase):
+
+    def test_file_dep(self):
+        tasks = [Task('t1', None, file_dep=['a.txt']),
+                 Task('t2', None, file_dep=['b.txt']),
+                 Task('t3', None, task_dep=['t1']),
+                 Task('t4', None, task_dep=['t3'])]
+        tc = TaskControl(tasks)
+        self.assertEqual({'t1', 't3', 't4'},
+                         tc.affected_tasks(['./a.txt']))
+        self.assertEqual({'t2'},
+                         tc.affected_tasks([os.path.abspath('b.txt')]))
+        self.assertEqual(set(), tc.affected_tasks(['c.txt']))
+
+    def test_implicit_task_dep(self):
+        # t2 depends on target of t1
+        tasks = [Task('t1', None, file_dep=['a.txt'], targets=['b.txt']),
+                 Task('t2', None, file_dep=['b.txt'])]
+        tc = TaskControl(tasks)
+        self.assertEqual({'t1', 't2'}, tc.affected_tasks(['a.txt']))
+
+    def test_extra(self):
+        tasks = [Task('t1', None),
+                 Task('t2', None, task_dep=['t1'])]
+        tc = TaskControl(tasks)
+        self.assertEqual({'t1', 't2'}, tc.affected_tasks([], ['t1']))
+
+    def test_not_known(self):
+        tasks = [Task('t1', None, calc_dep=['t2']),
+                 Task('t2', None),
+                 Task('t3', None, loader=DelayedLoader(lambda: None)),
+                 Task('t4', None, task_dep=['t1'])]
+        tc = TaskControl(tasks)
+        self.assertEqual({'t1', 't3', 't4'}, tc.affected_tasks([]))
+
+
+class TestTaskControlTaskPriorities(unittest.TestCase):
+
+    def test_no_durations(self):
+        tc = TaskControl([Task('t1', ['echo'])])
+        tc.process(None)
+        self.assertIsNone(tc.task_priorities({}))
+
+    def test_longest_path(self):
+        # t1 -> t2 -> t4 and t3 -> t4
+        tasks = [Task('t1', ['echo']),
+                 Task('t2', ['echo'], task_dep=['t1']),
+                 Task('t3', ['echo']),
+                 Task('t4', ['echo'], task_dep=['t2', 't3'])]
+        tc = TaskControl(tasks)
+        tc.process(['t4'])
+        durations = {'t1': 1, 't2': 2, 't3': 5, 't4': 1}
+        self.assertEqual({'t1': 4, 't2': 3, 't3': 6, 't4': 1},
+                         tc.task_priorities(durations))
+
+    def test_not_known(self):
+        # tasks without duration use median, group tasks take no time
+        tasks = [Task('t1', ['echo']),
+                 Task('t2', ['echo']),
+                 Task('t3', ['echo'], setup=['t4']),
+                 Task('t4', ['echo']),
+                 Task('t5', None, task_dep=['t1', 't3'])]
+        tc = TaskControl(tasks)
+        tc.process(['t5', 't2'])
+        durations = {'t1': 1, 't2': 2, 't4': 10}
+        self.assertEqual({'t1': 1, 't2': 2, 't3': 2, 't4': 12, 't5': 0},
+                         tc.task_priorities(durations))
+
+    def test_not_selected(self):
+        tasks = [Task('t1', ['echo']),
+                 Task('t2', ['echo'], task_dep=['t1'])]
+        tc = TaskControl(tasks)
+        tc.process(['t1'])
+        self.assertEqual({'t1': 3}, tc.task_priorities({'t1': 3, 't2': 4}))
+
+
+class TestReadyQueue(unittest.TestCase):
+
+    def test_order(self):
+        nodes = [ExecNode(Task(name, None), None)
+                 for name in ('t1', 't2', 't3', 't4')]
+        ready = ReadyQueue({'t2': 5, 't3': 1, 't4': 5})
+        for node in nodes:
+            ready.append(node)
+        self.assertEqual(4, len(ready))
+        got = [ready.popleft().task.name for _ in range(4)]
+        self.assertEqual(['t2', 't4', 't3', 't1'], got)
+        self.assertFalse(ready)
+
+
 class TestExecNode(unittest.TestCase):
 
     def test_repr(self):
@@ -809,3 +910,23 @@ class TestTaskDispatcher_dispatcher_generator(unittest.TestCase):
         nt0 = gen.send(nt1)
         self.assertEqual(nt0.task.name, "t0")
         self.assertRaises(StopIteration, next, gen)
+
+    def test_priority(self):
+        tasks = [Task("t1", None, task_dep=["t2", "t3"]),
+                 Task("t2", None),
+                 Task("t3", None),
+                 Task("t4", None)]
+        control = TaskControl(tasks)
+        control.process(['t4', 't1'])
+        priority = {'t1': 1, 't2': 2, 't3': 3, 't4': 0}
+        gen = control.task_dispatcher(priority).generator
+        n3 = next(gen)
+        self.assertEqual('t3', n3.task.name)
+        n2 = next(gen)
+        self.assertEqual('t2', n2.task.name)
+        # lowest priority
+        self.assertEqual('t4', next(gen).task.name)
+        self.assertEqual("hold on", next(gen))
+        self.assertEqual("hold on", gen.send(n3))
+        self.assertEqual('t1', gen.send(n2).task.name)
+        self.assertRaises(StopIteration, next, gen)
@@ -1,20 +1,28 @@
 """Tests for doit.dependency — migrated from pytest to unittest."""
 import os
 import sys
+import mmap
+import hashlib
 import time
 import tempfile
 import shutil
+import threading
 from dbm import whichdb
 from sys import executable
 from unittest.mock import patch
 import unittest
-
-from doit.task import Task
-from doit.dependency import get_md5, get_file_md5
-from doit.dependency import DbmDB, JsonDB, SqliteDB, Dependency
-from doit.dependency import DatabaseException, UptodateCalculator
+from concurrent.futures import ThreadPoolExecutor
+
+from doit.task import Task, DelayedLoader
+from doit.dependency import get_md5, get_file_md5, get_file_hash
+from doit.dependency import hash_algorithms
+from doit.dependency import DbmDB, JsonDB, SqliteDB, JournalDB, Dependency
+from doit.dependency import MemoryDB
+from doit.dependency import DatabaseException, UptodateCalculator, FileLock
 from doit.dependency import FileChangedChecker, MD5Checker, TimestampChecker
-from doit.dependency import DependencyStatus
+from doit.dependency import StatMD5Checker, HashChecker
+from doit.dependency import DependencyStatus, FileStateCache
+from doit.dependency import JSONCodec, MarshalCodec, codec_encode
 from tests.support import get_abspath, backend_map, db_ext
 from tests.support import remove_all_db, DependencyFileMixin
 
@@ -57,6 +65,57 @@ class TestUtilFunctions(unittest.TestCase):
         expected_crlf = "cf7b48b2fec3b581b135f7c9a1f7ae04"
         self.assertIn(get_file_md5(filePath), {expected_lf, expected_crlf})
 
+    def test_file_hash(self):
+        filePath = os.path.join(TEST_PATH, "sample_md5.txt")
+        self.assertEqual(get_file_md5(filePath),
+                         get_file_hash(filePath, 'md5'))
+        with open(filePath, 'rb') as fp:
+            expected = hashlib.blake2b(fp.read()).hexdigest()
+        self.assertEqual(expected, get_file_hash(filePath, 'blake2b'))
+        self.assertEqual(expected, get_file_hash(filePath, 'blake2b', 3))
+
+    def test_file_hash_mmap(self):
+        filePath = os.path.join(TEST_PATH, "sample_md5.txt")
+        expected = get_file_md5(filePath)
+        with patch('doit.dependency.MMAP_THRESHOLD', 1):
+            with patch('mmap.mmap', wraps=mmap.mmap) as mmap_mock:
+                self.assertEqual(expected, get_file_md5(filePath))
+        mmap_mock.assert_called_once()
+
+    def test_file_hash_mmap_fail(self):
+        filePath = os.path.join(TEST_PATH, "sample_md5.txt")
+        expected = get_file_md5(filePath)
+        with patch('doit.dependency.MMAP_THRESHOLD', 1):
+            with patch('mmap.mmap', side_effect=OSError('no mmap')):
+                self.assertEqual(expected, get_file_md5(filePath))
+
+    def test_file_hash_special_file(self):
+        filePath = '/proc/self/status'  # reports size zero
+        if not os.path.exists(filePath):
+            self.skipTest('no procfs')
+        self.assertEqual(32, len(get_file_md5(filePath)))
+
+    def test_hash_algorithms(self):
+        algorithms = hash_algorithms()
+        self.assertIn('sha256', algorithms)
+        self.assertIn('blake2b', algorithms)
+        self.assertNotIn('shake_128', algorithms)
+
+    def test_hash_algorithms_unsupported(self):
+        # OpenSSL might list algorithms it can not instantiate
+        new = hashlib.new
+
+        def new_no_md4(name, *args, **kwargs):
+            if name == 'md4':
+                raise ValueError('unsupported hash type md4')
+            return new(name, *args, **kwargs)
+        available = hashlib.algorithms_available | {'md4'}
+        with patch('hashlib.algorithms_available', available), \
+             patch('hashlib.new', new_no_md4):
+            algorithms = hash_algorithms()
+        self.assertIn('sha256', algorithms)
+        self.assertNotIn('md4', algorithms)
+
     def test_sqlite_import(self):
         """Checks that SQLite module is not imported until the SQLite class is instantiated"""
         from doit import dependency
@@ -70,6 +129,7 @@ class TestUtilFunctions(unittest.TestCase):
 class DependencyTestBase:
     """Mixin providing self.dep_manager for the backend given by backend_name."""
     backend_name = None
+    file_table = False
 
     def setUp(self):
         super().setUp()
@@ -79,9 +139,11 @@ class DependencyTestBase:
         try:
             if self.backend_name.startswith('dbm.'):
                 self.dep_manager = Dependency(
-                    dep_class, filename, module_name=self.backend_name)
+                    dep_class, filename, module_name=self.backend_name,
+                    file_table=self.file_table)
             else:
-                self.dep_manager = Dependency(dep_class, filename)
+                self.dep_manager = Dependency(
+                    dep_class, filename, file_table=self.file_table)
         except ImportError:
             self.skipTest(f'"{self.backend_name}" not available.')
         if self.backend_name == 'dbm':
@@ -233,6 +295,759 @@ class TestDependencyDbDbmNdbm(DependencyTestBase, _DependencyDbTests, unittest.T
 class TestDependencyDbDbmDumb(DependencyTestBase, _DependencyDbTests, unittest.TestCase):
     backend_name = 'dbm.dumb'
 
+class TestDependencyDbJournal(DependencyTestBase, _DependencyDbTests, unittest.TestCase):
+    backend_name = 'journal'
+
+
+class TestSqliteDB(unittest.TestCase):
+
+    def setUp(self):
+        self._tmpdir = tempfile.mkdtemp(prefix='doit-test-dep-')
+        self.name = os.path.join(self._tmpdir, 'testdb')
+        db = SqliteDB(self.name, JSONCodec())
+        db.set('t1', 'dep_1', 'x')
+        db.set('t2', 'dep_1', 'y')
+        db.dump()
+
+    def tearDown(self):
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+    def test_prefetch(self):
+        db = SqliteDB(self.name, JSONCodec())
+        db.prefetch(['t1', 't2', 't3'])
+        db._conn.close()  # no more queries
+        self.assertEqual('x', db.get('t1', 'dep_1'))
+        self.assertEqual('y', db.get('t2', 'dep_1'))
+        self.assertIsNone(db.get('t3', 'dep_1'))
+        self.assertTrue(db.in_('t1'))
+        self.assertFalse(db.in_('t3'))
+
+    def test_prefetch_chunks(self):
+        db = SqliteDB(self.name, JSONCodec())
+        db.PREFETCH_CHUNK = 1
+        db.prefetch(['t3', 't1', 't2'])
+        self.assertEqual({'t1', 't2'}, set(db._cache))
+        db.set('t3', 'dep_1', 'z')
+        db.remove('t1')
+        self.assertFalse(db.in_('t1'))
+        db.dump()
+        db2 = SqliteDB(self.name, JSONCodec())
+        self.assertEqual('z', db2.get('t3', 'dep_1'))
+        self.assertFalse(db2.in_('t1'))
+        db2.dump()
+
+    def test_pragmas(self):
+        db = SqliteDB(self.name, JSONCodec())
+        mode = db._conn.execute('PRAGMA journal_mode').fetchone()
+        self.assertEqual('wal', mode['journal_mode'])
+        db.dump()
+        db = SqliteDB(self.name, JSONCodec(), pragmas={'journal_mode': 'delete'})
+        mode = db._conn.execute('PRAGMA journal_mode').fetchone()
+        self.assertEqual('delete', mode['journal_mode'])
+        db.dump()
+
+    def test_invalid_pragma(self):
+        self.assertRaises(DatabaseException, SqliteDB, self.name, JSONCodec(),
+                          pragmas={'journal_mode': 'wal; drop table doit'})
+
+
+class TestJournalDB(unittest.TestCase):
+
+    def setUp(self):
+        self._tmpdir = tempfile.mkdtemp(prefix='doit-test-dep-')
+        self.name = os.path.join(self._tmpdir, 'testdb')
+
+    def tearDown(self):
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+    def test_append_only_dirty(self):
+        db = JournalDB(self.name, JSONCodec())
+        db.set('t1', 'dep_1', 'x')
+        db.set('t2', 'dep_1', 'y')
+        db.dump()
+        self.assertEqual(2, db.num_records)
+        size = os.path.getsize(self.name)
+
+        db = JournalDB(self.name, JSONCodec())
+        db.set('t1', 'dep_1', 'x2')
+        db.dump()
+        with open(self.name, 'rb') as fp:
+            content = fp.read()
+        # only t1 was appended
+        record = db._record(JournalDB.SET, 't1', db._raw['t1'])
+        self.assertEqual(size + len(record), len(content))
+        self.assertTrue(content.endswith(record))
+
+        db = JournalDB(self.name, JSONCodec())
+        self.assertEqual(3, db.num_records)
+        self.assertEqual('x2', db.get('t1', 'dep_1'))
+        self.assertEqual('y', db.get('t2', 'dep_1'))
+
+    def test_no_change_no_write(self):
+        db = JournalDB(self.name, JSONCodec())
+        db.set('t1', 'dep_1', 'x')
+        db.dump()
+        mtime = os.stat(self.name).st_mtime_ns
+        db = JournalDB(self.name, JSONCodec())
+        self.assertEqual('x', db.get('t1', 'dep_1'))
+        db.dump()
+        self.assertEqual(mtime, os.stat(self.name).st_mtime_ns)
+
+    def test_set_keeps_saved_values(self):
+        db = JournalDB(self.name, JSONCodec())
+        db.set('t1', 'dep_1', 'x')
+        db.dump()
+        db = JournalDB(self.name, JSONCodec())
+        db.set('t1', 'dep_2', 'y')
+        db.dump()
+        db = JournalDB(self.name, JSONCodec())
+        self.assertEqual('x', db.get('t1', 'dep_1'))
+        self.assertEqual('y', db.get('t1', 'dep_2'))
+
+    def test_tombstone(self):
+        db = JournalDB(self.name, JSONCodec())
+        db.set('t1', 'dep_1', 'x')
+        db.set('t2', 'dep_1', 'y')
+        db.dump()
+        db = JournalDB(self.name, JSONCodec())
+        db.remove('t1')
+        db.remove('not_there')
+        db.dump()
+        self.assertEqual(3, db.num_records)
+        db = JournalDB(self.name, JSONCodec())
+        self.assertFalse(db.in_('t1'))
+        self.assertTrue(db.in_('t2'))
+
+    def test_compact(self):
+        db = JournalDB(self.name, JSONCodec())
+        db.COMPACT_MIN_RECORDS = 4
+        db.set('t1', 'dep_1', 'x')
+        db.set('t2', 'dep_1', 'y')
+        db.dump()
+        db.set('t1', 'dep_1', 'x2')
+        db.dump()
+        self.assertEqual(3, db.num_records)
+        # 2 dead records out of 4
+        db.set('t1', 'dep_1', 'x3')
+        db.dump()
+        self.assertEqual(4, db.num_records)
+        # 3 out of 5, more than 50%, compact
+        db.set('t1', 'dep_1', 'x4')
+        db.dump()
+        self.assertEqual(2, db.num_records)
+        db = JournalDB(self.name, JSONCodec())
+        self.assertEqual(2, db.num_records)
+        self.assertEqual('x4', db.get('t1', 'dep_1'))
+        self.assertEqual('y', db.get('t2', 'dep_1'))
+
+    def test_truncated_record(self):
+        db = JournalDB(self.name, JSONCodec())
+        db.set('t1', 'dep_1', 'x')
+        db.set('t2', 'dep_1', 'y')
+        db.dump()
+        with open(self.name, 'rb+') as fp:
+            fp.truncate(os.path.getsize(self.name) - 3)
+        db = JournalDB(self.name, JSONCodec())
+        self.assertEqual(1, db.num_records)
+        self.assertEqual(1, len(db._raw))
+        db.dump()  # incomplete record is removed
+        db = JournalDB(self.name, JSONCodec())
+        self.assertEqual(1, db.num_records)
+
+    def test_remove_all(self):
+        db = JournalDB(self.name, JSONCodec())
+        db.set('t1', 'dep_1', 'x')
+        db.dump()
+        db = JournalDB(self.name, JSONCodec())
+        db.remove_all()
+        db.set('t2', 'dep_1', 'y')
+        db.dump()
+        db = JournalDB(self.name, JSONCodec())
+        self.assertEqual(1, db.num_records)
+        self.assertFalse(db.in_('t1'))
+        self.assertEqual('y', db.get('t2', 'dep_1'))
+
+
+class TestDependencyPrefetch(DependencyFileMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self._tmpdir = tempfile.mkdtemp(prefix='doit-test-dep-')
+        self.name = os.path.join(self._tmpdir, 'testdb')
+
+    def tearDown(self):
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+        super().tearDown()
+
+    def test_prefetch(self):
+        dep_manager = Dependency(SqliteDB, self.name, file_table=True)
+        t1 = Task("t1", None, [self.dependency1])
+        t2 = Task("t2", None, [self.dependency1])
+        dep_manager.prefetch([t1, t2])
+        self.assertEqual({'t1', 't2', '=file:' + self.dependency1},
+                         dep_manager.backend._prefetched)
+        dep_manager.close()
+
+    def test_not_supported(self):
+        dep_manager = Dependency(JsonDB, self.name)
+        dep_manager.prefetch([Task("t1", None, [self.dependency1])])
+        dep_manager.close()
+
+
+class _CheckpointTests:
+    """data saved by checkpoint is available without closing the DB"""
+
+    def _open_copy(self):
+        """open a copy of DB files as they are now (simulate a crash)"""
+        copy_dir = os.path.join(self._dep_tmpdir, 'copy')
+        os.mkdir(copy_dir)
+        base = os.path.basename(self.dep_manager.name)
+        for fname in os.listdir(self._dep_tmpdir):
+            if fname.startswith(base):
+                shutil.copy(os.path.join(self._dep_tmpdir, fname), copy_dir)
+        module_name = None
+        if self.backend_name.startswith('dbm.'):
+            module_name = self.backend_name
+        return self.dep_manager.db_class(
+            os.path.join(copy_dir, base), JSONCodec(), module_name=module_name)
+
+    def test_checkpoint(self):
+        self.dep_manager._set("taskId_X", "dependency_A", "da_md5")
+        self.dep_manager._set("taskId_Y", "dependency_A", "db_md5")
+        self.dep_manager.checkpoint()
+        self.dep_manager.remove("taskId_Y")
+        self.dep_manager._set("taskId_Z", "dependency_A", "dz_md5")
+        self.assertTrue(self.dep_manager.checkpoint())
+        # DB is still usable
+        self.dep_manager._set("taskId_X", "dependency_B", "x")
+        self.assertEqual("da_md5",
+                         self.dep_manager._get("taskId_X", "dependency_A"))
+
+        copy = self._open_copy()
+        try:
+            self.assertEqual("da_md5", copy.get("taskId_X", "dependency_A"))
+            self.assertEqual("dz_md5", copy.get("taskId_Z", "dependency_A"))
+            self.assertFalse(copy.in_("taskId_Y"))
+        finally:
+            copy.dump()
+
+    def test_background(self):
+        self.dep_manager._set("taskId_X", "dependency_A", "da_md5")
+        self.dep_manager.checkpoint(background=True)
+        self.dep_manager._wait_checkpoint()
+        copy = self._open_copy()
+        try:
+            self.assertEqual("da_md5", copy.get("taskId_X", "dependency_A"))
+        finally:
+            copy.dump()
+
+
+class TestCheckpointJson(DependencyTestBase, _CheckpointTests, unittest.TestCase):
+    backend_name = 'json'
+
+    def test_encode_on_write(self):
+        # encoding is done by the returned function, on a snapshot
+        backend = self.dep_manager.backend
+        backend.set("taskId_X", "dependency_A", "da_md5")
+        with patch('doit.dependency.codec_encode',
+                   wraps=codec_encode) as encode_mock:
+            write = backend.checkpoint()
+            encode_mock.assert_not_called()
+            backend.set("taskId_X", "dependency_A", "changed")
+            backend.set("taskId_Y", "dependency_A", "db_md5")
+            write()
+        self.assertEqual(1, encode_mock.call_count)
+        copy = self._open_copy()
+        try:
+            self.assertEqual("da_md5", copy.get("taskId_X", "dependency_A"))
+            self.assertFalse(copy.in_("taskId_Y"))
+        finally:
+            copy.dump()
+
+class TestCheckpointSqlite(DependencyTestBase, _CheckpointTests, unittest.TestCase):
+    backend_name = 'sqlite3'
+
+class TestCheckpointDbmGnu(DependencyTestBase, _CheckpointTests, unittest.TestCase):
+    backend_name = 'dbm.gnu'
+
+class TestCheckpointDbmNdbm(DependencyTestBase, _CheckpointTests, unittest.TestCase):
+    backend_name = 'dbm.ndbm'
+
+class TestCheckpointDbmDumb(DependencyTestBase, _CheckpointTests, unittest.TestCase):
+    backend_name = 'dbm.dumb'
+
+class TestCheckpointJournal(DependencyTestBase, _CheckpointTests, unittest.TestCase):
+    backend_name = 'journal'
+
+
+class _ConcurrentTests:
+    """several DB instances (processes) using the same file"""
+
+    def _open(self):
+        kwargs = {'concurrent': True}
+        if self.backend_name.startswith('dbm.'):
+            kwargs['module_name'] = self.backend_name
+        db_class = backend_map[self.backend_name]
+        try:
+            return db_class(self.name, JSONCodec(), **kwargs)
+        except ImportError:
+            self.skipTest(f'"{self.backend_name}" not available.')
+
+    def setUp(self):
+        super().setUp()
+        self._tmpdir = tempfile.mkdtemp(prefix='doit-test-dep-')
+        self.name = os.path.join(self._tmpdir, 'testdb')
+
+    def tearDown(self):
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+        super().tearDown()
+
+    def test_merge(self):
+        db = self._open()
+        db.set('t1', 'a', 'v1')
+        db.set('t2', 'a', 'v2')
+        db.dump()
+
+        db_a = self._open()
+        db_b = self._open()
+        db_a.set('t1', 'a', 'new1')
+        db_a.set('t3', 'a', 'v3')
+        db_b.set('t4', 'a', 'v4')
+        db_b.remove('t2')
+        db_a.dump()
+        db_b.dump()
+
+        db = self._open()
+        self.assertEqual('new1', db.get('t1', 'a'))
+        self.assertFalse(db.in_('t2'))
+        self.assertEqual('v3', db.get('t3', 'a'))
+        self.assertEqual('v4', db.get('t4', 'a'))
+        db.dump()
+
+    def test_same_task_last_writer_wins(self):
+        db_a = self._open()
+        db_b = self._open()
+        db_a.set('t1', 'a', 'va')
+        db_a.set('t1', 'b', 'vb')
+        db_b.set('t1', 'a', 'xa')
+        db_a.dump()
+        db_b.dump()
+        db = self._open()
+        # the whole task data is replaced, not merged by key
+        self.assertEqual('xa', db.get('t1', 'a'))
+        self.assertIsNone(db.get('t1', 'b'))
+        db.dump()
+
+    def test_checkpoint(self):
+        db_a = self._open()
+        db_b = self._open()
+        db_a.set('t1', 'a', 'va')
+        db_b.set('t2', 'a', 'vb')
+        db_b.checkpoint()()
+        db_a.checkpoint()()
+        self.assertIsNone(db_a.checkpoint())
+        db = self._open()
+        self.assertEqual('va', db.get('t1', 'a'))
+        self.assertEqual('vb', db.get('t2', 'a'))
+        db.dump()
+        db_a.dump()
+        db_b.dump()
+
+    def test_remove_all(self):
+        db = self._open()
+        db.set('t1', 'a', 'v1')
+        db.dump()
+        db = self._open()
+        db.remove_all()
+        db.set('t2', 'a', 'v2')
+        db.dump()
+        db = self._open()
+        self.assertFalse(db.in_('t1'))
+        self.assertEqual('v2', db.get('t2', 'a'))
+        db.dump()
+
+
+class TestConcurrentJson(_ConcurrentTests, unittest.TestCase):
+    backend_name = 'json'
+
+class TestConcurrentSqlite(_ConcurrentTests, unittest.TestCase):
+    backend_name = 'sqlite3'
+
+class TestConcurrentDbmGnu(_ConcurrentTests, unittest.TestCase):
+    backend_name = 'dbm.gnu'
+
+class TestConcurrentDbmNdbm(_ConcurrentTests, unittest.TestCase):
+    backend_name = 'dbm.ndbm'
+
+class TestConcurrentDbmDumb(_ConcurrentTests, unittest.TestCase):
+    backend_name = 'dbm.dumb'
+
+class TestConcurrentJournal(_ConcurrentTests, unittest.TestCase):
+    backend_name = 'journal'
+
+    def test_compact_keeps_other_process_tasks(self):
+        db_a = self._open()
+        db_b = self._open()
+        db_b.set('t0', 'a', 'v0')
+        db_b.dump()
+        db_a.COMPACT_MIN_RECORDS = 2
+        for value in ('w', 'x', 'y', 'z'):
+            db_a.set('t1', 'a', value)
+            db_a.dump()
+        db = self._open()
+        self.assertEqual(2, db.num_records)  # compacted
+        self.assertEqual('v0', db.get('t0', 'a'))
+        self.assertEqual('z', db.get('t1', 'a'))
+        db.dump()
+
+
+class _ReadOnlyTests:
+    """backend opened with read_only=True never writes the DB file"""
+
+    def _open(self, **kwargs):
+        if self.backend_name.startswith('dbm.'):
+            kwargs['module_name'] = self.backend_name
+        db_class = backend_map[self.backend_name]
+        try:
+            return db_class(self.name, JSONCodec(), **kwargs)
+        except ImportError:
+            self.skipTest(f'"{self.backend_name}" not available.')
+
+    def _files(self):
+        """@return dict: name -> content of DB files"""
+        files = {}
+        for fname in sorted(os.listdir(self._tmpdir)):
+            if fname.endswith(('-shm', '-wal')):
+                continue  # sqlite WAL index, also used by readers
+            with open(os.path.join(self._tmpdir, fname), 'rb') as fp:
+                files[fname] = fp.read()
+        return files
+
+    def setUp(self):
+        super().setUp()
+        self._tmpdir = tempfile.mkdtemp(prefix='doit-test-dep-')
+        self.name = os.path.join(self._tmpdir, 'testdb')
+
+    def tearDown(self):
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+        super().tearDown()
+
+    def test_read(self):
+        db = self._open()
+        db.set('t1', 'a', 'v1')
+        db.set('t2', 'a', 'v2')
+        db.dump()
+        before = self._files()
+
+        db = self._open(read_only=True)
+        self.assertTrue(db.read_only)
+        self.assertEqual('v1', db.get('t1', 'a'))
+        self.assertFalse(db.in_('t3'))
+        # modifications are kept in memory only
+        db.set('t1', 'a', 'x')
+        db.remove('t2')
+        self.assertEqual('x', db.get('t1', 'a'))
+        self.assertFalse(db.in_('t2'))
+        self.assertIsNone(db.checkpoint())
+        db.dump()
+        self.assertEqual(before, self._files())
+
+    def test_remove_all(self):
+        db = self._open()
+        db.set('t1', 'a', 'v1')
+        db.dump()
+        before = self._files()
+        db = self._open(read_only=True)
+        db.remove_all()
+        self.assertFalse(db.in_('t1'))
+        db.dump()
+        self.assertEqual(before, self._files())
+
+    def test_not_created(self):
+        db = self._open(read_only=True)
+        self.assertFalse(db.in_('t1'))
+        self.assertIsNone(db.get('t1', 'a'))
+        db.dump()
+        self.assertEqual({}, self._files())
+
+    def test_writer_open(self):
+        writer = self._open()
+        writer.set('t1', 'a', 'v1')
+        if hasattr(writer, 'checkpoint'):
+            write = writer.checkpoint()
+            if write:
+                write()
+        db = self._open(read_only=True)
+        self.assertEqual('v1', db.get('t1', 'a'))
+        db.dump()
+        writer.dump()
+
+
+class TestReadOnlyJson(_ReadOnlyTests, unittest.TestCase):
+    backend_name = 'json'
+
+class TestReadOnlySqlite(_ReadOnlyTests, unittest.TestCase):
+    backend_name = 'sqlite3'
+
+class TestReadOnlyDbmGnu(_ReadOnlyTests, unittest.TestCase):
+    backend_name = 'dbm.gnu'
+
+class TestReadOnlyDbmNdbm(_ReadOnlyTests, unittest.TestCase):
+    backend_name = 'dbm.ndbm'
+
+class TestReadOnlyDbmDumb(_ReadOnlyTests, unittest.TestCase):
+    backend_name = 'dbm.dumb'
+
+class TestReadOnlyJournal(_ReadOnlyTests, unittest.TestCase):
+    backend_name = 'journal'
+
+
+class TestDependencyReadOnly(unittest.TestCase):
+
+    def setUp(self):
+        self._tmpdir = tempfile.mkdtemp(prefix='doit-test-dep-')
+        self.name = os.path.join(self._tmpdir, 'testdb')
+
+    def tearDown(self):
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+    def test_backend_read_only(self):
+        dep_manager = Dependency(JsonDB, self.name, read_only=True,
+                                 checkpoint_tasks=1)
+        self.assertTrue(dep_manager.backend.read_only)
+        dep_manager.save_success(Task("t1", None))
+        self.assertFalse(dep_manager.checkpoint())
+        dep_manager.close()
+        self.assertFalse(os.path.exists(self.name))
+
+    def test_backend_not_supported(self):
+        class MyDB(JsonDB):
+            def __init__(self, name, codec, *, module_name=None):
+                super().__init__(name, codec)
+        dep_manager = Dependency(MyDB, self.name, read_only=True)
+        self.assertFalse(dep_manager.backend.read_only)
+        dep_manager._set("t1", "x", 1)
+        dep_manager.close()
+        self.assertFalse(os.path.exists(self.name))
+
+
+class TestFileLock(unittest.TestCase):
+
+    def test_exclusive(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'db.lock')
+            events = []
+            lock_b = FileLock(path)
+            def acquire_b():
+                with lock_b:
+                    events.append('b')
+            with FileLock(path):
+                thread = threading.Thread(target=acquire_b)
+                thread.start()
+                time.sleep(0.1)
+                events.append('a')
+            thread.join()
+            self.assertEqual(['a', 'b'], events)
+
+
+class TestDependencyCheckpoint(DependencyFileMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self._tmpdir = tempfile.mkdtemp(prefix='doit-test-dep-')
+        self.name = os.path.join(self._tmpdir, 'testdb')
+
+    def tearDown(self):
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+        super().tearDown()
+
+    def _save(self, dep_manager, num):
+        for idx in range(num):
+            dep_manager.save_success(Task("t%d" % idx, None))
+
+    def test_every_n_tasks(self):
+        dep_manager = Dependency(JsonDB, self.name, checkpoint_tasks=2)
+        real_checkpoint = dep_manager.checkpoint
+        def sync_checkpoint(background):
+            self.assertTrue(background)
+            return real_checkpoint()
+        with patch.object(dep_manager, 'checkpoint',
+                          side_effect=sync_checkpoint) as checkpoint:
+            self._save(dep_manager, 5)
+        self.assertEqual(2, checkpoint.call_count)
+        self.assertEqual(1, dep_manager._saved_since_checkpoint)
+        with open(self.name, 'rb') as db_file:
+            saved = JSONCodec().decode(db_file.read().decode('utf-8'))
+        self.assertEqual({'t0', 't1', 't2', 't3'}, set(saved))
+        dep_manager.close()
+
+    def test_interval(self):
+        dep_manager = Dependency(JsonDB, self.name, checkpoint_interval=60)
+        self._save(dep_manager, 3)
+        self.assertEqual(3, dep_manager._saved_since_checkpoint)
+        dep_manager._last_checkpoint -= 61
+        self._save(dep_manager, 1)
+        self.assertEqual(0, dep_manager._saved_since_checkpoint)
+        dep_manager.close()
+
+    def test_disabled(self):
+        dep_manager = Dependency(JsonDB, self.name)
+        self._save(dep_manager, 3)
+        self.assertEqual(0, dep_manager._saved_since_checkpoint)
+        self.assertFalse(os.path.exists(self.name))
+        dep_manager.close()
+
+    def test_skip_while_writing(self):
+        dep_manager = Dependency(JsonDB, self.name)
+        dep_manager._set("t1", "x", 1)
+        dep_manager.checkpoint(background=True)
+        running = dep_manager._checkpoint_future
+        with patch.object(running, 'done', return_value=False):
+            self.assertFalse(dep_manager.checkpoint(background=True))
+        self.assertIs(running, dep_manager._checkpoint_future)
+        dep_manager.close()
+
+    def test_close_raises_write_error(self):
+        dep_manager = Dependency(JsonDB, self.name)
+        dep_manager._set("t1", "x", 1)
+        with patch.object(dep_manager.backend, '_write',
+                          side_effect=[OSError('disk full'), None]):
+            dep_manager.checkpoint(background=True)
+            self.assertRaises(OSError, dep_manager.close)
+        # DB is still saved on close
+        self.assertTrue(dep_manager._closed)
+
+    def test_not_supported(self):
+        dep_manager = Dependency(JsonDB, self.name)
+        with patch.object(dep_manager, 'backend', object()):
+            self.assertFalse(dep_manager.checkpoint())
+
+
+@unittest.skipUnless(os.environ.get('DOIT_BENCHMARK'),
+                     'set DOIT_BENCHMARK=1 to run benchmarks')
+class TestFileHashBenchmark(unittest.TestCase):
+    """Throughput of file hashing using read/readinto/mmap"""
+    SIZES = (('1MB', 2 ** 20), ('100MB', 100 * 2 ** 20), ('1GB', 2 ** 30))
+
+    @staticmethod
+    def _read_md5(path):
+        """hash allocating a new bytes object for each block"""
+        md5 = hashlib.md5()
+        with open(path, 'rb') as file_data:
+            for data in iter(lambda: file_data.read(128 * md5.block_size),
+                             b''):
+                md5.update(data)
+        return md5.hexdigest()
+
+    def _throughput(self, func, path, size):
+        start = time.perf_counter()
+        digest = func(path)
+        return digest, size / 2 ** 20 / (time.perf_counter() - start)
+
+    def test_throughput(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'data')
+            for label, size in self.SIZES:
+                with open(path, 'wb') as fp:
+                    chunk = os.urandom(2 ** 20)
+                    for _ in range(size // len(chunk)):
+                        fp.write(chunk)
+                expected, read_mbs = self._throughput(
+                    self._read_md5, path, size)
+                with patch('doit.dependency.MMAP_THRESHOLD', size + 1):
+                    got, readinto_mbs = self._throughput(
+                        get_file_md5, path, size)
+                    self.assertEqual(expected, got)
+                with patch('doit.dependency.MMAP_THRESHOLD', 0):
+                    got, mmap_mbs = self._throughput(get_file_md5, path, size)
+                    self.assertEqual(expected, got)
+                print('\n{:>6} read: {:7.1f} MB/s  readinto: {:7.1f} MB/s'
+                      '  mmap: {:7.1f} MB/s'.format(
+                          label, read_mbs, readinto_mbs, mmap_mbs))
+
+
+# ---------------------------------------------------------------------------
+# TestCodec
+# ---------------------------------------------------------------------------
+
+class TestMarshalCodec(unittest.TestCase):
+
+    def test_encode_decode(self):
+        codec = MarshalCodec()
+        data = {'deps:': ('a', 'b'), 'dep_1': [1.5, 10, 'md5'],
+                '_values_:': {'x': None, 'y': True}}
+        encoded = codec.encode(data)
+        self.assertIsInstance(encoded, bytes)
+        self.assertTrue(encoded.startswith(MarshalCodec.HEADER))
+        self.assertEqual(data, codec.decode(encoded))
+
+    def test_decode_json(self):
+        codec = MarshalCodec()
+        encoded = JSONCodec().encode({'dep_1': [1.5, 10, 'md5']})
+        self.assertEqual({'dep_1': [1.5, 10, 'md5']}, codec.decode(encoded))
+        self.assertEqual({'dep_1': [1.5, 10, 'md5']},
+                         codec.decode(encoded.encode('utf-8')))
+
+    def test_decode_corrupted(self):
+        codec = MarshalCodec()
+        self.assertRaises(ValueError, codec.decode, MarshalCodec.HEADER + b'x')
+        self.assertRaises(ValueError, codec.decode, b'{"x": y}')
+
+
+class _CodecTests:
+    """Tests for backends using a binary codec"""
+
+    def _reopen(self, codec_cls):
+        self.dep_manager.close()
+        module_name = None
+        if self.backend_name.startswith('dbm.'):
+            module_name = self.backend_name
+        self.dep_manager = Dependency(
+            self.dep_manager.db_class, self.dep_manager.name,
+            codec_cls=codec_cls, module_name=module_name)
+
+    def test_marshal(self):
+        self._reopen(MarshalCodec)
+        self.dep_manager._set("taskId_X", "dependency_A", (1.5, 10, 'md5'))
+        self._reopen(MarshalCodec)
+        self.assertEqual((1.5, 10, 'md5'),
+                         self.dep_manager._get("taskId_X", "dependency_A"))
+
+    def test_convert_from_json(self):
+        self.dep_manager._set("taskId_X", "dependency_A", "da_md5")
+        self.dep_manager._set("taskId_Y", "dependency_A", "db_md5")
+        self._reopen(MarshalCodec)
+        self.assertEqual("da_md5",
+                         self.dep_manager._get("taskId_X", "dependency_A"))
+        self.assertEqual("db_md5",
+                         self.dep_manager._get("taskId_Y", "dependency_A"))
+        self.dep_manager._set("taskId_Y", "dependency_B", "x")
+        self._reopen(MarshalCodec)
+        self.assertEqual("da_md5",
+                         self.dep_manager._get("taskId_X", "dependency_A"))
+        self.assertEqual("db_md5",
+                         self.dep_manager._get("taskId_Y", "dependency_A"))
+        self.assertEqual("x", self.dep_manager._get("taskId_Y", "dependency_B"))
+
+
+class TestCodecJson(DependencyTestBase, _CodecTests, unittest.TestCase):
+    backend_name = 'json'
+
+class TestCodecSqlite(DependencyTestBase, _CodecTests, unittest.TestCase):
+    backend_name = 'sqlite3'
+
+class TestCodecDbmGnu(DependencyTestBase, _CodecTests, unittest.TestCase):
+    backend_name = 'dbm.gnu'
+
+class TestCodecDbmNdbm(DependencyTestBase, _CodecTests, unittest.TestCase):
+    backend_name = 'dbm.ndbm'
+
+class TestCodecDbmDumb(DependencyTestBase, _CodecTests, unittest.TestCase):
+    backend_name = 'dbm.dumb'
+
+class TestCodecJournal(DependencyTestBase, _CodecTests, unittest.TestCase):
+    backend_name = 'journal'
+
 
 # ---------------------------------------------------------------------------
 # TestSaveSuccess
@@ -320,6 +1135,60 @@ class _SaveSuccessTests:
         self.dep_manager.save_success(t1)
         self.assertEqual({'x': 5, 'y': 10}, self.dep_manager._get("t1", "_values_:"))
 
+    def test_save_duration(self):
+        t1 = Task('t1', None)
+        t2 = Task('t2', None)
+        t1.duration = 1.5
+        self.dep_manager.save_success(t1)
+        self.dep_manager.save_success(t2)
+        self.assertEqual({'t1': 1.5},
+                         self.dep_manager.get_durations(['t1', 't2', 't3']))
+        # not executed (restored from cache), keep previous duration
+        t1.duration = None
+        self.dep_manager.save_success(t1)
+        self.assertEqual(1.5, self.dep_manager._get('t1', 'duration:'))
+
+    def _write_target(self, content, mtime_ns):
+        target = os.path.join(self._dep_tmpdir, 'target')
+        with open(target, 'w') as fp:
+            fp.write(content)
+        os.utime(target, ns=(mtime_ns, mtime_ns))
+        return target
+
+    def test_restat_same_content(self):
+        old_mtime = 1600000000 * 10**9
+        target = self._write_target('content', old_mtime)
+        t1 = Task('t1', None, targets=[target], restat=True)
+        self.dep_manager.save_success(t1)
+        # re-generated with same content
+        self._write_target('content', old_mtime + 10**9)
+        self.dep_manager.save_success(t1)
+        self.assertEqual(old_mtime, os.stat(target).st_mtime_ns)
+        saved = self.dep_manager._get('t1', 'restat:')[target]
+        self.assertEqual([old_mtime, 7, get_md5('content')], list(saved))
+
+    def test_restat_modified_content(self):
+        old_mtime = 1600000000 * 10**9
+        target = self._write_target('content', old_mtime)
+        t1 = Task('t1', None, targets=[target], restat=True)
+        self.dep_manager.save_success(t1)
+        self._write_target('modified', old_mtime + 10**9)
+        self.dep_manager.save_success(t1)
+        self.assertEqual(old_mtime + 10**9, os.stat(target).st_mtime_ns)
+        saved = self.dep_manager._get('t1', 'restat:')[target]
+        self.assertEqual(old_mtime + 10**9, saved[0])
+
+    def test_restat_disabled(self):
+        old_mtime = 1600000000 * 10**9
+        target = self._write_target('content', old_mtime)
+        t1 = Task('t1', None, targets=[target], restat=True)
+        self.dep_manager.save_success(t1)
+        t1.restat = False
+        self._write_target('content', old_mtime + 10**9)
+        self.dep_manager.save_success(t1)
+        self.assertEqual(old_mtime + 10**9, os.stat(target).st_mtime_ns)
+        self.assertIsNone(self.dep_manager._get('t1', 'restat:'))
+
 
 class TestSaveSuccessJson(DependencyTestBase, _SaveSuccessTests, unittest.TestCase):
     backend_name = 'json'
@@ -336,6 +1205,9 @@ class TestSaveSuccessDbmNdbm(DependencyTestBase, _SaveSuccessTests, unittest.Tes
 class TestSaveSuccessDbmDumb(DependencyTestBase, _SaveSuccessTests, unittest.TestCase):
     backend_name = 'dbm.dumb'
 
+class TestSaveSuccessJournal(DependencyTestBase, _SaveSuccessTests, unittest.TestCase):
+    backend_name = 'journal'
+
 
 # ---------------------------------------------------------------------------
 # TestGetValue
@@ -390,6 +1262,9 @@ class TestGetValueDbmNdbm(DependencyTestBase, _GetValueTests, unittest.TestCase)
 class TestGetValueDbmDumb(DependencyTestBase, _GetValueTests, unittest.TestCase):
     backend_name = 'dbm.dumb'
 
+class TestGetValueJournal(DependencyTestBase, _GetValueTests, unittest.TestCase):
+    backend_name = 'journal'
+
 
 # ---------------------------------------------------------------------------
 # TestRemoveSuccess
@@ -405,6 +1280,14 @@ class _RemoveSuccessTests:
         self.dep_manager.remove_success(t1)
         self.assertIsNone(self.dep_manager._get(t1.name, "result:"))
 
+    def test_was_executed(self):
+        t1 = Task('t_name', None)
+        self.assertFalse(self.dep_manager.was_executed(t1.name))
+        self.dep_manager.save_success(t1)
+        self.assertTrue(self.dep_manager.was_executed(t1.name))
+        self.dep_manager.remove_success(t1)
+        self.assertFalse(self.dep_manager.was_executed(t1.name))
+
 
 class TestRemoveSuccessJson(DependencyTestBase, _RemoveSuccessTests, unittest.TestCase):
     backend_name = 'json'
@@ -421,6 +1304,9 @@ class TestRemoveSuccessDbmNdbm(DependencyTestBase, _RemoveSuccessTests, unittest
 class TestRemoveSuccessDbmDumb(DependencyTestBase, _RemoveSuccessTests, unittest.TestCase):
     backend_name = 'dbm.dumb'
 
+class TestRemoveSuccessJournal(DependencyTestBase, _RemoveSuccessTests, unittest.TestCase):
+    backend_name = 'journal'
+
 
 # ---------------------------------------------------------------------------
 # TestIgnore
@@ -449,6 +1335,9 @@ class TestIgnoreDbmNdbm(DependencyTestBase, _IgnoreTests, unittest.TestCase):
 class TestIgnoreDbmDumb(DependencyTestBase, _IgnoreTests, unittest.TestCase):
     backend_name = 'dbm.dumb'
 
+class TestIgnoreJournal(DependencyTestBase, _IgnoreTests, unittest.TestCase):
+    backend_name = 'journal'
+
 
 # ---------------------------------------------------------------------------
 # TestMD5Checker
@@ -483,6 +1372,272 @@ class TestMD5Checker(DependencyFileMixin, unittest.TestCase):
         state3 = (state[0] + 1, state[1], 'not me')
         self.assertTrue(checker.check_modified(self.dependency1, file_stat, state3))
 
+    def test_get_states(self):
+        checker = MD5Checker()
+        state1 = checker.get_state(self.dependency1, None)
+        deps = [(self.dependency1, state1), (self.dependency2, None)]
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            states = checker.get_states(deps, executor)
+        # dependency1 unchanged
+        self.assertIsNone(states[0])
+        self.assertEqual(checker.get_state(self.dependency2, None), states[1])
+
+    def test_check_modified_states(self):
+        checker = MD5Checker()
+        state1 = checker.get_state(self.dependency1, None)
+        state2 = checker.get_state(self.dependency2, None)
+        items = [
+            # same timestamp
+            (self.dependency1, os.stat(self.dependency1), state1),
+            # same size, different md5
+            (self.dependency2, os.stat(self.dependency2),
+             (state2[0] + 1, state2[1], 'not me')),
+            # same size and md5
+            (self.dependency1, os.stat(self.dependency1),
+             (state1[0] + 1, state1[1], state1[2])),
+        ]
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            got = checker.check_modified_states(items, executor)
+        self.assertEqual([False, True, False], got)
+        # also works without executor
+        self.assertEqual([False, True, False],
+                         checker.check_modified_states(items))
+
+
+# ---------------------------------------------------------------------------
+# TestStatMD5Checker
+# ---------------------------------------------------------------------------
+
+class TestStatMD5Checker(DependencyFileMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        # file was not modified "now", so it is not racy
+        self.checker = StatMD5Checker()
+        self.checker.racy_ns = self.checker.racy_coarse_ns = 0
+
+    def test_get_state(self):
+        state = self.checker.get_state(self.dependency1, None)
+        file_stat = os.stat(self.dependency1)
+        self.assertEqual(
+            (file_stat.st_mtime_ns, file_stat.st_size, file_stat.st_ino,
+             file_stat.st_ctime_ns, get_file_md5(self.dependency1), False),
+            state)
+        # unchanged
+        self.assertIsNone(self.checker.get_state(self.dependency1, state))
+
+    def test_racy_state(self):
+        checker = StatMD5Checker()
+        with patch('time.time_ns',
+                   return_value=os.stat(self.dependency1).st_mtime_ns):
+            state = checker.get_state(self.dependency1, None)
+        self.assertTrue(state[5])
+        # racy state is always re-computed
+        self.assertFalse(self.checker.get_state(self.dependency1, state)[5])
+
+    def test_same_stat_skip_md5(self):
+        state = self.checker.get_state(self.dependency1, None)
+        state2 = state[:4] + ('not me', False)
+        file_stat = os.stat(self.dependency1)
+        self.assertFalse(
+            self.checker.check_modified(self.dependency1, file_stat, state2))
+
+    def test_racy_check_md5(self):
+        state = self.checker.get_state(self.dependency1, None)
+        state2 = state[:4] + ('not me', True)
+        file_stat = os.stat(self.dependency1)
+        self.assertTrue(
+            self.checker.check_modified(self.dependency1, file_stat, state2))
+        state3 = state[:5] + (True,)
+        self.assertFalse(
+            self.checker.check_modified(self.dependency1, file_stat, state3))
+
+    def test_stat_changed(self):
+        state = self.checker.get_state(self.dependency1, None)
+        file_stat = os.stat(self.dependency1)
+        # same content
+        for idx in (0, 2, 3):  # mtime, inode, ctime
+            changed = list(state)
+            changed[idx] += 1
+            self.assertFalse(self.checker.check_modified(
+                self.dependency1, file_stat, changed))
+            changed[4] = 'not me'
+            self.assertTrue(self.checker.check_modified(
+                self.dependency1, file_stat, changed))
+
+    def test_size(self):
+        state = self.checker.get_state(self.dependency1, None)
+        state2 = (state[0], state[1] + 1) + state[2:]
+        file_stat = os.stat(self.dependency1)
+        with patch('doit.dependency.get_file_md5') as md5_mock:
+            self.assertTrue(self.checker.check_modified(
+                self.dependency1, file_stat, state2))
+        md5_mock.assert_not_called()
+
+    def test_md5_checker_state(self):
+        md5_state = MD5Checker().get_state(self.dependency1, None)
+        file_stat = os.stat(self.dependency1)
+        self.assertFalse(
+            self.checker.check_modified(self.dependency1, file_stat, md5_state))
+        md5_state2 = (md5_state[0] + 1, md5_state[1], 'not me')
+        self.assertTrue(
+            self.checker.check_modified(self.dependency1, file_stat, md5_state2))
+        # state is upgraded
+        state = self.checker.get_state(self.dependency1, md5_state)
+        self.assertEqual(6, len(state))
+        self.assertTrue(self.checker.same_signature(md5_state, state))
+        self.assertFalse(self.checker.same_signature(md5_state2, state))
+
+
+class TestHashChecker(DependencyFileMixin, unittest.TestCase):
+
+    def test_state(self):
+        checker = HashChecker('sha256', 4)
+        self.assertEqual('HashChecker:sha256', checker.checker_name)
+        state = checker.get_state(self.dependency1, None)
+        self.assertEqual(get_file_hash(self.dependency1, 'sha256'), state[2])
+        file_stat = os.stat(self.dependency1)
+        state2 = (state[0] + 1, state[1], state[2])
+        self.assertFalse(
+            checker.check_modified(self.dependency1, file_stat, state2))
+        state3 = (state[0] + 1, state[1], get_file_md5(self.dependency1))
+        self.assertTrue(
+            checker.check_modified(self.dependency1, file_stat, state3))
+
+    def test_default(self):
+        checker = HashChecker()
+        self.assertEqual('blake2b', checker.algorithm)
+        self.assertEqual(HashChecker.DEFAULT_BUFFER_SIZE, checker.buffer_size)
+
+    def test_invalid_algorithm(self):
+        self.assertRaises(ValueError, HashChecker, 'not_a_hash')
+
+    def test_file_cache(self):
+        checker = HashChecker()
+        checker.file_cache = FileStateCache()
+        expected = get_file_hash(self.dependency1, 'blake2b')
+        self.assertEqual(expected, checker._file_md5(self.dependency1))
+        self.assertEqual(expected, checker._file_md5(self.dependency1))
+        self.assertEqual(1, checker.file_cache.hits)
+
+    def test_change_algorithm(self):
+        tmpdir = tempfile.mkdtemp(prefix='doit-test-dep-')
+        dep_manager = Dependency(JsonDB, os.path.join(tmpdir, 'testdb'),
+                                 checker_cls=HashChecker)
+        t1 = Task("t1", None, [self.dependency1])
+        dep_manager.save_success(t1)
+        self.assertEqual('HashChecker:blake2b',
+                         dep_manager._get('t1', 'checker:'))
+        self.assertEqual('up-to-date', dep_manager.get_status(t1, {}).status)
+        dep_manager.checker = HashChecker('sha256')
+        status = dep_manager.get_status(t1, {}, get_log=True)
+        self.assertEqual('run', status.status)
+        self.assertEqual(('HashChecker:blake2b', 'HashChecker:sha256'),
+                         status.reasons['checker_changed'])
+        dep_manager.close()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+class TestDependencyCheckerMigration(DependencyFileMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self._tmpdir = tempfile.mkdtemp(prefix='doit-test-dep-')
+        self.name = os.path.join(self._tmpdir, 'testdb')
+
+    def tearDown(self):
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+        super().tearDown()
+
+    def _check_migrate(self, file_table):
+        t1 = Task("t1", None, [self.dependency1])
+        dep_manager = Dependency(JsonDB, self.name, file_table=file_table)
+        dep_manager.save_success(t1)
+        dep_manager.close()
+
+        dep_manager = Dependency(JsonDB, self.name, file_table=file_table,
+                                 checker_cls=StatMD5Checker)
+        dep_manager.checker.racy_ns = 0
+        self.assertEqual('up-to-date', dep_manager.get_status(t1, {}).status)
+        dep_manager.save_success(t1)
+        self.assertEqual('StatMD5Checker', dep_manager._get('t1', 'checker:'))
+        self.assertEqual('up-to-date', dep_manager.get_status(t1, {}).status)
+        dep_manager.close()
+        return dep_manager
+
+    def test_migrate(self):
+        dep_manager = self._check_migrate(False)
+        self.assertEqual(6, len(dep_manager._get('t1', self.dependency1)))
+
+    def test_migrate_file_table(self):
+        dep_manager = self._check_migrate(True)
+        record = '=file:' + self.dependency1
+        self.assertEqual(6, len(dep_manager._get(record, 'state:')))
+        self.assertEqual(1, dep_manager._get(record, 'version:'))
+
+    def _check_racy_refresh(self, file_table):
+        t1 = Task("t1", None, [self.dependency1])
+        dep_manager = Dependency(JsonDB, self.name, file_table=file_table,
+                                 checker_cls=StatMD5Checker)
+        checker = dep_manager.checker
+        mtime_ns = os.stat(self.dependency1).st_mtime_ns
+        with patch('time.time_ns', return_value=mtime_ns):
+            dep_manager.save_success(t1)
+        dep_manager.close()
+
+        # first no-op run, out of racy window, checks md5 and clears flag
+        dep_manager = Dependency(JsonDB, self.name, file_table=file_table,
+                                 checker_cls=StatMD5Checker)
+        later_ns = mtime_ns + StatMD5Checker.racy_coarse_ns
+        with patch.object(StatMD5Checker, '_file_md5',
+                          wraps=checker._file_md5) as md5_mock, \
+             patch('time.time_ns', return_value=later_ns):
+            self.assertEqual('up-to-date',
+                             dep_manager.get_status(t1, {}).status)
+        self.assertEqual(1, md5_mock.call_count)
+        dep_manager.close()
+
+        # second no-op run does not read the file
+        dep_manager = Dependency(JsonDB, self.name, file_table=file_table,
+                                 checker_cls=StatMD5Checker)
+        with patch.object(StatMD5Checker, '_file_md5') as md5_mock:
+            self.assertEqual('up-to-date',
+                             dep_manager.get_status(t1, {}).status)
+        md5_mock.assert_not_called()
+        dep_manager.close()
+        return dep_manager
+
+    def test_racy_refresh(self):
+        dep_manager = self._check_racy_refresh(False)
+        self.assertFalse(dep_manager._get('t1', self.dependency1)[5])
+
+    def test_racy_refresh_file_table(self):
+        dep_manager = self._check_racy_refresh(True)
+        record = '=file:' + self.dependency1
+        self.assertFalse(dep_manager._get(record, 'state:')[5])
+        self.assertEqual(1, dep_manager._get(record, 'version:'))
+
+    def test_racy_not_refreshed(self):
+        # file still inside racy window
+        t1 = Task("t1", None, [self.dependency1])
+        dep_manager = Dependency(JsonDB, self.name, checker_cls=StatMD5Checker)
+        mtime_ns = os.stat(self.dependency1).st_mtime_ns
+        with patch('time.time_ns', return_value=mtime_ns):
+            dep_manager.save_success(t1)
+            self.assertEqual('up-to-date',
+                             dep_manager.get_status(t1, {}).status)
+        self.assertTrue(dep_manager._get('t1', self.dependency1)[5])
+        dep_manager.close()
+
+    def test_not_compatible(self):
+        # StatMD5Checker states can not be used by MD5Checker
+        t1 = Task("t1", None, [self.dependency1])
+        dep_manager = Dependency(JsonDB, self.name, checker_cls=StatMD5Checker)
+        dep_manager.save_success(t1)
+        dep_manager.checker = MD5Checker()
+        self.assertEqual('run', dep_manager.get_status(t1, {}).status)
+        dep_manager.close()
+
 
 # ---------------------------------------------------------------------------
 # TestCustomChecker
@@ -499,6 +1654,19 @@ class TestCustomChecker(DependencyFileMixin, unittest.TestCase):
         self.assertRaises(NotImplementedError, checker.check_modified,
                           None, None, None)
 
+    def test_batch_default(self):
+        class MyChecker(FileChangedChecker):
+            def check_modified(self, file_path, file_stat, state):
+                return state != 'same'
+            def get_state(self, dep, current_state):
+                return dep.upper()
+
+        checker = MyChecker()
+        self.assertEqual(['A', 'B'],
+                         checker.get_states([('a', None), ('b', 'x')]))
+        items = [('a', None, 'same'), ('b', None, 'other')]
+        self.assertEqual([False, True], checker.check_modified_states(items))
+
 
 # ---------------------------------------------------------------------------
 # TestTimestampChecker
@@ -599,6 +1767,33 @@ class _GetStatusTests:
         self.assertEqual('run', self.dep_manager.get_status(t1, {}).status)
         self.assertEqual(dependencies, t1.dep_changed)
 
+    def test_task_snapshot(self):
+        filePath = get_abspath("data/dependency1")
+        with open(filePath, "w") as ff:
+            ff.write("part1")
+        t1 = Task("t1", None, [filePath])
+        self.dep_manager.save_success(t1)
+
+        # status checked on a copy of saved data
+        snapshot = self.dep_manager.task_snapshot(t1)
+        copy_manager = Dependency(MemoryDB, 'copy', file_table=self.file_table,
+                                  backend_opts={'data': snapshot})
+        self.assertEqual('up-to-date', copy_manager.get_status(t1, {}).status)
+
+        with open(filePath, "a") as ff:
+            ff.write(" part2")
+        os.utime(filePath, (1, 1))
+        self.assertEqual('run', copy_manager.get_status(t1, {}).status)
+        states = copy_manager.get_file_states(t1)
+        self.assertEqual([filePath], list(states))
+
+        # states computed on copy are saved without checking files again
+        with patch.object(self.dep_manager.checker, 'get_states') as get:
+            self.dep_manager.save_success(t1, states=states)
+        self.assertFalse(get.called)
+        self.assertEqual('up-to-date',
+                         self.dep_manager.get_status(t1, {}).status)
+
     def test_fileDependencies_changed(self):
         filePath = get_abspath("data/dependency1")
         ff = open(filePath, "w")
@@ -912,3 +2107,406 @@ class TestGetStatusDbmNdbm(DependencyTestBase, _GetStatusTests, unittest.TestCas
 
 class TestGetStatusDbmDumb(DependencyTestBase, _GetStatusTests, unittest.TestCase):
     backend_name = 'dbm.dumb'
+
+class TestGetStatusJournal(DependencyTestBase, _GetStatusTests, unittest.TestCase):
+    backend_name = 'journal'
+
+class TestGetStatusFileTableJson(DependencyTestBase, _GetStatusTests,
+                                 unittest.TestCase):
+    backend_name = 'json'
+    file_table = True
+
+class TestGetStatusFileTableSqlite(DependencyTestBase, _GetStatusTests,
+                                   unittest.TestCase):
+    backend_name = 'sqlite3'
+    file_table = True
+
+class TestGetStatusFileTableDbmDumb(DependencyTestBase, _GetStatusTests,
+                                    unittest.TestCase):
+    backend_name = 'dbm.dumb'
+    file_table = True
+
+
+# ---------------------------------------------------------------------------
+# TestFileTable
+# ---------------------------------------------------------------------------
+
+class _FileTableTests:
+    """Tests for Dependency with file_table enabled"""
+
+    def test_save_success(self):
+        t1 = Task("t1", None, [self.dependency1])
+        t2 = Task("t2", None, [self.dependency1, self.dependency2])
+        self.dep_manager.save_success(t1)
+        self.dep_manager.save_success(t2)
+        # file states are not saved on task
+        self.assertIsNone(self.dep_manager._get("t1", self.dependency1))
+        self.assertEqual({self.dependency1: 1},
+                         self.dep_manager._get("t1", "refs:"))
+        self.assertEqual({self.dependency1: 1, self.dependency2: 1},
+                         self.dep_manager._get("t2", "refs:"))
+        record = '=file:' + self.dependency1
+        state = self.dep_manager._get(record, 'state:')
+        self.assertEqual(get_file_md5(self.dependency1), state[2])
+        self.assertEqual('MD5Checker',
+                         self.dep_manager._get(record, 'checker:'))
+
+    def test_version_shared(self):
+        t1 = Task("t1", None, [self.dependency1])
+        t2 = Task("t2", None, [self.dependency1])
+        self.dep_manager.save_success(t1)
+        self.dep_manager.save_success(t2)
+
+        # modify file, execute t1
+        time.sleep(1)
+        with open(self.dependency1, 'a') as fp:
+            fp.write('xxx')
+        self.assertEqual('run', self.dep_manager.get_status(t1, {}).status)
+        self.dep_manager.save_success(t1)
+        self.assertEqual({self.dependency1: 2},
+                         self.dep_manager._get("t1", "refs:"))
+        self.assertEqual('up-to-date',
+                         self.dep_manager.get_status(t1, {}).status)
+        # t2 saw previous version
+        self.assertEqual('run', self.dep_manager.get_status(t2, {}).status)
+        self.assertEqual([self.dependency1], t2.dep_changed)
+        self.dep_manager.save_success(t2)
+        self.assertEqual('up-to-date',
+                         self.dep_manager.get_status(t2, {}).status)
+
+    def test_same_content_keep_version(self):
+        t1 = Task("t1", None, [self.dependency1])
+        t2 = Task("t2", None, [self.dependency1])
+        self.dep_manager.save_success(t1)
+        self.dep_manager.save_success(t2)
+
+        # only timestamp is modified
+        time.sleep(1)
+        os.utime(self.dependency1)
+        self.dep_manager.save_success(t1)
+        record = '=file:' + self.dependency1
+        self.assertEqual(1, self.dep_manager._get(record, 'version:'))
+        state = self.dep_manager._get(record, 'state:')
+        self.assertEqual(os.path.getmtime(self.dependency1), state[0])
+        self.assertEqual('up-to-date',
+                         self.dep_manager.get_status(t2, {}).status)
+
+    def test_checker_changed(self):
+        t1 = Task("t1", None, [self.dependency1])
+        self.dep_manager.save_success(t1)
+        record = '=file:' + self.dependency1
+        self.dep_manager._set(record, 'checker:', 'OtherChecker')
+        self.assertEqual('run', self.dep_manager.get_status(t1, {}).status)
+        self.assertEqual([self.dependency1], t1.dep_changed)
+
+    def test_migrate(self):
+        # save using per-task layout
+        self.dep_manager.file_table = False
+        t1 = Task("t1", None, [self.dependency1])
+        t1.values = {'x': 1}
+        t1.result = 'my-result'
+        self.dep_manager.save_success(t1)
+        old_state = self.dep_manager._get("t1", self.dependency1)
+        self.assertIsNotNone(old_state)
+
+        self.dep_manager.file_table = True
+        self.assertEqual('up-to-date',
+                         self.dep_manager.get_status(t1, {}).status)
+        t1.result = None
+        self.dep_manager.save_success(t1)
+        self.assertIsNone(self.dep_manager._get("t1", self.dependency1))
+        self.assertEqual({self.dependency1: 1},
+                         self.dep_manager._get("t1", "refs:"))
+        self.assertEqual({'x': 1}, self.dep_manager.get_values("t1"))
+        self.assertEqual(get_md5('my-result'),
+                         self.dep_manager.get_result("t1"))
+        record = '=file:' + self.dependency1
+        self.assertEqual(list(old_state),
+                         list(self.dep_manager._get(record, 'state:')))
+        self.assertEqual('up-to-date',
+                         self.dep_manager.get_status(t1, {}).status)
+
+    def test_disable(self):
+        t1 = Task("t1", None, [self.dependency1])
+        self.dep_manager.save_success(t1)
+        self.dep_manager.file_table = False
+        # file table is still used to read states
+        self.assertEqual('up-to-date',
+                         self.dep_manager.get_status(t1, {}).status)
+        self.dep_manager.save_success(t1)
+        self.assertIsNone(self.dep_manager._get("t1", "refs:"))
+        self.assertIsNotNone(self.dep_manager._get("t1", self.dependency1))
+        self.assertEqual('up-to-date',
+                         self.dep_manager.get_status(t1, {}).status)
+
+    def test_persist(self):
+        t1 = Task("t1", None, [self.dependency1])
+        self.dep_manager.save_success(t1)
+        self.dep_manager.close()
+        self.dep_manager = Dependency(
+            self.dep_manager.db_class, self.dep_manager.name,
+            file_table=True)
+        self.assertEqual('up-to-date',
+                         self.dep_manager.get_status(t1, {}).status)
+
+
+class TestFileTableJson(DependencyTestBase, DependencyFileMixin,
+                        _FileTableTests, unittest.TestCase):
+    backend_name = 'json'
+    file_table = True
+
+class TestFileTableSqlite(DependencyTestBase, DependencyFileMixin,
+                          _FileTableTests, unittest.TestCase):
+    backend_name = 'sqlite3'
+    file_table = True
+
+class TestFileTableDbmDumb(DependencyTestBase, DependencyFileMixin,
+                           _FileTableTests, unittest.TestCase):
+    backend_name = 'dbm.dumb'
+    file_table = True
+
+
+class _GcTests:
+    """Tests for Dependency.gc() and compact()"""
+
+    def _reopen(self):
+        self.dep_manager.close()
+        module_name = None
+        if self.backend_name.startswith('dbm.'):
+            module_name = self.backend_name
+        self.dep_manager = Dependency(
+            self.dep_manager.db_class, self.dep_manager.name,
+            module_name=module_name)
+
+    def test_remove_tasks(self):
+        t1 = Task("t1", None, [self.dependency1])
+        t2 = Task("t2", None, [self.dependency1])
+        self.dep_manager.save_success(t1)
+        self.dep_manager.save_success(t2)
+        got = self.dep_manager.gc([t1])
+        self.assertEqual({'tasks': 1, 'deps': 0, 'files': 0}, got)
+        self.dep_manager.compact()
+        self._reopen()
+        self.assertFalse(self.dep_manager._in("t2"))
+        self.assertEqual('up-to-date',
+                         self.dep_manager.get_status(t1, {}).status)
+
+    def test_stale_deps(self):
+        t1 = Task("t1", None, [self.dependency1, self.dependency2])
+        t1.values = {'x': 1}
+        self.dep_manager.save_success(t1)
+        t1 = Task("t1", None, [self.dependency1])
+        t1.values = {'x': 1}
+        self.dep_manager.save_success(t1)
+        self.assertIsNotNone(self.dep_manager._get("t1", self.dependency2))
+        got = self.dep_manager.gc([t1])
+        self.assertEqual({'tasks': 0, 'deps': 1, 'files': 0}, got)
+        self.dep_manager.compact()
+        self._reopen()
+        self.assertIsNone(self.dep_manager._get("t1", self.dependency2))
+        self.assertEqual({'x': 1}, self.dep_manager.get_values("t1"))
+        self.assertEqual('up-to-date',
+                         self.dep_manager.get_status(t1, {}).status)
+
+    def test_file_table(self):
+        self.dep_manager.file_table = True
+        t1 = Task("t1", None, [self.dependency1])
+        t2 = Task("t2", None, [self.dependency2])
+        self.dep_manager.save_success(t1)
+        self.dep_manager.save_success(t2)
+        t1 = Task("t1", None, [])
+        self.dep_manager.save_success(t1)
+        got = self.dep_manager.gc([t1])
+        self.assertEqual({'tasks': 1, 'deps': 0, 'files': 2}, got)
+        self.assertEqual({}, self.dep_manager._get("t1", "refs:"))
+        self.assertFalse(self.dep_manager._in('=file:' + self.dependency1))
+        self.assertFalse(self.dep_manager._in('=file:' + self.dependency2))
+
+    def test_delayed_loader(self):
+        loader = DelayedLoader(lambda: None, creates=['other'])
+        gen = Task("gen", None, loader=loader)
+        for name in ("gen", "gen:a", "other", "other:b", "generic"):
+            self.dep_manager._set(name, "_values_:", {})
+        got = self.dep_manager.gc([gen])
+        self.assertEqual(1, got['tasks'])
+        self.assertFalse(self.dep_manager._in("generic"))
+        for name in ("gen", "gen:a", "other", "other:b"):
+            self.assertTrue(self.dep_manager._in(name))
+
+
+class TestGcJson(DependencyTestBase, DependencyFileMixin,
+                 _GcTests, unittest.TestCase):
+    backend_name = 'json'
+
+class TestGcSqlite(DependencyTestBase, DependencyFileMixin,
+                   _GcTests, unittest.TestCase):
+    backend_name = 'sqlite3'
+
+class TestGcDbmGnu(DependencyTestBase, DependencyFileMixin,
+                   _GcTests, unittest.TestCase):
+    backend_name = 'dbm.gnu'
+
+class TestGcDbmNdbm(DependencyTestBase, DependencyFileMixin,
+                    _GcTests, unittest.TestCase):
+    backend_name = 'dbm.ndbm'
+
+class TestGcDbmDumb(DependencyTestBase, DependencyFileMixin,
+                    _GcTests, unittest.TestCase):
+    backend_name = 'dbm.dumb'
+
+class TestGcJournal(DependencyTestBase, DependencyFileMixin,
+                    _GcTests, unittest.TestCase):
+    backend_name = 'journal'
+
+
+# ---------------------------------------------------------------------------
+# TestHashWorkers
+# ---------------------------------------------------------------------------
+
+class TestHashWorkers(DependencyFileMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self._tmpdir = tempfile.mkdtemp(prefix='doit-test-dep-')
+        self.dep_manager = Dependency(
+            JsonDB, os.path.join(self._tmpdir, 'testdb'), hash_workers=2)
+
+    def tearDown(self):
+        self.dep_manager.close()
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+        super().tearDown()
+
+    def test_save_and_check(self):
+        t1 = Task("t1", None, [self.dependency1, self.dependency2])
+        self.dep_manager.save_success(t1)
+        self.assertIsNotNone(self.dep_manager._hash_executor)
+        expected = MD5Checker().get_state(self.dependency2, None)
+        self.assertEqual(expected, self.dep_manager._get("t1", self.dependency2))
+        self.assertEqual('up-to-date', self.dep_manager.get_status(t1, {}).status)
+
+        # change content and timestamp keeping the same size
+        with open(self.dependency2, 'r') as fp:
+            content = fp.read()
+        with open(self.dependency2, 'w') as fp:
+            fp.write('X' + content[1:])
+        state = self.dep_manager._get("t1", self.dependency2)
+        self.dep_manager._set("t1", self.dependency2,
+                              (state[0] - 1, state[1], state[2]))
+        self.assertEqual('run', self.dep_manager.get_status(t1, {}).status)
+        self.assertEqual([self.dependency2], t1.dep_changed)
+
+    def test_close_shutdown_executor(self):
+        t1 = Task("t1", None, [self.dependency1, self.dependency2])
+        self.dep_manager.save_success(t1)
+        self.dep_manager.close()
+        self.assertIsNone(self.dep_manager._hash_executor)
+
+
+# ---------------------------------------------------------------------------
+# TestFileStateCache
+# ---------------------------------------------------------------------------
+
+class TestFileStateCache(DependencyFileMixin, unittest.TestCase):
+
+    def test_stat(self):
+        cache = FileStateCache()
+        calls = []
+        def my_stat(path):
+            calls.append(path)
+            return os.stat(path)
+        first = cache.stat(self.dependency1, my_stat)
+        second = cache.stat(self.dependency1, my_stat)
+        self.assertIs(first, second)
+        self.assertEqual([self.dependency1], calls)
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+        self.assertIs(first, cache.get_stat(self.dependency1))
+        self.assertIsNone(cache.get_stat(self.dependency2))
+
+    def test_stat_error_not_cached(self):
+        cache = FileStateCache()
+        self.assertRaises(OSError, cache.stat, 'i_dont_exist', os.stat)
+        self.assertRaises(OSError, cache.stat, 'i_dont_exist', os.stat)
+        self.assertEqual(2, cache.misses)
+
+    def test_file_hash(self):
+        cache = FileStateCache()
+        md5 = cache.file_hash(self.dependency1, get_file_md5)
+        self.assertEqual(get_file_md5(self.dependency1), md5)
+        self.assertEqual(md5, cache.file_hash(self.dependency1, get_file_md5))
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+
+    def test_invalidate(self):
+        cache = FileStateCache()
+        cache.stat(self.dependency1, os.stat)
+        cache.file_hash(self.dependency1, get_file_md5)
+        cache.invalidate([self.dependency1, 'not_cached'])
+        self.assertIsNone(cache.get_stat(self.dependency1))
+        cache.file_hash(self.dependency1, get_file_md5)
+        self.assertEqual(3, cache.misses)
+
+
+class TestDependencyFileCache(DependencyFileMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self._tmpdir = tempfile.mkdtemp(prefix='doit-test-dep-')
+        self.dep_manager = Dependency(
+            JsonDB, os.path.join(self._tmpdir, 'testdb'))
+
+    def tearDown(self):
+        self.dep_manager.close()
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+        super().tearDown()
+
+    def test_shared_by_tasks(self):
+        cache = self.dep_manager.start_file_cache()
+        t1 = Task("t1", None, [self.dependency1])
+        t2 = Task("t2", None, [self.dependency1])
+        self.dep_manager.get_status(t1, {})
+        self.dep_manager.save_success(t1)
+        self.dep_manager.get_status(t2, {})
+        self.dep_manager.save_success(t2)
+        # file stat'ed and hashed only once
+        self.assertEqual(2, cache.misses)
+        self.assertEqual(4, cache.hits)
+
+    def test_invalidate_target(self):
+        cache = self.dep_manager.start_file_cache()
+        t1 = Task("t1", None, [self.dependency1])
+        t2 = Task("t2", None, [self.dependency2], targets=[self.dependency1])
+        self.dep_manager.get_status(t1, {})
+        self.dep_manager.save_success(t2)
+        self.assertIsNone(cache.get_stat(self.dependency1))
+        self.dep_manager.get_status(t1, {})
+        self.dep_manager.remove_success(t2)
+        self.assertIsNone(cache.get_stat(self.dependency1))
+
+    def test_restat_target(self):
+        # dependent task is up-to-date without stat/hash target again
+        t1 = Task("t1", None, [self.dependency2], targets=[self.dependency1],
+                  restat=True)
+        t2 = Task("t2", None, [self.dependency1])
+        self.dep_manager.save_success(t1)
+        self.dep_manager.save_success(t2)
+        mtime = os.stat(self.dependency1).st_mtime_ns
+        with open(self.dependency1) as fp:
+            content = fp.read()
+        with open(self.dependency1, 'w') as fp:
+            fp.write(content)
+        os.utime(self.dependency1, ns=(mtime + 10**9, mtime + 10**9))
+
+        cache = self.dep_manager.start_file_cache()
+        self.dep_manager.save_success(t1)
+        misses = cache.misses
+        self.assertEqual('up-to-date',
+                         self.dep_manager.get_status(t2, {}).status)
+        self.assertEqual(misses, cache.misses)
+        self.assertEqual(mtime, os.stat(self.dependency1).st_mtime_ns)
+
+    def test_stop(self):
+        cache = self.dep_manager.start_file_cache()
+        self.dep_manager.stop_file_cache()
+        t1 = Task("t1", None, [self.dependency1])
+        self.dep_manager.get_status(t1, {})
+        self.assertEqual(0, cache.misses)
+        self.assertIs(cache, self.dep_manager.file_cache)
@@ -7,7 +7,7 @@ import shutil
 from unittest.mock import Mock, patch
 
 from doit.exceptions import InvalidCommand
-from doit.cmd_run import Run
+from doit.cmd_run import Run, parse_pools
 from doit.cmd_list import List
 from doit import doit_cmd
 from tests.support import DepfileNameMixin
@@ -65,6 +65,28 @@ class TestRun(unittest.TestCase):
             cmd_main(['--z=5'])
         self.assertIsNone(doit_cmd.get_var('--z'))
 
+    def test_cmdline_option_value_not_var(self):
+        mock_run = Mock()
+        with patch.object(Run, "execute", mock_run):
+            result = cmd_main(['--backend', 'sqlite3', '--sqlite-pragmas',
+                               'synchronous=FULL', 'x=1'])
+        self.assertNotEqual(3, result)
+        params, args = mock_run.call_args[0]
+        self.assertIn('synchronous=FULL', params['sqlite_pragmas'])
+        self.assertEqual([], args)
+        self.assertEqual('1', doit_cmd.get_var('x'))
+        self.assertIsNone(doit_cmd.get_var('synchronous'))
+
+    def test_cmdline_pool_not_var(self):
+        mock_run = Mock()
+        with patch.object(Run, "execute", mock_run):
+            result = cmd_main(['-n', '32', '--pool', 'mem_heavy=4', 't1'])
+        self.assertNotEqual(3, result)
+        params, args = mock_run.call_args[0]
+        self.assertEqual({'mem_heavy': 4}, parse_pools(params['pools']))
+        self.assertEqual(['t1'], args)
+        self.assertIsNone(doit_cmd.get_var('mem_heavy'))
+
     def test_cmdline_loader_option_before_cmd_name(self):
         mock_list = Mock()
         with patch.object(List, "execute", mock_list):
@@ -0,0 +1,92 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+
+from doit.filewatch import FileWatcher
+
+
+def write_file(path, content='content'):
+    with open(path, 'w') as fp:
+        fp.write(content)
+
+
+@unittest.skipUnless(FileWatcher.available(), 'inotify not available')
+class TestFileWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = os.path.realpath(
+            tempfile.mkdtemp(prefix='doit-test-watch-'))
+        self.file1 = os.path.join(self.tmpdir, 'file1')
+        self.file2 = os.path.join(self.tmpdir, 'file2')
+        write_file(self.file1)
+        self.watcher = FileWatcher()
+
+    def tearDown(self):
+        self.watcher.close()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_modified(self):
+        self.watcher.watch([self.file1])
+        write_file(self.file1, 'modified')
+        self.assertEqual({self.file1}, self.watcher.wait(0.05, timeout=1))
+
+    def test_not_watched(self):
+        self.watcher.watch([self.file1])
+        write_file(self.file2)
+        self.assertEqual(set(), self.watcher.wait(0.05, timeout=0.2))
+
+    def test_replaced(self):
+        # editors usually save to a temporary file and rename it
+        self.watcher.watch([self.file1])
+        write_file(self.file2, 'new')
+        os.rename(self.file2, self.file1)
+        self.assertEqual({self.file1}, self.watcher.wait(0.05, timeout=1))
+
+    def test_removed(self):
+        self.watcher.watch([self.file1])
+        os.remove(self.file1)
+        self.assertEqual({self.file1}, self.watcher.wait(0.05, timeout=1))
+
+    def test_dir(self):
+        sub = os.path.join(self.tmpdir, 'sub')
+        os.mkdir(sub)
+        self.watcher.watch([], [sub])
+        write_file(os.path.join(sub, 'new_file'))
+        self.assertEqual({sub}, self.watcher.wait(0.05, timeout=1))
+
+    def test_ignore(self):
+        self.watcher.ignore = lambda path: path == self.file1
+        self.watcher.watch([self.file1])
+        write_file(self.file1, 'modified')
+        self.assertEqual(set(), self.watcher.wait(0.05, timeout=0.2))
+
+    def test_unwatch(self):
+        self.watcher.watch([self.file1])
+        self.watcher.watch([])
+        write_file(self.file1, 'modified')
+        self.assertEqual(set(), self.watcher.wait(0.05, timeout=0.2))
+
+    def test_missing_dir(self):
+        missing = os.path.join(self.tmpdir, 'missing', 'file')
+        self.watcher.watch([missing])
+        os.mkdir(os.path.dirname(missing))
+        # watched after directory was created
+        self.watcher.watch([missing])
+        write_file(missing)
+        self.assertEqual({missing}, self.watcher.wait(0.05, timeout=1))
+
+    def test_debounce(self):
+        self.watcher.watch([self.file1, self.file2])
+        def modify():
+            write_file(self.file1, 'modified')
+            time.sleep(0.1)
+            write_file(self.file2)
+        thread = threading.Thread(target=modify)
+        thread.start()
+        # single burst of modifications
+        changed = self.watcher.wait(0.5, timeout=1)
+        thread.join()
+        self.assertEqual({self.file1, self.file2}, changed)
@@ -0,0 +1,151 @@
+import os
+import shutil
+import tempfile
+import unittest
+from io import StringIO
+
+from doit.task import Task
+from doit.control import ExecNode
+from doit.reporter import ConsoleReporter
+from doit.fingerprint import GraphFingerprint, noop_status
+
+
+def build():
+    pass
+
+
+class TestNoopStatus(unittest.TestCase):
+
+    def test_file_dep(self):
+        self.assertEqual('up-to-date',
+                         noop_status(Task('t1', [build], file_dep=['a'])))
+
+    def test_uptodate_true(self):
+        task = Task('t1', [build], uptodate=[True, None])
+        self.assertEqual('up-to-date', noop_status(task))
+
+    def test_no_dependencies(self):
+        self.assertIsNone(noop_status(Task('t1', [build])))
+        self.assertEqual('run', noop_status(Task('t1', None)))
+
+    def test_not_supported(self):
+        self.assertIsNone(noop_status(
+            Task('t1', [build], file_dep=['a'], uptodate=[lambda: True])))
+        self.assertIsNone(noop_status(
+            Task('t1', [build], file_dep=['a'], uptodate=[False])))
+        self.assertIsNone(noop_status(
+            Task('t1', [build], file_dep=['a'], calc_dep=['t2'])))
+        self.assertIsNone(noop_status(
+            Task('t1', [build], file_dep=['a'], getargs={'x': ('t2', 'x')})))
+
+
+class TestGraphFingerprint(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='doit-test-fingerprint-')
+        self.db_name = os.path.join(self.tmpdir, 'db')
+        self.path = self.db_name + '.fingerprint'
+        self.dep = os.path.join(self.tmpdir, 'dep')
+        self.target = os.path.join(self.tmpdir, 'target')
+        for path in (self.db_name, self.dep, self.target):
+            with open(path, 'w') as fp:
+                fp.write('content')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def tasks(self, action='cmd'):
+        return [Task('t1', [action], file_dep=[self.dep],
+                     targets=[self.target]),
+                Task('t2', None, task_dep=['t1']),
+                Task('t3', [action], file_dep=[self.dep])]
+
+    def save(self, tasks, statuses, during_run=None):
+        graph = GraphFingerprint(self.path, self.db_name, tasks, ['opt'])
+        graph.start()
+        if during_run:
+            during_run()
+        nodes = []
+        for task, status in zip(tasks, statuses):
+            node = ExecNode(task, None)
+            node.run_status = status
+            nodes.append(node)
+        return graph.save(nodes, ['t2'])
+
+    def check(self, tasks=None, options=('opt',)):
+        graph = GraphFingerprint(self.path, self.db_name,
+                                 tasks or self.tasks(), list(options))
+        return graph.check()
+
+    def test_not_saved(self):
+        self.assertIsNone(self.check())
+
+    def test_unchanged(self):
+        tasks = self.tasks()
+        statuses = ['successful', 'successful', 'ignore']
+        self.assertTrue(self.save(tasks, statuses))
+        entry = self.check()
+        self.assertEqual([('t1', 'up-to-date'), ('t2', 'run'),
+                          ('t3', 'ignore')], entry['tasks'])
+
+        output = StringIO()
+        reporter = ConsoleReporter(output, {})
+        graph = GraphFingerprint(self.path, self.db_name, tasks, ['opt'])
+        graph.replay(reporter, entry)
+        self.assertEqual("-- t1\n!! t3\n", output.getvalue())
+
+    def test_modified_file(self):
+        self.save(self.tasks(), ['successful'] * 3)
+        with open(self.dep, 'a') as fp:
+            fp.write('modified')
+        self.assertIsNone(self.check())
+
+    def test_modified_during_run(self):
+        def modify():
+            with open(self.dep, 'a') as fp:
+                fp.write('modified')
+        self.assertFalse(self.save(self.tasks(), ['successful'] * 3, modify))
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_target_written_during_run(self):
+        def build_target():
+            os.remove(self.target)
+            with open(self.target, 'w') as fp:
+                fp.write('built again')
+        tasks = self.tasks()
+        self.assertTrue(self.save(tasks, ['successful'] * 3, build_target))
+        # target of up-to-date task
+        self.assertFalse(self.save(tasks, ['up-to-date'] * 3, build_target))
+
+    def test_modified_db(self):
+        self.save(self.tasks(), ['successful'] * 3)
+        with open(self.db_name, 'a') as fp:
+            fp.write('modified')
+        self.assertIsNone(self.check())
+
+    def test_modified_task(self):
+        self.save(self.tasks(), ['successful'] * 3)
+        self.assertIsNone(self.check(self.tasks(action='other')))
+        self.assertIsNone(self.check(options=['other']))
+
+    def test_stat_threads(self):
+        graph = GraphFingerprint(self.path, self.db_name, [], [], workers=3)
+        graph.MIN_CHUNK = 1
+        files = [self.dep, 'missing', self.target]
+        stats = graph._files_stat(files)
+        self.assertIsNone(stats[1])
+        self.assertEqual(os.stat(self.target).st_ino, stats[2][2])
+
+    def test_missing_target(self):
+        os.remove(self.target)
+        self.assertFalse(self.save(self.tasks(), ['successful'] * 3))
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_not_supported_removes(self):
+        self.save(self.tasks(), ['successful'] * 3)
+        tasks = self.tasks() + [Task('t4', [build])]
+        self.assertFalse(self.save(tasks, ['successful'] * 4))
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_failure(self):
+        self.assertFalse(self.save(self.tasks(), ['successful', 'failure']))
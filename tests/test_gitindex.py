@@ -0,0 +1,202 @@
+import os
+import shutil
+import tempfile
+import subprocess
+import unittest
+from unittest.mock import patch
+
+from doit import gitindex
+from doit.gitindex import GitIndex, GitIndexError, parse_index
+from doit.gitindex import find_git_dir, object_format
+from doit.dependency import GitIndexChecker, FileStateCache
+
+
+def git(cwd, *args):
+    return subprocess.check_output(('git',) + args, cwd=cwd).decode('utf-8')
+
+
+@unittest.skipUnless(shutil.which('git'), 'git not available')
+class GitRepoMixin:
+    """creates a git repository with a few committed files"""
+    index_version = 2
+
+    def setUp(self):
+        super().setUp()
+        self.worktree = os.path.realpath(tempfile.mkdtemp(prefix='doit-git-'))
+        git(self.worktree, 'init', '-q')
+        git(self.worktree, 'config', 'user.email', 'doit@example.com')
+        git(self.worktree, 'config', 'user.name', 'doit')
+        os.mkdir(os.path.join(self.worktree, 'sub'))
+        self.files = {}
+        for name in ('a.txt', 'sub/b.txt', 'sub/c.txt'):
+            path = self.files[name] = os.path.join(self.worktree, name)
+            with open(path, 'w') as fp:
+                fp.write('content of {}\n'.format(name))
+            # avoid racily clean entries
+            os.utime(path, (1600000000, 1600000000))
+        git(self.worktree, 'add', '.')
+        git(self.worktree, 'update-index', '--index-version',
+            str(self.index_version))
+        git(self.worktree, 'commit', '-q', '-m', 'initial')
+
+    def tearDown(self):
+        shutil.rmtree(self.worktree, ignore_errors=True)
+        super().tearDown()
+
+    def blob_id(self, name):
+        return git(self.worktree, 'hash-object', self.files[name]).strip()
+
+    def get_index(self):
+        return GitIndex(self.worktree, os.path.join(self.worktree, '.git'))
+
+
+class _GitIndexTests(GitRepoMixin):
+
+    def test_entries(self):
+        index = self.get_index()
+        self.assertEqual({'a.txt', 'sub/b.txt', 'sub/c.txt'},
+                         set(index.entries))
+        entry = index.entries['sub/b.txt']
+        self.assertEqual(self.blob_id('sub/b.txt'), entry.object_id)
+        self.assertEqual(os.path.getsize(self.files['sub/b.txt']), entry.size)
+
+    def test_clean(self):
+        index = self.get_index()
+        path = self.files['sub/c.txt']
+        self.assertEqual(self.blob_id('sub/c.txt'),
+                         index.get_object_id(path, os.stat(path)))
+
+    def test_modified(self):
+        path = self.files['a.txt']
+        with open(path, 'a') as fp:
+            fp.write('more')
+        index = self.get_index()
+        self.assertIsNone(index.get_object_id(path, os.stat(path)))
+
+    def test_untracked(self):
+        path = os.path.join(self.worktree, 'new.txt')
+        with open(path, 'w') as fp:
+            fp.write('new')
+        index = self.get_index()
+        self.assertIsNone(index.get_object_id(path, os.stat(path)))
+
+    def test_intent_to_add(self):
+        path = os.path.join(self.worktree, 'new.txt')
+        with open(path, 'w') as fp:
+            fp.write('new')
+        git(self.worktree, 'add', '-N', 'new.txt')
+        index = self.get_index()
+        self.assertNotIn('new.txt', index.entries)
+        self.assertIn('sub/c.txt', index.entries)
+
+    def test_racy(self):
+        index = self.get_index()
+        path = self.files['a.txt']
+        index.index_mtime_ns = os.stat(path).st_mtime_ns
+        self.assertIsNone(index.get_object_id(path, os.stat(path)))
+
+
+class TestGitIndexV2(_GitIndexTests, unittest.TestCase):
+    index_version = 2
+
+class TestGitIndexV3(_GitIndexTests, unittest.TestCase):
+    index_version = 3
+
+class TestGitIndexV4(_GitIndexTests, unittest.TestCase):
+    index_version = 4
+
+
+class TestParseIndex(unittest.TestCase):
+
+    def test_invalid_signature(self):
+        self.assertRaises(GitIndexError, parse_index, b'XXXX\0\0\0\2\0\0\0\0')
+
+    def test_invalid_version(self):
+        self.assertRaises(GitIndexError, parse_index, b'DIRC\0\0\0\7\0\0\0\0')
+
+    def test_truncated(self):
+        self.assertRaises(GitIndexError, parse_index,
+                          b'DIRC\0\0\0\2\0\0\0\1' + b'\0' * 20)
+
+    def test_empty(self):
+        self.assertEqual({}, parse_index(b'DIRC\0\0\0\2\0\0\0\0'))
+
+
+class TestFindGitDir(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = os.path.realpath(tempfile.mkdtemp(prefix='doit-git-'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_dir(self):
+        os.makedirs(os.path.join(self.tmpdir, '.git'))
+        os.makedirs(os.path.join(self.tmpdir, 'a', 'b'))
+        self.assertEqual(
+            (self.tmpdir, os.path.join(self.tmpdir, '.git')),
+            find_git_dir(os.path.join(self.tmpdir, 'a', 'b')))
+
+    def test_file(self):
+        with open(os.path.join(self.tmpdir, '.git'), 'w') as fp:
+            fp.write('gitdir: ../real_git_dir\n')
+        self.assertEqual(
+            (self.tmpdir, os.path.join(self.tmpdir, '../real_git_dir')),
+            find_git_dir(self.tmpdir))
+
+    def test_not_found(self):
+        with patch('os.path.isdir', return_value=False):
+            self.assertIsNone(find_git_dir(self.tmpdir))
+
+    def test_object_format(self):
+        self.assertEqual('sha1', object_format(self.tmpdir))
+        with open(os.path.join(self.tmpdir, 'config'), 'w') as fp:
+            fp.write('[extensions]\n\tobjectFormat = sha256\n')
+        self.assertEqual('sha256', object_format(self.tmpdir))
+
+
+class TestGitIndexChecker(GitRepoMixin, unittest.TestCase):
+
+    def test_clean_file_not_read(self):
+        checker = GitIndexChecker()
+        with patch.object(gitindex, 'blob_hasher') as hasher:
+            got = checker._file_md5(self.files['a.txt'])
+        hasher.assert_not_called()
+        self.assertEqual(self.blob_id('a.txt'), got)
+
+    def test_modified_file(self):
+        path = self.files['a.txt']
+        with open(path, 'a') as fp:
+            fp.write('more')
+        checker = GitIndexChecker()
+        self.assertEqual(self.blob_id('a.txt'), checker._file_md5(path))
+
+    def test_not_in_repo(self):
+        tmpdir = tempfile.mkdtemp(prefix='doit-nogit-')
+        try:
+            path = os.path.join(tmpdir, 'x.txt')
+            with open(path, 'w') as fp:
+                fp.write('xxx')
+            checker = GitIndexChecker()
+            with patch('doit.gitindex.find_git_dir', return_value=None):
+                got = checker._file_md5(path)
+            self.assertEqual(git(tmpdir, 'hash-object', path).strip(), got)
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    def test_fresh_checkout(self):
+        checker = GitIndexChecker()
+        path = self.files['sub/b.txt']
+        state = checker.get_state(path, None)
+        # checkout creates files with a new timestamp
+        os.remove(path)
+        git(self.worktree, 'checkout', '--', 'sub/b.txt')
+        os.utime(path, (1600000100, 1600000100))
+        git(self.worktree, 'update-index', '--refresh')
+
+        checker = GitIndexChecker()
+        checker.file_cache = FileStateCache()
+        with patch.object(gitindex, 'blob_hasher') as hasher:
+            self.assertFalse(
+                checker.check_modified(path, os.stat(path), state))
+        hasher.assert_not_called()
@@ -0,0 +1,99 @@
+import os
+import unittest
+
+from doit.jobserver import JobServer, inherited_fds, get_jobserver
+
+
+@unittest.skipUnless(JobServer.available(), 'named FIFO not available')
+class TestJobServer(unittest.TestCase):
+
+    def setUp(self):
+        self.old_makeflags = os.environ.pop('MAKEFLAGS', None)
+
+    def tearDown(self):
+        if self.old_makeflags is None:
+            os.environ.pop('MAKEFLAGS', None)
+        else:
+            os.environ['MAKEFLAGS'] = self.old_makeflags
+
+    def test_tokens(self):
+        server = JobServer.create(3)
+        self.addCleanup(server.close)
+        # implicit token is not in the jobserver
+        tokens = [server.try_acquire(), server.try_acquire()]
+        self.assertEqual([b'+', b'+'], tokens)
+        self.assertIsNone(server.try_acquire())
+        server.release(tokens.pop())
+        self.assertEqual(b'+', server.try_acquire())
+
+    def test_export(self):
+        os.environ['MAKEFLAGS'] = 'k'
+        server = JobServer.create(2)
+        server.export()
+        self.assertIn(' -j2 --jobserver-auth=', os.environ['MAKEFLAGS'])
+        self.assertTrue(os.environ['MAKEFLAGS'].startswith('k '))
+        server.close()
+        self.assertEqual('k', os.environ['MAKEFLAGS'])
+        self.assertFalse(os.path.exists(server._tmpdir))
+
+    def test_client_fifo(self):
+        server = JobServer.create(2)
+        self.addCleanup(server.close)
+        path = os.path.join(server._tmpdir, 'fifo')
+        client = JobServer.from_environ(
+            {'MAKEFLAGS': ' -j2 --jobserver-auth=fifo:' + path})
+        self.addCleanup(client.close)
+        self.assertEqual(b'+', client.try_acquire())
+        self.assertIsNone(server.try_acquire())
+        client.release(b'+')
+        self.assertEqual(b'+', server.try_acquire())
+
+    def test_client_pipe(self):
+        read_fd, write_fd = os.pipe()
+        self.addCleanup(os.close, read_fd)
+        self.addCleanup(os.close, write_fd)
+        os.write(write_fd, b'xy')
+        client = JobServer.from_environ(
+            {'MAKEFLAGS': '-j3 --jobserver-auth={},{}'.format(
+                read_fd, write_fd)})
+        self.addCleanup(client.close)
+        # inherited pipe is not modified
+        self.assertTrue(os.get_blocking(read_fd))
+        self.assertEqual(b'x', client.try_acquire())
+        self.assertEqual(b'y', client.try_acquire())
+        self.assertIsNone(client.try_acquire())
+        client.release(b'y')
+        self.assertEqual(b'y', os.read(read_fd, 1))
+
+    def test_client_not_available(self):
+        self.assertIsNone(JobServer.from_environ({}))
+        self.assertIsNone(JobServer.from_environ({'MAKEFLAGS': '-k'}))
+        # file descriptors not inherited
+        self.assertIsNone(JobServer.from_environ(
+            {'MAKEFLAGS': '--jobserver-auth=9998,9999'}))
+        self.assertIsNone(JobServer.from_environ(
+            {'MAKEFLAGS': '--jobserver-auth=fifo:/not/there'}))
+
+    def test_inherited_fds(self):
+        read_fd, write_fd = os.pipe()
+        self.addCleanup(os.close, read_fd)
+        self.addCleanup(os.close, write_fd)
+        makeflags = '--jobserver-fds=9998,9999 --jobserver-auth={},{}'.format(
+            read_fd, write_fd)
+        self.assertEqual((read_fd, write_fd),
+                         inherited_fds({'MAKEFLAGS': makeflags}))
+        self.assertEqual((), inherited_fds(
+            {'MAKEFLAGS': '--jobserver-auth=9998,9999'}))
+        self.assertEqual((), inherited_fds({}))
+
+    def test_get_jobserver(self):
+        server = get_jobserver(4)
+        self.assertIsNotNone(server.makeflags)
+        # sub-process uses jobserver from MAKEFLAGS
+        client = get_jobserver(2)
+        self.assertIsNone(client.makeflags)
+        self.assertEqual(b'+', client.try_acquire())
+        client.release(b'+')
+        client.close()
+        server.close()
+        self.assertNotIn('MAKEFLAGS', os.environ)
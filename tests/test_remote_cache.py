@@ -0,0 +1,223 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from doit.task import Task
+from doit.action_cache import ActionCache
+from doit.remote_cache import HttpCache
+
+
+class CacheHandler(BaseHTTPRequestHandler):
+    """in memory cache server, objects are saved on `server.objects`"""
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, code, body=b''):
+        self.send_response(code)
+        # truncated response: less data than announced
+        length = len(body) + (10 if self.server.truncate else 0)
+        self.send_header('Content-Length', str(length))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _check(self):
+        self.server.requests.append((self.command, self.path,
+                                     self.headers.get('Authorization')))
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        if self.server.status:
+            self._reply(self.server.status)
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._check():
+            return
+        body = self.server.objects.get(self.path)
+        if body is None:
+            self._reply(404)
+        else:
+            self._reply(200, body)
+
+    def do_PUT(self):
+        length = int(self.headers['Content-Length'])
+        body = self.rfile.read(length)
+        if not self._check():
+            return
+        self.server.objects[self.path] = body
+        self._reply(200)
+
+
+class CacheServerMixin:
+    """Provides self.server (local HTTP cache) and self.url"""
+
+    def setUp(self):
+        super().setUp()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), CacheHandler)
+        self.server.objects = {}
+        self.server.requests = []
+        self.server.status = None  # force response status
+        self.server.delay = 0
+        self.server.truncate = False
+        # client closes connection on timeout
+        self.server.handle_error = lambda request, address: None
+        self.url = 'http://127.0.0.1:{}/cache'.format(self.server.server_port)
+        self._thread = threading.Thread(target=self.server.serve_forever)
+        self._thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self._thread.join()
+        super().tearDown()
+
+
+class TestHttpCache(CacheServerMixin, unittest.TestCase):
+
+    def test_put_get(self):
+        remote = HttpCache(self.url)
+        remote.put('cas', 'abc', b'content')
+        self.assertEqual(b'content', self.server.objects['/cache/cas/abc'])
+        self.assertEqual(b'content', remote.get('cas', 'abc'))
+
+    def test_not_found(self):
+        self.assertIsNone(HttpCache(self.url).get('ac', 'xxx'))
+
+    def test_server_error(self):
+        self.server.status = 500
+        remote = HttpCache(self.url)
+        self.assertRaises(OSError, remote.get, 'ac', 'xxx')
+        self.assertRaises(OSError, remote.put, 'ac', 'xxx', b'data')
+
+    def test_timeout(self):
+        self.server.delay = 0.5
+        remote = HttpCache(self.url, timeout=0.1)
+        self.assertRaises(OSError, remote.get, 'ac', 'xxx')
+
+    def test_truncated_body(self):
+        self.server.objects['/cache/ac/xxx'] = b'content'
+        self.server.truncate = True
+        remote = HttpCache(self.url)
+        self.assertRaises(OSError, remote.get, 'ac', 'xxx')
+        self.assertRaises(OSError, remote.put, 'ac', 'xxx', b'data')
+
+    def test_connection_refused(self):
+        url = self.url
+        self.server.shutdown()
+        self.server.server_close()
+        self.assertRaises(OSError, HttpCache(url).get, 'ac', 'xxx')
+
+    def test_credentials(self):
+        url = self.url.replace('http://', 'http://user:s%40cret@')
+        remote = HttpCache(url)
+        self.assertEqual(self.url, remote.url)
+        remote.get('ac', 'xxx')
+        # base64 of user:s@cret
+        self.assertEqual(('GET', '/cache/ac/xxx', 'Basic dXNlcjpzQGNyZXQ='),
+                         self.server.requests[0])
+
+
+def build(targets):
+    for target in targets:
+        with open(target, 'w') as fp:
+            fp.write('built')
+
+
+class TestActionCacheRemote(CacheServerMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tmpdir = tempfile.mkdtemp(prefix='doit-test-remote-')
+        self.target = os.path.join(self.tmpdir, 'target')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+        super().tearDown()
+
+    def new_cache(self, name, **kwargs):
+        path = os.path.join(self.tmpdir, name)
+        return ActionCache(path, remote=HttpCache(self.url, timeout=1),
+                           **kwargs)
+
+    def put(self, cache):
+        task = Task('t1', [build], targets=[self.target])
+        task.init_options()
+        build(task.targets)
+        task.values = {'x': 1}
+        key = cache.task_key(task)
+        self.assertTrue(cache.put(key, task))
+        cache.close()
+        return key
+
+    def test_upload_download(self):
+        cache = self.new_cache('machine1')
+        key = self.put(cache)
+        self.assertEqual(1, cache.uploaded)
+        self.assertIn('/cache/ac/' + key, self.server.objects)
+
+        os.remove(self.target)
+        cache2 = self.new_cache('machine2')
+        entry = cache2.restore(key, [self.target])
+        self.assertEqual({'x': 1}, entry['values'])
+        with open(self.target) as fp:
+            self.assertEqual('built', fp.read())
+        self.assertEqual(1, cache2.remote_hits)
+        # saved on local cache
+        self.assertTrue(os.path.exists(cache2._entry_path(key)))
+        self.assertEqual(
+            {'hits': 1, 'misses': 0, 'stored': 0, 'evicted': 0,
+             'remote_hits': 1, 'uploaded': 0, 'remote_errors': 0},
+            cache2.stats())
+
+    def test_no_upload(self):
+        self.put(self.new_cache('machine1', upload=False))
+        self.assertEqual({}, self.server.objects)
+
+    def test_corrupted_file(self):
+        key = self.put(self.new_cache('machine1'))
+        for path in self.server.objects:
+            if path.startswith('/cache/cas/'):
+                self.server.objects[path] = b'xxx'
+        cache2 = self.new_cache('machine2')
+        self.assertIsNone(cache2.restore(key, [self.target]))
+        self.assertEqual(1, cache2.misses)
+
+    def test_different_targets(self):
+        key = self.put(self.new_cache('machine1'))
+        cache2 = self.new_cache('machine2')
+        other = os.path.join(self.tmpdir, 'other')
+        self.assertIsNone(cache2.restore(key, [other]))
+        self.assertFalse(os.path.exists(other))
+
+    def test_error_disables_remote(self):
+        key = self.put(self.new_cache('machine1'))
+        self.server.status = 500
+        cache2 = self.new_cache('machine2')
+        self.assertIsNone(cache2.restore(key, [self.target]))
+        self.assertIsNone(cache2.remote)
+        self.assertEqual(1, cache2.remote_errors)
+        num_requests = len(self.server.requests)
+        self.assertIsNone(cache2.restore(key, [self.target]))
+        self.assertEqual(num_requests, len(self.server.requests))
+
+    def test_truncated_disables_remote(self):
+        key = self.put(self.new_cache('machine1'))
+        self.server.truncate = True
+        cache2 = self.new_cache('machine2')
+        self.assertIsNone(cache2.restore(key, [self.target]))
+        self.assertIsNone(cache2.remote)
+        self.assertEqual(1, cache2.remote_errors)
+
+    def test_upload_error(self):
+        self.server.status = 500
+        cache = self.new_cache('machine1')
+        key = self.put(cache)
+        self.assertEqual(0, cache.uploaded)
+        self.assertEqual(1, cache.remote_errors)
+        # still saved on local cache
+        self.assertIsNotNone(cache.restore(key, [self.target]))
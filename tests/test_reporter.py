@@ -68,6 +68,30 @@ class TestConsoleReporter(unittest.TestCase):
         self.assertIn("!! ", rep.outstream.getvalue())
         self.assertIn("t_name", rep.outstream.getvalue())
 
+    def test_skipCached(self):
+        rep = reporter.ConsoleReporter(StringIO(), {})
+        rep.skip_cached(Task("t_name", None))
+        self.assertEqual("C  t_name\n", rep.outstream.getvalue())
+
+    def test_cacheStats(self):
+        rep = reporter.ConsoleReporter(StringIO(), {})
+        rep.cache_stats({'hits': 3, 'misses': 1, 'stored': 1, 'evicted': 0})
+        self.assertEqual("action cache: 3 hits, 1 misses (75% hit rate)\n",
+                         rep.outstream.getvalue())
+
+    def test_cacheStats_remote(self):
+        rep = reporter.ConsoleReporter(StringIO(), {})
+        rep.cache_stats({'hits': 3, 'misses': 1, 'stored': 1, 'evicted': 0,
+                         'remote_hits': 2, 'uploaded': 1, 'remote_errors': 0})
+        self.assertEqual(
+            "action cache: 3 hits (2 remote), 1 misses (75% hit rate)\n",
+            rep.outstream.getvalue())
+
+    def test_cacheStats_not_used(self):
+        rep = reporter.ConsoleReporter(StringIO(), {})
+        rep.cache_stats({'hits': 0, 'misses': 0, 'stored': 0, 'evicted': 0})
+        self.assertEqual("", rep.outstream.getvalue())
+
     def test_cleanupError(self):
         rep = reporter.ConsoleReporter(StringIO(), {})
         fail = TaskFailed("I got you")
@@ -298,6 +322,19 @@ class TestJsonReporter(unittest.TestCase):
             if task_result['name'] == 't1':
                 self.assertIn('t1 failed!', task_result['error'])
 
+    def test_cached(self):
+        output = StringIO()
+        rep = reporter.JsonReporter(output)
+        t1 = Task("t1", None)
+        rep.get_status(t1)
+        rep.skip_cached(t1)
+        stats = {'hits': 1, 'misses': 0, 'stored': 0, 'evicted': 0}
+        rep.cache_stats(stats)
+        rep.complete_run()
+        got = json.loads(output.getvalue())
+        self.assertEqual('cached', got['tasks'][0]['result'])
+        self.assertEqual(stats, got['cache'])
+
     def test_cleanup_error(self):
         output = StringIO()
         rep = reporter.JsonReporter(output)
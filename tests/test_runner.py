@@ -1,6 +1,8 @@
 import os
 import sys
+import time
 import pickle
+import threading
 import unittest
 from multiprocessing import Queue
 import platform
@@ -8,12 +10,15 @@ from unittest.mock import Mock, patch
 
 from doit.exceptions import BaseFail, InvalidTask
 from doit.dependency import DbmDB, Dependency
+from doit.tools import result_dep
 from doit.reporter import ConsoleReporter
 from doit.task import Task, DelayedLoader
 from doit.control import TaskDispatcher, ExecNode
 from doit import runner
+from doit.action_cache import ActionCache
 
 from tests.support import DepManagerMixin, DepfileNameMixin
+from tests.support import DependencyFileMixin
 
 
 PLAT_IMPL = platform.python_implementation()
@@ -65,6 +70,9 @@ class FakeReporter(object):
     def skip_ignore(self, task):
         self.log.append(('ignore', task))
 
+    def skip_cached(self, task):
+        self.log.append(('cached', task))
+
     def cleanup_error(self, exception):
         self.log.append(('cleanup_error',))
 
@@ -88,6 +96,12 @@ class TestRunner(DepManagerMixin, unittest.TestCase):
         self.assertFalse(my_runner._stop_running)
         self.assertEqual(runner.SUCCESS, my_runner.final_result)
 
+    def test_keep_db_open(self):
+        my_runner = runner.Runner(self.dep_manager, self.reporter,
+                                  keep_db_open=True)
+        my_runner.finish()
+        self.assertFalse(self.dep_manager._closed)
+
 
 class TestRunner_SelectTask(DepManagerMixin, unittest.TestCase):
     def setUp(self):
@@ -119,6 +133,23 @@ class TestRunner_SelectTask(DepManagerMixin, unittest.TestCase):
         self.assertEqual(('up-to-date', t1), self.reporter.log.pop(0))
         self.assertFalse(self.reporter.log)
 
+    def test_not_affected(self):
+        t1 = Task("taskX", [(my_print, ["out a"])], file_dep=["i_dont_exist"])
+        my_runner = runner.Runner(self.dep_manager, self.reporter,
+                                  affected={'taskY'})
+        node = ExecNode(t1, None)
+        self.assertFalse(my_runner.select_task(node, {}))
+        self.assertEqual('up-to-date', node.run_status)
+        self.assertEqual(('start', t1), self.reporter.log.pop(0))
+        self.assertEqual(('up-to-date', t1), self.reporter.log.pop(0))
+        self.assertFalse(self.reporter.log)
+
+    def test_affected(self):
+        t1 = Task("taskX", [(my_print, ["out a"])])
+        my_runner = runner.Runner(self.dep_manager, self.reporter,
+                                  affected={'taskX'})
+        self.assertTrue(my_runner.select_task(ExecNode(t1, None), {}))
+
     def test_ignore(self):
         t1 = Task("taskX", [(my_print, ["out a"])])
         my_runner = runner.Runner(self.dep_manager, self.reporter)
@@ -323,6 +354,134 @@ class TestTask_RunAll(DepManagerMixin, unittest.TestCase):
         self.assertFalse(self.reporter.log)
 
 
+def write_target(targets):
+    with open(targets[0], 'w') as fp:
+        fp.write('built')
+    return {'x': 'y'}
+
+
+def write_arg(targets, arg):
+    with open(targets[0], 'w') as fp:
+        fp.write(arg)
+
+def copy_dep(dependencies, targets):
+    with open(list(dependencies)[0]) as src, open(targets[0], 'w') as dst:
+        dst.write(src.read())
+
+def value_dict(value, other):
+    return {'v': value, 'other': other}
+
+
+class TestRunner_ActionCache(DepManagerMixin, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.reporter = FakeReporter()
+        self.cache = ActionCache(os.path.join(self._dep_tmpdir, 'cache'))
+        self.dep = os.path.join(self._dep_tmpdir, 'dep')
+        self.target = os.path.join(self._dep_tmpdir, 'target')
+
+    def run_task(self, dep_content):
+        with open(self.dep, 'w') as fp:
+            fp.write(dep_content)
+        task = Task("t1", [write_target], file_dep=[self.dep],
+                    targets=[self.target])
+        my_runner = runner.Runner(self.dep_manager, self.reporter,
+                                  action_cache=self.cache)
+        my_runner.run_tasks(TaskDispatcher({'t1': task}, [], ['t1']))
+        self.reporter.log = []
+        return task
+
+    def test_restore(self):
+        self.run_task('v1')
+        self.run_task('v2')
+        os.remove(self.target)
+        self.assertEqual({'hits': 0, 'misses': 2, 'stored': 2, 'evicted': 0},
+                         self.cache.stats())
+
+        # back to first content
+        task = Task("t1", [write_target], file_dep=[self.dep],
+                    targets=[self.target])
+        with open(self.dep, 'w') as fp:
+            fp.write('v1')
+        my_runner = runner.Runner(self.dep_manager, self.reporter,
+                                  action_cache=self.cache)
+        node = ExecNode(task, None)
+        self.assertFalse(my_runner.select_task(node, {}))
+        self.assertEqual('successful', node.run_status)
+        self.assertEqual(('start', task), self.reporter.log.pop(0))
+        self.assertEqual(('cached', task), self.reporter.log.pop(0))
+        self.assertFalse(self.reporter.log)
+        self.assertFalse(task.executed)
+        self.assertTrue(os.path.exists(self.target))
+        self.assertEqual({'x': 'y'}, task.values)
+        # saved as successful
+        self.assertEqual('up-to-date',
+                         self.dep_manager.get_status(task, {}).status)
+        self.assertEqual({'x': 'y'}, self.dep_manager.get_values('t1'))
+
+    def test_hardlink_not_modified(self):
+        # executing a task must not modify content of a restored hard-link
+        self.cache.hardlink = True
+
+        def run(content):
+            with open(self.dep, 'w') as fp:
+                fp.write(content)
+            task = Task("t1", [copy_dep], file_dep=[self.dep],
+                        targets=[self.target])
+            my_runner = runner.Runner(self.dep_manager, self.reporter,
+                                      action_cache=self.cache)
+            my_runner.run_tasks(TaskDispatcher({'t1': task}, [], ['t1']))
+            return task
+        run('A')
+        run('B')
+        self.assertFalse(run('A').executed)  # hit, restored as hard-link
+        self.assertTrue(run('C').executed)
+        self.assertFalse(run('A').executed)
+        with open(self.target) as fp:
+            self.assertEqual('A', fp.read())
+
+    def run_getargs(self, value, other='a'):
+        t0 = Task("t0", [(value_dict, [value, other])])
+        t1 = Task("t1", [write_arg], targets=[self.target],
+                  getargs={'arg': ('t0', 'v')})
+        my_runner = runner.Runner(self.dep_manager, self.reporter,
+                                  action_cache=self.cache)
+        tasks = {'t0': t0, 't1': t1}
+        my_runner.run_tasks(TaskDispatcher(tasks, [], ['t0', 't1']))
+        self.reporter.log = []
+        return tasks
+
+    def test_getargs(self):
+        self.run_getargs('v1')
+        self.run_getargs('v2')
+        self.assertEqual(2, self.cache.stored)
+        tasks = self.run_getargs('v1', 'b')
+        self.assertEqual(1, self.cache.hits)
+        self.assertFalse(tasks['t1'].executed)
+        with open(self.target) as fp:
+            self.assertEqual('v1', fp.read())
+        # saved values include current result of t0, not the cached one
+        self.assertEqual('up-to-date', self.dep_manager.get_status(
+            tasks['t1'], tasks).status)
+
+    def test_always_execute(self):
+        self.run_task('v1')
+        task = Task("t1", [write_target], file_dep=[self.dep],
+                    targets=[self.target])
+        my_runner = runner.Runner(self.dep_manager, self.reporter,
+                                  always_execute=True,
+                                  action_cache=self.cache)
+        self.assertTrue(my_runner.select_task(ExecNode(task, None), {}))
+        self.assertEqual(0, self.cache.hits)
+
+    def test_stats_reported(self):
+        reporter = Mock()
+        my_runner = runner.Runner(self.dep_manager, reporter,
+                                  action_cache=self.cache)
+        my_runner.finish()
+        reporter.cache_stats.assert_called_once_with(self.cache.stats())
+
+
 # function used on actions, define here to make sure they are pickable
 def ok(): return "ok"
 def ok2(): return "different"
@@ -593,6 +752,15 @@ class TestRunnerRunTasks_MRunner(RunnerRunTasksBase, DepManagerMixin,
         self.reporter = FakeReporter()
 
 
+class TestRunnerRunTasks_ARunner(RunnerRunTasksBase, DepManagerMixin,
+                                 DepfileNameMixin, unittest.TestCase):
+    runner_class = runner.ARunner
+
+    def setUp(self):
+        super().setUp()
+        self.reporter = FakeReporter()
+
+
 # ---------------------------------------------------------------------------
 # TestMReporter
 # ---------------------------------------------------------------------------
@@ -768,6 +936,178 @@ class TestMRunner_get_next_job(DepManagerMixin, unittest.TestCase):
         self.assertEqual(j1.type, runner.JobTask.type)
 
 
+# ---------------------------------------------------------------------------
+# TestMRunner_pools
+# ---------------------------------------------------------------------------
+
+class TestMRunner_pools(DepManagerMixin, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.reporter = FakeReporter()
+
+    def test_blocked(self):
+        t1 = Task('t1', [], resources={'link': 1})
+        t2 = Task('t2', [], resources={'link': 1})
+        t3 = Task('t3', [])
+        run = runner.MThreadRunner(self.dep_manager, self.reporter,
+                                   pools={'link': 1})
+        dispatcher = TaskDispatcher({'t1': t1, 't2': t2, 't3': t3}, [],
+                                    ['t1', 't2', 't3'])
+        run._run_tasks_init(dispatcher)
+        self.assertEqual('t1', run.get_next_job(None).name)
+        # t2 waits for t1, other tasks are dispatched
+        self.assertEqual('t3', run.get_next_job(None).name)
+        self.assertIsInstance(run.get_next_job(None), runner.JobHold)
+        self.assertEqual(1, run.free_proc)
+
+        n1 = dispatcher.nodes['t1']
+        n1.run_status = 'successful'
+        self.assertEqual('t2', run.get_next_job(n1).name)
+        self.assertIsNone(run.get_next_job(dispatcher.nodes['t2']))
+        self.assertEqual(0, run._pool_used['link'])
+
+    def test_tokens(self):
+        run = runner.MThreadRunner(self.dep_manager, self.reporter,
+                                   pools={'mem': 4})
+        heavy = Task('heavy', [], resources={'mem': 3, 'other': 5})
+        huge = Task('huge', [], resources={'mem': 10})
+        # not more than pool size, resources without pool are not limited
+        self.assertEqual({'mem': 3}, run._task_tokens(heavy))
+        self.assertEqual({'mem': 4}, run._task_tokens(huge))
+        self.assertTrue(run._acquire(heavy))
+        self.assertFalse(run._acquire(huge))
+        run._release(heavy)
+        self.assertTrue(run._acquire(huge))
+
+    def test_run_tasks(self):
+        lock = threading.Lock()
+        running = []
+        concurrent = []
+        def action():
+            with lock:
+                running.append(1)
+                concurrent.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.pop()
+        tasks = {'t%d' % num: Task('t%d' % num, [action],
+                                   resources={'link': 1})
+                 for num in range(4)}
+        my_runner = runner.MThreadRunner(self.dep_manager, self.reporter,
+                                         num_process=4, pools={'link': 2})
+        my_runner.run_tasks(TaskDispatcher(tasks, [], sorted(tasks)))
+        self.assertEqual(runner.SUCCESS, my_runner.finish())
+        self.assertEqual(4, len(concurrent))
+        self.assertLessEqual(max(concurrent), 2)
+
+
+    def test_blocked_completed_sent_to_dispatcher(self):
+        # t3 can only be dispatched after t1 and t2 are reported as done
+        t1 = Task('t1', [], resources={'link': 1})
+        t2 = Task('t2', [], resources={'link': 1})
+        t3 = Task('t3', [], task_dep=['t1', 't2'])
+        my_runner = runner.MThreadRunner(self.dep_manager, self.reporter,
+                                         num_process=2, pools={'link': 1})
+        my_runner.run_tasks(TaskDispatcher({'t1': t1, 't2': t2, 't3': t3},
+                                           [], ['t3']))
+        self.assertEqual(runner.SUCCESS, my_runner.finish())
+        self.assertEqual(['t1', 't2', 't3'],
+                         [task.name for event, task in self.reporter.log
+                          if event == 'success'])
+
+
+class FakeJobServer:
+    def __init__(self, num_tokens):
+        self.tokens = [b'+'] * num_tokens
+
+    def try_acquire(self):
+        return self.tokens.pop() if self.tokens else None
+
+    def release(self, token):
+        self.tokens.append(token)
+
+
+class TestMRunner_jobserver(DepManagerMixin, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.reporter = FakeReporter()
+
+    def test_tokens(self):
+        t1, t2, t3 = (Task(name, []) for name in ('t1', 't2', 't3'))
+        jobserver = FakeJobServer(1)
+        run = runner.MThreadRunner(self.dep_manager, self.reporter,
+                                   num_process=3, jobserver=jobserver)
+        dispatcher = TaskDispatcher({'t1': t1, 't2': t2, 't3': t3}, [],
+                                    ['t1', 't2', 't3'])
+        run._run_tasks_init(dispatcher)
+        # first task uses implicit token, second a token from jobserver
+        self.assertEqual('t1', run.get_next_job(None).name)
+        self.assertEqual('t2', run.get_next_job(None).name)
+        self.assertEqual([], jobserver.tokens)
+        self.assertIsInstance(run.get_next_job(None), runner.JobHold)
+
+        n2 = dispatcher.nodes['t2']
+        n2.run_status = 'successful'
+        self.assertEqual('t3', run.get_next_job(n2).name)
+        self.assertEqual({'t1': None, 't3': b'+'}, run._job_tokens)
+
+    def test_finish_release(self):
+        t1, t2 = Task('t1', []), Task('t2', [])
+        jobserver = FakeJobServer(2)
+        run = runner.MThreadRunner(self.dep_manager, self.reporter,
+                                   num_process=3, jobserver=jobserver)
+        run._run_tasks_init(TaskDispatcher({'t1': t1, 't2': t2}, [],
+                                           ['t1', 't2']))
+        run.get_next_job(None)
+        run.get_next_job(None)
+        self.assertEqual(1, len(jobserver.tokens))
+        # tokens of interrupted run are given back
+        run.finish()
+        self.assertEqual(2, len(jobserver.tokens))
+        self.assertEqual({}, run._job_tokens)
+
+    def test_run_tasks(self):
+        lock = threading.Lock()
+        running = []
+        concurrent = []
+        def action():
+            with lock:
+                running.append(1)
+                concurrent.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.pop()
+        tasks = {'t%d' % num: Task('t%d' % num, [action])
+                 for num in range(6)}
+        jobserver = FakeJobServer(1)
+        my_runner = runner.ARunner(self.dep_manager, self.reporter,
+                                   num_process=4, jobserver=jobserver)
+        my_runner.run_tasks(TaskDispatcher(tasks, [], sorted(tasks)))
+        self.assertEqual(runner.SUCCESS, my_runner.finish())
+        self.assertEqual(6, len(concurrent))
+        self.assertLessEqual(max(concurrent), 2)
+        self.assertEqual(1, len(jobserver.tokens))
+
+    def test_release_after_last_dispatch(self):
+        # tokens of tasks finished after all tasks were dispatched are
+        # given back while other tasks are still running
+        jobserver = FakeJobServer(2)
+        free_tokens = []
+        def slow():
+            deadline = time.monotonic() + 2
+            while (len(jobserver.tokens) < 2
+                   and time.monotonic() < deadline):
+                time.sleep(0.01)
+            free_tokens.append(len(jobserver.tokens))
+        tasks = {'t1': Task('t1', [slow]), 't2': Task('t2', [ok]),
+                 't3': Task('t3', [ok])}
+        my_runner = runner.ARunner(self.dep_manager, self.reporter,
+                                   num_process=3, jobserver=jobserver)
+        my_runner.run_tasks(TaskDispatcher(tasks, [], sorted(tasks)))
+        self.assertEqual(runner.SUCCESS, my_runner.finish())
+        self.assertEqual([2], free_tokens)
+
+
 # ---------------------------------------------------------------------------
 # TestMRunner_start_process
 # ---------------------------------------------------------------------------
@@ -943,6 +1283,110 @@ class TestMRunner_execute_task(DepManagerMixin, unittest.TestCase):
         self.assertTrue(result_q.empty())
 
 
+# ---------------------------------------------------------------------------
+# TestMRunner_worker_check
+# ---------------------------------------------------------------------------
+
+@unittest.skipIf(not runner.MRunner.available(), 'MRunner not available')
+class TestMRunner_worker_check(DependencyFileMixin, DepManagerMixin,
+                               unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.reporter = FakeReporter()
+
+    def test_check_on_worker(self):
+        run = runner.MRunner(self.dep_manager, self.reporter,
+                             worker_check=True)
+        self.assertTrue(run._check_on_worker(
+            Task('t1', [], file_dep=[self.dependency1])))
+        self.assertFalse(run._check_on_worker(Task('t2', [])))
+        self.assertFalse(run._check_on_worker(
+            Task('t3', [], file_dep=[self.dependency1], setup=['t2'])))
+        self.assertFalse(run._check_on_worker(
+            Task('t4', [], file_dep=[self.dependency1],
+                 uptodate=[result_dep('t2')])))
+
+    def test_disabled(self):
+        self.assertFalse(runner.MRunner(self.dep_manager, self.reporter)
+                         .worker_check)
+        self.assertFalse(runner.MThreadRunner(
+            self.dep_manager, self.reporter, worker_check=True).worker_check)
+        self.assertFalse(runner.MRunner(
+            self.dep_manager, self.reporter, always_execute=True,
+            worker_check=True).worker_check)
+
+    def test_get_next_job(self):
+        t1 = Task('t1', [], file_dep=[self.dependency1])
+        run = runner.MRunner(self.dep_manager, self.reporter,
+                             worker_check=True)
+        run._run_tasks_init(TaskDispatcher({'t1': t1}, [], ['t1']))
+        job = run.get_next_job(None)
+        self.assertEqual('t1', job.name)
+        self.assertEqual({}, job.snapshot)
+        # status is not checked on main process
+        self.assertEqual([('start', t1)], self.reporter.log)
+        run.finish()
+
+    def run_tasks(self, tasks):
+        my_runner = runner.MRunner(self.dep_manager, self.reporter,
+                                   worker_check=True)
+        my_runner.run_tasks(TaskDispatcher(
+            {t.name: t for t in tasks}, [], [t.name for t in tasks]))
+        return my_runner.finish()
+
+    def test_run(self):
+        t1 = Task('t1', [simple_result], file_dep=[self.dependency1])
+        self.assertEqual(runner.SUCCESS, self.run_tasks([t1]))
+        self.assertEqual(['start', 'execute', 'success'],
+                         [log[0] for log in self.reporter.log])
+        # states computed on sub-process were saved
+        self.dep_manager.close()
+        self.dep_manager = Dependency(DbmDB, self.dep_manager.name)
+        self.assertEqual('up-to-date',
+                         self.dep_manager.get_status(t1, {}).status)
+
+        self.reporter.log = []
+        t1 = Task('t1', [simple_result], file_dep=[self.dependency1])
+        self.assertEqual(runner.SUCCESS, self.run_tasks([t1]))
+        self.assertEqual(['start', 'up-to-date'],
+                         [log[0] for log in self.reporter.log])
+
+    def test_missing_file_dep(self):
+        t1 = Task('t1', [], file_dep=['i_dont_exist'])
+        self.assertEqual(runner.ERROR, self.run_tasks([t1]))
+        self.assertEqual(['start', 'fail'],
+                         [log[0] for log in self.reporter.log])
+
+    def test_process_result_states(self):
+        t1 = Task('t1', [], file_dep=[self.dependency1])
+        run = runner.MRunner(self.dep_manager, self.reporter,
+                             worker_check=True)
+        run._run_tasks_init(TaskDispatcher({'t1': t1}, [], ['t1']))
+        node = ExecNode(t1, None)
+        states = self.dep_manager.get_file_states(t1)
+        result = {'name': 't1', 'task': t1.pickle_safe_dict(),
+                  'out': [], 'err': [], 'states': states}
+        with patch.object(self.dep_manager.checker, 'get_states') as get:
+            run._process_result(node, t1, result)
+        # file_dep not checked again on main process
+        self.assertFalse(get.called)
+        self.assertEqual([('success', t1)], self.reporter.log)
+        self.assertEqual('up-to-date',
+                         self.dep_manager.get_status(t1, {}).status)
+        run.finish()
+
+    def test_process_result_check_error(self):
+        t1 = Task('t1', [], file_dep=[self.dependency1])
+        run = runner.MRunner(self.dep_manager, self.reporter,
+                             worker_check=True)
+        run._run_tasks_init(TaskDispatcher({'t1': t1}, [], ['t1']))
+        node = ExecNode(t1, None)
+        run._process_result(node, t1, {'name': 't1', 'check_error': 'xxx'})
+        self.assertEqual([('fail', t1)], self.reporter.log)
+        self.assertEqual('failure', node.run_status)
+        self.assertEqual(runner.ERROR, run.finish())
+
+
 # ---------------------------------------------------------------------------
 # TestMThreadRunner_available
 # ---------------------------------------------------------------------------
@@ -951,3 +1395,65 @@ class TestMThreadRunner_available(unittest.TestCase):
     def test_MThreadRunner_available(self):
         self.assertTrue(runner.MThreadRunner.available())
 
+
+
+# ---------------------------------------------------------------------------
+# TestARunner
+# ---------------------------------------------------------------------------
+
+class TestARunner(DepManagerMixin, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.reporter = FakeReporter()
+
+    def test_available(self):
+        self.assertTrue(runner.ARunner.available())
+
+    def test_no_worker_check(self):
+        my_runner = runner.ARunner(self.dep_manager, self.reporter,
+                                   worker_check=True)
+        self.assertFalse(my_runner.worker_check)
+
+    def test_concurrent_commands(self):
+        tasks = {'t%d' % num: Task('t%d' % num, ['sleep 0.3'])
+                 for num in range(4)}
+        my_runner = runner.ARunner(self.dep_manager, self.reporter,
+                                   num_process=4)
+        start = time.monotonic()
+        my_runner.run_tasks(TaskDispatcher(tasks, [], sorted(tasks)))
+        elapsed = time.monotonic() - start
+        self.assertEqual(runner.SUCCESS, my_runner.finish())
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(12, len(self.reporter.log))
+
+    def test_num_process(self):
+        lock = threading.Lock()
+        running = []
+        concurrent = []
+        def action():
+            with lock:
+                running.append(1)
+                concurrent.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.pop()
+        tasks = {'t%d' % num: Task('t%d' % num, [action])
+                 for num in range(6)}
+        my_runner = runner.ARunner(self.dep_manager, self.reporter,
+                                   num_process=2)
+        my_runner.run_tasks(TaskDispatcher(tasks, [], sorted(tasks)))
+        self.assertEqual(runner.SUCCESS, my_runner.finish())
+        self.assertEqual(6, len(concurrent))
+        self.assertLessEqual(max(concurrent), 2)
+
+    def test_task_dep(self):
+        t1 = Task('t1', ['echo t1'])
+        t2 = Task('t2', ['echo t2'], task_dep=['t1'])
+        my_runner = runner.ARunner(self.dep_manager, self.reporter,
+                                   num_process=2)
+        my_runner.run_tasks(TaskDispatcher({'t1': t1, 't2': t2}, [],
+                                           ['t2']))
+        self.assertEqual(runner.SUCCESS, my_runner.finish())
+        self.assertEqual([('start', t1), ('execute', t1), ('success', t1),
+                          ('start', t2), ('execute', t2), ('success', t2)],
+                         self.reporter.log)
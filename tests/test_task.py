@@ -1,7 +1,9 @@
+import asyncio
 import contextlib
 import os
 import shutil
 import tempfile
+import time
 import unittest
 from io import StringIO
 from pathlib import Path, PurePath
@@ -297,6 +299,32 @@ class TestTaskTitle(unittest.TestCase):
         self.assertEqual("X%sX" % str(t.name), t.title())
 
 
+class TestTaskRestat(unittest.TestCase):
+    def test_default(self):
+        self.assertFalse(task.Task("t1", None).restat)
+
+    def test_invalid(self):
+        self.assertRaises(task.InvalidTask, task.Task, "t1", None,
+                          restat='yes')
+
+
+class TestTaskResources(unittest.TestCase):
+    def test_default(self):
+        self.assertEqual({}, task.Task("t1", None).resources)
+
+    def test_resources(self):
+        t = task.Task("t1", None, resources={'mem_heavy': 1})
+        self.assertEqual({'mem_heavy': 1}, t.resources)
+
+    def test_invalid(self):
+        self.assertRaises(task.InvalidTask, task.Task, "t1", None,
+                          resources=['mem_heavy'])
+        self.assertRaises(task.InvalidTask, task.Task, "t1", None,
+                          resources={'mem_heavy': 0})
+        self.assertRaises(task.InvalidTask, task.Task, "t1", None,
+                          resources={'mem_heavy': '1'})
+
+
 class TestTaskRepr(unittest.TestCase):
     def test_repr(self):
         t = task.Task("taskX", None, ('t1', 't2'))
@@ -324,6 +352,31 @@ class TestTaskActions(unittest.TestCase):
         t.execute(Stream(0))
         self.assertEqual({'x': 5, 'y': 10}, t.values)
 
+    def test_duration(self):
+        def sleep():
+            time.sleep(0.01)
+        t = task.Task('t1', [sleep])
+        self.assertIsNone(t.duration)
+        t.execute(Stream(0))
+        self.assertGreaterEqual(t.duration, 0.01)
+
+    def test_execute_async(self):
+        def py_action():
+            return {'x': 1}
+        t = task.Task('t1', ["%s hi_stdout" % PROGRAM, py_action])
+        got = asyncio.run(t.execute_async(Stream(0)))
+        self.assertIsNone(got)
+        self.assertTrue(t.executed)
+        self.assertEqual('hi_stdout', t.actions[0].out)
+        self.assertEqual({'x': 1}, t.values)
+        self.assertIsNotNone(t.duration)
+
+    def test_execute_async_failure(self):
+        t = task.Task("taskX", ["%s 1 2 3" % PROGRAM, "echo not executed"])
+        got = asyncio.run(t.execute_async(Stream(0)))
+        self.assertIsInstance(got, TaskError)
+        self.assertIsNone(t.actions[1].out)
+
     def test_failure(self):
         t = task.Task("taskX", ["%s 1 2 3" % PROGRAM])
         got = t.execute(Stream(0))